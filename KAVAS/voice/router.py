@@ -1,8 +1,12 @@
+import asyncio
 import io
+import json
 import os
+import struct
 import tempfile
 import time
 from .service import find_user_service, generate_speech_service, add_user_service
+from .utils import StreamedUtterance
 from .types import STTRequest, TTSResponse
 import av
 from typing import Optional
@@ -10,6 +14,7 @@ from uuid import UUID
 
 # from pydub import AudioSegment
 from dependencies import get_db
+from database.connection import get_db_connection
 from sqlalchemy.orm import Session
 from psycopg2.extensions import connection
 
@@ -24,10 +29,16 @@ from fastapi import (
     Body,
     Form,
     Response,
+    WebSocket,
+    WebSocketDisconnect,
 )
+from fastapi.encoders import jsonable_encoder
 
 voice_router = APIRouter(prefix="/voice", tags=["voice"])
 
+# Binary /voice/stream frames start with the utterance number
+FRAME_HEADER = struct.Struct("<I")
+
 
 @voice_router.get("/test")
 async def test():
@@ -57,6 +68,88 @@ async def process(
     res = await find_user_service(audio_file_path=temp_audio_path,user_name=user_name, conn= conn)
     return res
 
+@voice_router.websocket("/stream")
+async def stream(websocket: WebSocket):
+    """
+    Long-lived channel for one orchestrator session. Each utterance is
+    announced and ended with JSON messages and its audio arrives in between
+    as binary frames, while the user is still talking:
+      {"type": "start", "utterance": 3, "sample_rate": 16000}
+      <4-byte little-endian utterance number><16-bit mono PCM>  (repeated)
+      {"type": "end", "utterance": 3}     or     {"type": "cancel", "utterance": 3}
+    After "end" the reply is the same list /voice/process returns:
+      {"type": "result", "utterance": 3, "results": [...]}
+      {"type": "error", "utterance": 3, "detail": "..."}
+    """
+    await websocket.accept()
+    receiving: dict[int, StreamedUtterance] = {}
+    processing: dict[int, asyncio.Task] = {}
+    send_lock = asyncio.Lock()
+
+    async def answer(number: int, utterance: StreamedUtterance):
+        try:
+            with get_db_connection() as conn:
+                results = await find_user_service(audio_file_path=utterance.path, user_name=None, conn=conn)
+            message = {"type": "result", "utterance": number, "results": jsonable_encoder(results)}
+        except HTTPException as e:
+            message = {"type": "error", "utterance": number, "detail": e.detail}
+        except Exception as e:
+            print(f"Error processing streamed utterance {number}: {e}")
+            message = {"type": "error", "utterance": number, "detail": str(e)}
+        finally:
+            utterance.discard()
+            processing.pop(number, None)
+        async with send_lock:
+            await websocket.send_text(json.dumps(message))
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                frame = message["bytes"]
+                if len(frame) < FRAME_HEADER.size:
+                    continue
+                (number,) = FRAME_HEADER.unpack_from(frame)
+                utterance = receiving.get(number)
+                if utterance is not None:
+                    utterance.write(frame[FRAME_HEADER.size:])
+                continue
+
+            try:
+                data = json.loads(message["text"])
+                number = data.get("utterance")
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                # One bad control message must not take down the other utterances on the channel
+                print(f"Ignoring malformed /voice/stream message: {e}")
+                async with send_lock:
+                    await websocket.send_text(json.dumps({"type": "error", "utterance": None,
+                                                          "detail": f"Malformed message: {e}"}))
+                continue
+            if data.get("type") == "start":
+                receiving[number] = StreamedUtterance(int(data.get("sample_rate", 16000)))
+            elif data.get("type") == "end":
+                utterance = receiving.pop(number, None)
+                if utterance is not None:
+                    utterance.close()
+                    processing[number] = asyncio.create_task(answer(number, utterance))
+            elif data.get("type") == "cancel":
+                utterance = receiving.pop(number, None)
+                if utterance is not None:
+                    utterance.discard()
+                task = processing.pop(number, None)
+                if task is not None:
+                    task.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for utterance in receiving.values():
+            utterance.discard()
+        for task in list(processing.values()):
+            task.cancel()
+
+
 @voice_router.post("/add_user")
 async def add_user_route(
     background_tasks: BackgroundTasks,
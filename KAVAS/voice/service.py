@@ -22,7 +22,8 @@ async def process_voice(object, conn):
     start = time.time()
     
     try:
-        user = identify_user(object[-1], conn=conn)
+        # A blocking database query; kept off the event loop like diarization
+        user = await asyncio.to_thread(identify_user, object[-1], conn=conn)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Unable to identify user")
     
@@ -51,12 +52,14 @@ async def process_all_voices(embedded_voices, conn):
 async def find_user_service(*,audio_file_path: str,user_name:str | None, conn: connection,) -> list[TranscriptionResponse]:
     start = time.time()
     start_temp = time.time()
-    preprocessed_audio_path = preprocess_audio_in_memory(audio_file_path)
+    # Preprocessing and diarization take seconds of CPU; run in a thread so the event loop keeps
+    # serving other requests and answering /voice/stream pings meanwhile
+    preprocessed_audio_path = await asyncio.to_thread(preprocess_audio_in_memory, audio_file_path)
     print(f"Time taken for preprocessing: {time.time() - start_temp} seconds")
 
     start_diarization = time.time()
     try:
-        embedded_voices = process_audio(preprocessed_audio_path)
+        embedded_voices = await asyncio.to_thread(process_audio, preprocessed_audio_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Unable to diarize audio")
 
@@ -4,6 +4,7 @@ import torchaudio
 from pyannote.audio import Pipeline, Inference, Model
 from pyannote.core import Segment
 from pydub import AudioSegment
+import soundfile as sf
 import httpx
 
 import numpy as np
@@ -62,6 +63,14 @@ pipeline = KPipeline(lang_code='a', model=tts_model)
 
 
 def preprocess_audio_in_memory(audio_path: str):
+    # The orchestrator already uploads 16kHz mono audio; skip the re-encode for it
+    try:
+        info = sf.info(audio_path)
+        if info.samplerate == 16000 and info.channels == 1:
+            return audio_path
+    except RuntimeError:
+        pass
+
     # Step 1: Convert to 16kHz Mono WAV format
     audio = convert_audio_in_memory(input_file=audio_path)
 
@@ -72,6 +81,36 @@ def preprocess_audio_in_memory(audio_path: str):
         return temp_path
 
 
+class StreamedUtterance:
+    """
+    Audio of one utterance that arrives over /voice/stream as 16-bit mono
+    PCM frames. Frames are written to a temporary WAV file as they come in,
+    so the file is complete the moment the utterance ends.
+    """
+    def __init__(self, sample_rate: int = 16000):
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+            self.path = temp_file.name
+        self.writer = wave.open(self.path, "wb")
+        self.writer.setnchannels(1)
+        self.writer.setsampwidth(2)
+        self.writer.setframerate(sample_rate)
+
+    def write(self, pcm: bytes):
+        self.writer.writeframes(pcm)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            print(f"Error deleting temporary file {self.path}: {e}")
+
+
 def convert_audio_in_memory(input_file):
     """Convert audio to 16kHz mono WAV format for Pyannote"""
     audio = AudioSegment.from_file(input_file)
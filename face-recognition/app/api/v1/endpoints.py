@@ -5,6 +5,7 @@ from app.database.connection import get_db
 from app.dependencies import get_face_recognition_service
 from app.utils.image_validation import validate_image_file
 from app.services.face_recognition import FaceRecognitionService
+from app.services.inference import inference_executor, REST_STREAM
 import cv2
 import numpy as np
 import os
@@ -35,7 +36,7 @@ async def embed_face(
         if decoded_image is None:
             raise HTTPException(
                 status_code=400, detail="Could not decode image.")
-        embedding = face_service.embed_static(decoded_image)
+        embedding = await inference_executor.run(REST_STREAM, face_service.embed_static, decoded_image)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -43,7 +44,7 @@ async def embed_face(
             status_code=500, detail=f"Error generating embedding: {str(e)}")
 
     try:
-        save_embedding(db, person_id, embedding)
+        await save_embedding(db, person_id, embedding)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to save embedding: {str(e)}")
@@ -69,7 +70,7 @@ async def identify_faces(
         if decoded_image is None:
             raise HTTPException(
                 status_code=400, detail="Could not decode image.")
-        identified_faces = face_service.identify(decoded_image)
+        identified_faces = await inference_executor.run(REST_STREAM, face_service.identify, decoded_image)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -77,7 +78,7 @@ async def identify_faces(
             status_code=500, detail=f"Error generating embedding: {str(e)}")
 
     try:
-        matches = find_closest_matches(db, identified_faces)
+        matches = await find_closest_matches(db, identified_faces)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to identify face: {str(e)}")
@@ -102,7 +103,7 @@ async def identifySingleFace(
             raise HTTPException(
                 status_code=400, detail="Could not decode image.")
 
-        identified_face = face_service.identifySingleFace(decoded_image)
+        identified_face = await inference_executor.run(REST_STREAM, face_service.identifySingleFace, decoded_image)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -110,7 +111,7 @@ async def identifySingleFace(
             status_code=500, detail=f"Error generating embedding: {str(e)}")
 
     try:
-        match = find_closest_match_single_face(db, identified_face)
+        match = await find_closest_match_single_face(db, identified_face)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to identify face: {str(e)}")
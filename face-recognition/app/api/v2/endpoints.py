@@ -6,9 +6,10 @@ import numpy as np
 import base64
 import json
 from typing import Optional, List
-from app.database.connection import get_db
+from app.database.connection import get_db, db_pool
 from app.dependencies import get_face_recognition_service
 from app.services.face_recognition import FaceRecognitionService
+from app.services.inference import inference_executor, REST_STREAM
 from app.utils.image_validation import validate_image_file
 from app.database.crud import (
     save_embedding,
@@ -66,6 +67,10 @@ manager = ConnectionManager()
 
 async def process_image_frame(image_data: bytes, db, face_service):
     """Helper function to process an image frame"""
+    return decode_image_frame(image_data)
+
+
+def decode_image_frame(image_data: bytes) -> np.ndarray:
     image_array = np.frombuffer(image_data, dtype=np.uint8)
     frame = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
 
@@ -75,6 +80,11 @@ async def process_image_frame(image_data: bytes, db, face_service):
     return frame
 
 
+def identify_image_frame(image_data: bytes, face_service: FaceRecognitionService):
+    """Decodes and identifies one frame; runs on an inference worker."""
+    return face_service.identify(decode_image_frame(image_data))
+
+
 @router.post("/embed")
 async def embed_face(
     person_id: str = Form(...),
@@ -107,7 +117,7 @@ async def embed_face(
                          "message": "Could not decode image."}
             )
 
-        embedding = face_service.embed(decoded_image)
+        embedding = await inference_executor.run(REST_STREAM, face_service.embed, decoded_image)
 
     # Catch specific exceptions from the service if needed, otherwise general Exception
     except Exception as e:
@@ -128,7 +138,7 @@ async def embed_face(
         )
 
     try:
-        if has_embedding_conflict(db, person_id, embedding):
+        if await has_embedding_conflict(db, person_id, embedding):
             logger.error(
                 f"Embedding Conflict detected for Person ID: {person_id}")
             return JSONResponse(
@@ -140,7 +150,7 @@ async def embed_face(
             )
 
         # If no conflict, save the embedding
-        save_embedding(db, person_id, embedding)
+        await save_embedding(db, person_id, embedding)
         logger.info(f"Successfully saved embedding for Person ID: {person_id}")
 
         return JSONResponse(
@@ -196,7 +206,7 @@ async def seed_face(
                          "message": "Could not decode image."}
             )
 
-        embedding = face_service.embed_static(decoded_image)
+        embedding = await inference_executor.run(REST_STREAM, face_service.embed_static, decoded_image)
 
     except Exception as e:
         logger.error(
@@ -218,7 +228,7 @@ async def seed_face(
         )
 
     try:
-        if is_duplicate_seed(db, person_id, embedding):
+        if await is_duplicate_seed(db, person_id, embedding):
             logger.warning(
                 f"Duplicate seed detected for Person ID: {person_id}")
             response_content = SeedResponse(
@@ -234,10 +244,10 @@ async def seed_face(
                 content=response_content.dict()
             )
 
-        elif has_embedding_conflict(db, person_id, embedding):
+        elif await has_embedding_conflict(db, person_id, embedding):
             logger.info(
                 f"Updating embedding for Person ID: {person_id}")
-            update_embedding(db, person_id, embedding)
+            await update_embedding(db, person_id, embedding)
             response_content = SeedResponse(
                 status="success",
                 already_seeded=False,
@@ -252,7 +262,7 @@ async def seed_face(
         else:
             logger.info(
                 f"Creating new seed embedding for Person ID: {person_id}")
-            save_embedding(db, person_id, embedding)
+            await save_embedding(db, person_id, embedding)
             response_content = SeedResponse(
                 status="success",
                 already_seeded=False,
@@ -336,7 +346,7 @@ async def update_face(
                 content={"status": "error", "message": "Could not decode image."}
             )
 
-        embedding = face_service.embed(decoded_image)
+        embedding = await inference_executor.run(REST_STREAM, face_service.embed, decoded_image)
 
     except Exception as e:
         logger.error(f"Error generating embedding for update, Person ID {person_id}: {str(e)}")
@@ -353,7 +363,7 @@ async def update_face(
          )
 
     try:
-        update_embedding(db, person_id, embedding)
+        await update_embedding(db, person_id, embedding)
         logger.info(f"Successfully updated embedding for Person ID: {person_id}")
 
         return JSONResponse(
@@ -381,7 +391,6 @@ async def update_face(
 @router.websocket("/identify")
 async def identify_faces_ws(
     websocket: WebSocket,
-    db=Depends(get_db),
     face_service: FaceRecognitionService = Depends(
         get_face_recognition_service)
 ):
@@ -390,6 +399,9 @@ async def identify_faces_ws(
     # Initialize simple tracker for this connection
     tracker = SimpleFaceTracker(
         iou_threshold=0.45, max_missed_frames=30)  # 30 frame tolerance
+    # Frames of this connection are numbered from 0 and the number is echoed
+    # back as request_id so clients can pipeline several frames
+    frame_index = 0
 
     try:
         while True:
@@ -415,14 +427,20 @@ async def identify_faces_ws(
                 if message.get("action") == "configure":
                     websocket.threshold = message.get("threshold", 0.5)
                     websocket.max_faces = message.get("max_faces", 5)
+                    # Search width of the embeddings' HNSW or IVFFlat index; None keeps the defaults
+                    websocket.ef_search = message.get("ef_search")
+                    websocket.probes = message.get("probes")
                     logger.info(
-                        f"Configured Face Recognition Module for Threshold: {websocket.threshold} and Maximum Faces: {websocket.max_faces}")
+                        f"Configured Face Recognition Module for Threshold: {websocket.threshold} and Maximum Faces: {websocket.max_faces}"
+                        f" (ef_search: {websocket.ef_search}, probes: {websocket.probes})")
                     continue
 
                 image_bytes = base64.b64decode(message["image"])
+                request_id = message.get("request_id", frame_index)
             
             elif "bytes" in data:
                 image_bytes = data["bytes"]
+                request_id = frame_index
             else:
                 # Neither 'text' nor 'bytes' found - unexpected format
                 logger.warning(f"Received unexpected WebSocket data format: {data.keys()}")
@@ -432,24 +450,31 @@ async def identify_faces_ws(
                     logger.error(f"Failed to send unsupported format error to client: {send_error}")
                 continue
 
+            frame_index += 1
+
             if image_bytes is None:
-                await manager.send_json(websocket, {"status": "error", "error": "No image data provided"})
+                await manager.send_json(websocket, {"status": "error", "error": "No image data provided", "request_id": request_id})
                 continue
 
 
             try:
-                frame = await process_image_frame(image_bytes, db, face_service)
-                identified_faces = face_service.identify(frame)
+                # Decoding and the models run off the event loop, taking turns with other streams
+                identified_faces = await inference_executor.run(
+                    websocket, identify_image_frame, image_bytes, face_service)
 
                 threshold = getattr(websocket, "threshold", 0.5)
                 max_faces = getattr(websocket, "max_faces", 5)
 
                 # Get matches from current frame (may contain Unknowns)
-                matches = find_closest_matches(
-                    db, identified_faces,
-                    threshold=threshold,
-                    max_results=max_faces
-                )
+                # A pooled connection per frame rather than one held for the socket's lifetime
+                async with db_pool.connection() as db:
+                    matches = await find_closest_matches(
+                        db, identified_faces,
+                        threshold=threshold,
+                        max_results=max_faces,
+                        ef_search=getattr(websocket, "ef_search", None),
+                        probes=getattr(websocket, "probes", None)
+                    )
 
                 # Get tracked faces from previous frame BEFORE updating
                 previous_tracks = tracker.get_previous_frame_tracks()
@@ -507,7 +532,8 @@ async def identify_faces_ws(
                     # lip_center=speaker_location["centroid"] if speaker_location["is_trustworthy"] else [],
                     lip_center=speaker_location["centroid"] if speaker_location else [],
                     new_faces=new_faces,
-                    status="success"
+                    status="success",
+                    request_id=request_id
                 ).dict()
 
                 await manager.send_json(websocket, response)
@@ -515,7 +541,8 @@ async def identify_faces_ws(
             except Exception as e:
                 await manager.send_json(websocket, {
                     "status": "error",
-                    "error": str(e)
+                    "error": str(e),
+                    "request_id": request_id
                 })
 
     except WebSocketDisconnect:
@@ -32,6 +32,7 @@ class IdentifyResponseV2(BaseModel):
    new_faces: Optional[List[str]] = []
    lip_center: Optional[List[float]] = []
    error: Optional[str] = None
+   request_id: Optional[int] = None
 
 class SingleFaceResponse(BaseModel):
     match: Optional[Match]
@@ -1,8 +1,10 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from fastapi import Depends
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
 from .setup import initialize_database
+from . import crud
 import os
 from dotenv import load_dotenv
 
@@ -18,17 +20,37 @@ db_name = os.getenv('DATABASE_NAME')
 # Run database setup on first application start
 initialize_database()
 
+# Connections kept open for REST requests and /identify frames
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
 
-def get_db():
-    db = psycopg2.connect(
+
+async def configure_connection(conn):
+    """Runs once per pooled connection: vectors are sent and read as numpy arrays."""
+    await register_vector_async(conn)
+    await crud.detect_iterative_scan(conn)
+    # The pool only takes connections back idle
+    await conn.commit()
+
+
+db_pool = AsyncConnectionPool(
+    make_conninfo(
         dbname=os.getenv("DATABASE_NAME", "face_recognition"),
         user=os.getenv("DATABASE_USERNAME", "postgres"),
         password=os.getenv("DATABASE_PASSWORD", "postgress"),
         host=os.getenv("DATABASE_HOST", "db"),
         port=os.getenv("DATABASE_PORT", "5432"),
-        cursor_factory=RealDictCursor
-    )
-    try:
+    ),
+    min_size=DATABASE_POOL_MIN_SIZE,
+    max_size=DATABASE_POOL_MAX_SIZE,
+    kwargs={"row_factory": dict_row},
+    configure=configure_connection,
+    # Opened and closed with the application, see app.main
+    open=False,
+)
+
+
+async def get_db():
+    """A pooled connection for the length of a request; committed on success, rolled back on error."""
+    async with db_pool.connection() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
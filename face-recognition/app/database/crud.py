@@ -1,5 +1,8 @@
+import os
+import numpy as np
 from typing import List, Optional, Tuple, DefaultDict
 from app.models.schemas import Match, Face
+from app.database.gallery import gallery_index, GALLERY_INDEX_ENABLED
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -7,40 +10,115 @@ logger = logging.getLogger(__name__)
 
 
 THRESHOLD = 0.5
+DUPLICATE_SEED_THRESHOLD = 0.02
+# Nearest neighbours update_embedding considers for reassignment
+UPDATE_CANDIDATES = 100
+# Default search width of the ANN index; clients can override both in the configure message
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "1"))
+
+
+SEARCH_SETTINGS_QUERY = """
+    SELECT set_config('hnsw.ef_search', %s, true),
+           set_config('ivfflat.probes', %s, true);
+"""
+# hnsw.iterative_scan only exists from pgvector 0.8; older versions reject the setting
+ITERATIVE_SCAN_SETTINGS_QUERY = """
+    SELECT set_config('hnsw.ef_search', %s, true),
+           set_config('hnsw.iterative_scan', 'strict_order', true),
+           set_config('ivfflat.probes', %s, true);
+"""
+# Set by detect_iterative_scan once the pool has connected
+iterative_scan = False
+
+
+async def detect_iterative_scan(db):
+    """Records whether the installed pgvector supports iterative index scans (0.8+)."""
+    global iterative_scan
+    async with db.cursor() as cursor:
+        await cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = await cursor.fetchone()
+    version = tuple(int(part) for part in row["extversion"].split(".")[:2] if part.isdigit()) if row else ()
+    iterative_scan = version >= (0, 8)
+    logger.debug(f"pgvector {row['extversion'] if row else 'missing'}; "
+                f"iterative index scans {'on' if iterative_scan else 'off'}")
+
+
+def search_settings(k: int = 1, ef_search: Optional[int] = None, probes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Parameters of the search settings query, which sets the ANN index's
+    search width for the rest of the transaction. ef_search is raised to at
+    least `k`, since an HNSW scan returns no more rows than that; on
+    pgvector 0.8+ a strict iterative scan also keeps a filtered query from
+    coming back short.
+    """
+    ef_search = min(max(int(ef_search or HNSW_EF_SEARCH), k), 1000)
+    probes = max(int(probes or IVFFLAT_PROBES), 1)
+    return str(ef_search), str(probes)
+
+
+async def nearest(db, query: str, params, k: int = 1,
+                  ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[dict]:
+    """Runs a nearest-neighbour `query` with the search width set in the same round trip."""
+    async with db.cursor() as cursor:
+        async with db.pipeline():
+            await cursor.execute(ITERATIVE_SCAN_SETTINGS_QUERY if iterative_scan else SEARCH_SETTINGS_QUERY,
+                                 search_settings(k, ef_search, probes))
+            await cursor.execute(query, params)
+        return await cursor.fetchall()
+
 
+def as_vector(embedding) -> np.ndarray:
+    """Embeddings are sent as float32 arrays, which the registered pgvector dumper sends as vectors."""
+    return np.asarray(embedding, dtype=np.float32)
 
-def is_duplicate_seed(db, person_id, embedding) -> bool:
+
+async def is_duplicate_seed(db, person_id, embedding) -> bool:
     logger.info("Checking for duplicate seed...")
+    # Only this person's rows, found through the person_id index
     query = """
-        SELECT COUNT(*) > 0 AS exists
+        SELECT min(embedding <=> %s::vector) AS distance
         FROM embeddings
-        WHERE embedding <=> %s::vector < %s
-          AND person_id = %s;
+        WHERE person_id = %s;
     """
-    with db.cursor() as cursor:
-        cursor.execute(query, (embedding, 0.02, person_id))
-        return bool(cursor.fetchone()["exists"])
-
-def has_embedding_conflict(db, person_id, embedding) -> bool:
+    async with db.cursor() as cursor:
+        await cursor.execute(query, (as_vector(embedding), person_id))
+        distance = (await cursor.fetchone())["distance"]
+        return distance is not None and distance < DUPLICATE_SEED_THRESHOLD
+
+async def has_embedding_conflict(db, person_id, embedding) -> bool:
+    if not iterative_scan:
+        # Without iterative scans the filtered ANN query can run out of other people's rows within
+        # ef_search and report no conflict; an aggregate bypasses the index and scans exactly
+        query = """
+            SELECT min(embedding <=> %s::vector) AS distance
+            FROM embeddings
+            WHERE person_id != %s;
+        """
+        async with db.cursor() as cursor:
+            await cursor.execute(query, (as_vector(embedding), person_id))
+            distance = (await cursor.fetchone())["distance"]
+            return distance is not None and distance < THRESHOLD
     query = """
-        SELECT COUNT(*) > 0 AS exists
+        SELECT embedding <=> %s::vector AS distance
         FROM embeddings
-        WHERE embedding <=> %s::vector < %s
-          AND person_id != %s;
+        WHERE person_id != %s
+        ORDER BY distance
+        LIMIT 1;
     """
-    with db.cursor() as cursor:
-        cursor.execute(query, (embedding, THRESHOLD, person_id))
-        return bool(cursor.fetchone()["exists"])
+    rows = await nearest(db, query, (as_vector(embedding), person_id))
+    return bool(rows) and rows[0]["distance"] < THRESHOLD
 
 
-def save_embedding(db, person_id: int, embedding: List[float]):
+async def save_embedding(db, person_id: int, embedding: List[float]):
     query = "INSERT INTO embeddings (person_id, embedding) VALUES (%s, %s)"
-    with db.cursor() as cursor:
-        cursor.execute(query, (person_id, embedding))
-        db.commit()
+    async with db.cursor() as cursor:
+        await cursor.execute(query, (person_id, as_vector(embedding)))
+        await db.commit()
+    gallery_index.invalidate()
 
 
-def update_embedding(db, person_id: int, embedding: List[float], threshold=THRESHOLD):
+async def update_embedding(db, person_id: int, embedding: List[float], threshold=THRESHOLD):
     """
    Update embeddings by:
    1. Finding all similar faces (under threshold) and updating their person_id
@@ -54,31 +132,35 @@ def update_embedding(db, person_id: int, embedding: List[float], threshold=THRES
     query = """
         UPDATE embeddings
         SET person_id = %s
-        WHERE embedding <=> %s::vector < %s;
+        WHERE id = ANY(%s);
     """
+    # The nearest UPDATE_CANDIDATES through the ANN index; the threshold is applied to them afterwards
     find_matches_query = """
-        SELECT person_id, embedding <=> %s::vector AS distance
-        FROM embeddings WHERE embedding <=> %s::vector < %s
-        ORDER BY distance;
+        SELECT id, person_id, embedding <=> %s::vector AS distance
+        FROM embeddings
+        ORDER BY distance
+        LIMIT %s;
     """
 
     logger.debug(
         f"Attempting to update embeddings similar to new embedding for person_id {person_id} (threshold: {threshold})")
 
     try:
-        with db.cursor() as cursor:
-            cursor.execute(find_matches_query,
-                           (embedding, embedding, threshold))
-            matches = cursor.fetchall()
-            logger.info("Matches to be updated:")
-            for match in matches:
-                logger.info(
-                    f"Person ID: {match['person_id']}, Distance: {match['distance']}")
-        with db.cursor() as cursor:
-            params = (person_id, embedding, threshold)
-            cursor.execute(query, params)
-            updated_row_count = cursor.rowcount  # Number of rows affected by the UPDATE
-        db.commit()
+        candidates = await nearest(db, find_matches_query, (as_vector(embedding), UPDATE_CANDIDATES),
+                                   k=UPDATE_CANDIDATES)
+        matches = [match for match in candidates if match["distance"] < threshold]
+        logger.info("Matches to be updated:")
+        for match in matches:
+            logger.info(
+                f"Person ID: {match['person_id']}, Distance: {match['distance']}")
+        updated_row_count = 0
+        if matches:
+            async with db.cursor() as cursor:
+                params = (person_id, [match["id"] for match in matches])
+                await cursor.execute(query, params)
+                updated_row_count = cursor.rowcount  # Number of rows affected by the UPDATE
+        await db.commit()
+        gallery_index.invalidate()
         if updated_row_count > 0:
             logger.info(
                 f"Successfully updated {updated_row_count} existing embeddings to person_id {person_id} based on similarity.")
@@ -89,40 +171,67 @@ def update_embedding(db, person_id: int, embedding: List[float], threshold=THRES
     except Exception as e:
         logger.exception(
             f"Unexpected error while updating similar embeddings for person ID {person_id}: {e}")
-        db.rollback()
+        await db.rollback()
         updated_row_count = -1
 
     return updated_row_count
 
 
-def find_closest_matches(db, faces: List[Face], threshold=THRESHOLD, max_results=5) -> List[Match]:
+async def find_closest_matches(db, faces: List[Face], threshold=THRESHOLD, max_results=5,
+                         ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[Match]:
+    faces = faces[:max_results]
+    embeddings = [face.embeddings for face in faces]
+    closest = None
+    if GALLERY_INDEX_ENABLED:
+        try:
+            await gallery_index.sync(db)
+            closest = gallery_index.closest(embeddings, threshold)
+        except Exception as e:
+            logger.error(f"Gallery index sync failed, querying pgvector instead: {e}")
+            await db.rollback()
+    if closest is None:
+        closest = await find_closest_embeddings(db, embeddings, threshold, ef_search, probes)
+
+    return [Match(person_id=match[0], confidence=1 - match[1], bbox=face.bbox) if match is not None
+            else Match(person_id="Unknown", confidence=0, bbox=face.bbox)
+            for face, match in zip(faces, closest)]
+
+
+async def find_closest_embeddings(db, embeddings: List[List[float]], threshold=THRESHOLD,
+                            ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[Optional[Tuple[str, float]]]:
+    """
+    The (person_id, cosine distance) of each embedding's nearest stored
+    embedding if it is under `threshold`, else None, in input order. All
+    embeddings go in one statement: each row of the unnested array picks its
+    nearest neighbour in a LATERAL subquery, which computes the distance once
+    per row and orders by it, so an ANN index on `embedding` can serve it.
+    `ef_search` and `probes` widen that index's search for this query.
+    """
+    if not embeddings:
+        return []
     query = """
-        SELECT person_id, embedding <=> %s::vector AS distance
-        FROM embeddings WHERE embedding <=> %s::vector < %s
-        ORDER BY distance
-        LIMIT 1;
+        SELECT q.ord, m.person_id, m.distance
+        FROM (
+            SELECT e::vector AS embedding, ord
+            FROM unnest(%s::text[]) WITH ORDINALITY AS t(e, ord)
+        ) q
+        LEFT JOIN LATERAL (
+            SELECT person_id, embedding <=> q.embedding AS distance
+            FROM embeddings
+            ORDER BY distance
+            LIMIT 1
+        ) m ON TRUE
+        ORDER BY q.ord;
     """
-    results = []
-    with db.cursor() as cursor:
-        for face in faces:
-            embedding = face.embeddings
-            cursor.execute(query, (embedding, embedding, threshold))
-            result = cursor.fetchone()
-            if result is not None:
-                person_id = result["person_id"]
-                confidence = 1 - result["distance"]
-                results.append(Match(person_id=person_id,
-                               confidence=confidence, bbox=face.bbox))
-            else:
-                results.append(Match(person_id="Unknown",
-                               confidence=0, bbox=face.bbox))
-
-            if len(results) >= max_results:
-                break
-
-        return results
-
-
-def find_closest_match_single_face(db, face: Face) -> Match:
-    closest_match = find_closest_matches(db, [face])
+    literals = ["[" + ",".join(map(str, embedding)) + "]" for embedding in embeddings]
+    rows = await nearest(db, query, (literals,), 1, ef_search, probes)
+    # Ends the transaction the search settings were scoped to
+    await db.commit()
+    return [(row["person_id"], row["distance"])
+            if row["distance"] is not None and row["distance"] < threshold else None
+            for row in rows]
+
+
+async def find_closest_match_single_face(db, face: Face) -> Match:
+    closest_match = await find_closest_matches(db, [face])
     return closest_match[0]
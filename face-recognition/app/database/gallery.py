@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Score frames against an in-process copy of the embeddings table; 0 queries pgvector per face
+GALLERY_INDEX_ENABLED = os.getenv("GALLERY_INDEX_ENABLED", "1") == "1"
+# Seconds between checks of the gallery version for writes made by other processes
+GALLERY_SYNC_INTERVAL = float(os.getenv("GALLERY_SYNC_INTERVAL", "1.0"))
+
+
+class GalleryIndex:
+    """
+    In-process copy of the `embeddings` table for identification: one
+    contiguous, L2-normalized float32 matrix with the person_id of every
+    row alongside. A frame's faces are scored against the whole gallery in
+    a single matrix multiply, so with pgvector's cosine distance
+    `1 - similarity` the results match the SQL query without a round trip
+    per face.
+
+    pgvector stays the source of truth. A trigger bumps
+    `gallery_version.version` on every write to `embeddings`; the index
+    compares it at most every `sync_interval` seconds and reloads the table
+    when it moved. Writes made through this process mark the index stale
+    right away, so they count from the next frame on.
+    """
+    def __init__(self, sync_interval: float = GALLERY_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        # (normalized embeddings, person ids), replaced as a whole on reload
+        self.gallery = (np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=object))
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.gallery[1])
+
+    def invalidate(self):
+        self.checked_at = 0.0
+
+    async def sync(self, db):
+        """Reloads the gallery if the embeddings table changed since the last load."""
+        if time.monotonic() - self.checked_at < self.sync_interval:
+            return
+        async with self.lock:
+            if time.monotonic() - self.checked_at < self.sync_interval:
+                return
+            async with db.cursor() as cursor:
+                # Read the version first: a write landing during the load then only causes another reload
+                await cursor.execute("SELECT version FROM gallery_version")
+                row = await cursor.fetchone()
+                version = row["version"] if row is not None else None
+                if version is None or version != self.version:
+                    await cursor.execute("SELECT person_id, embedding FROM embeddings ORDER BY id")
+                    self._load(await cursor.fetchall())
+                    self.version = version
+            await db.commit()
+            self.checked_at = time.monotonic()
+
+    def search(self, embeddings: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The `k` most similar gallery rows for each query embedding, best
+        first: (row indices, cosine similarities), both shaped
+        (queries, min(k, gallery size)).
+        """
+        return _top_k(self.gallery[0], embeddings, k)
+
+    def closest(self, embeddings: List[List[float]], threshold: float) -> List[Optional[Tuple[str, float]]]:
+        """The (person_id, cosine distance) of each embedding's best match under `threshold`, else None."""
+        if not embeddings:
+            return []
+        matrix, person_ids = self.gallery
+        rows, similarities = _top_k(matrix, np.asarray(embeddings, dtype=np.float32), 1)
+        results = []
+        for row, similarity in zip(rows, similarities):
+            distance = 1.0 - float(similarity[0]) if len(row) else None
+            results.append((person_ids[row[0]], distance) if distance is not None and distance < threshold else None)
+        return results
+
+    def _load(self, rows):
+        matrix = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+        if not rows:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        self.gallery = (np.ascontiguousarray(_normalize(matrix)),
+                        np.asarray([row["person_id"] for row in rows], dtype=object))
+        logger.info(f"Gallery index loaded {len(rows)} embeddings")
+
+
+def _top_k(matrix: np.ndarray, embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+    k = min(k, len(matrix))
+    if k == 0 or len(queries) == 0:
+        return np.empty((len(queries), 0), dtype=np.intp), np.empty((len(queries), 0), dtype=np.float32)
+    scores = queries @ matrix.T
+    if k == 1:
+        top = np.argmax(scores, axis=1)[:, None]
+    else:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+gallery_index = GalleryIndex()
@@ -1,8 +1,10 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.errors import DuplicateDatabase, DuplicateTable
+import psycopg
+from psycopg.errors import DuplicateDatabase, DuplicateTable
 import logging
 import os
+import re
+import threading
+import time
 
 # Retrieve environment variables
 db_username = os.getenv('DATABASE_USERNAME')
@@ -11,6 +13,18 @@ db_host = os.getenv('DATABASE_HOST')
 db_port = os.getenv('DATABASE_PORT')
 db_name = os.getenv('DATABASE_NAME')
 
+# Nearest-neighbour index on embeddings: "hnsw", "ivfflat" or "none"
+EMBEDDING_INDEX = os.getenv("EMBEDDING_INDEX", "hnsw").lower()
+# HNSW build parameters (pgvector defaults)
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# IVFFlat is built with one list per this many rows and rebuilt once the table has doubled
+IVFFLAT_ROWS_PER_LIST = int(os.getenv("IVFFLAT_ROWS_PER_LIST", "1000"))
+# Seconds between checks of whether the embedding index needs rebuilding
+EMBEDDING_INDEX_CHECK_INTERVAL = float(os.getenv("EMBEDDING_INDEX_CHECK_INTERVAL", "3600"))
+
+EMBEDDING_INDEX_NAME = "embeddings_embedding_idx"
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -18,7 +32,7 @@ logger = logging.getLogger(__name__)
 def create_database():
     """Ensure the database exists before proceeding."""
     try:
-        conn = psycopg2.connect(
+        conn = psycopg.connect(
             dbname=db_name, user=db_username, password=db_password, host=db_host, port=db_port
         )
         conn.autocommit = True
@@ -48,7 +62,7 @@ def create_database():
 def setup_tables():
     """Ensure required tables exist."""
     try:
-        conn = psycopg2.connect(
+        conn = psycopg.connect(
             dbname=db_name, user=db_username, password=db_password, host=db_host, port=db_port
         )
         cursor = conn.cursor()
@@ -64,6 +78,31 @@ def setup_tables():
             )
         """)
 
+        # Bumped by every write to embeddings so in-process gallery indexes know to reload
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gallery_version (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("INSERT INTO gallery_version (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING")
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION bump_gallery_version() RETURNS trigger AS $$
+            BEGIN
+                UPDATE gallery_version SET version = version + 1;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS embeddings_gallery_version ON embeddings")
+        cursor.execute("""
+            CREATE TRIGGER embeddings_gallery_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON embeddings
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_gallery_version()
+        """)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS embeddings_person_id_idx ON embeddings (person_id)")
+
         conn.commit()
         logger.info("Tables created successfully.")
 
@@ -76,7 +115,76 @@ def setup_tables():
         raise
 
 
+def maintain_embedding_index():
+    """
+    Creates the EMBEDDING_INDEX index with cosine ops on embeddings.embedding,
+    or replaces it when the configured method changed or an IVFFlat index
+    was trained on less than half of today's rows. A replacement is built
+    concurrently under a temporary name before the old index is dropped, so
+    identification keeps using an index throughout.
+    """
+    conn = psycopg.connect(
+        dbname=db_name, user=db_username, password=db_password, host=db_host, port=db_port
+    )
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT am.amname, pg_get_indexdef(c.oid)
+                FROM pg_class c JOIN pg_am am ON am.oid = c.relam
+                WHERE c.relname = %s
+            """, (EMBEDDING_INDEX_NAME,))
+            existing = cursor.fetchone()
+            method, definition = existing if existing else (None, "")
+
+            if EMBEDDING_INDEX not in ("hnsw", "ivfflat"):
+                if method is not None:
+                    logger.info(f"Dropping {method} index on embeddings (EMBEDDING_INDEX={EMBEDDING_INDEX})")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {EMBEDDING_INDEX_NAME}")
+                return
+
+            if EMBEDDING_INDEX == "hnsw":
+                # HNSW takes inserts without losing recall, so it is only built when missing or switched
+                if method == "hnsw":
+                    return
+                options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+            else:
+                cursor.execute("SELECT count(*) FROM embeddings")
+                lists = max(1, cursor.fetchone()[0] // IVFFLAT_ROWS_PER_LIST)
+                built = re.search(r"lists='?(\d+)", definition)
+                if method == "ivfflat" and built and lists < 2 * int(built.group(1)):
+                    return
+                options = f"lists = {lists}"
+
+            start = time.time()
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {EMBEDDING_INDEX_NAME}_new")
+            cursor.execute(f"""
+                CREATE INDEX CONCURRENTLY {EMBEDDING_INDEX_NAME}_new ON embeddings
+                USING {EMBEDDING_INDEX} (embedding vector_cosine_ops) WITH ({options})
+            """)
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {EMBEDDING_INDEX_NAME}")
+            cursor.execute(f"ALTER INDEX {EMBEDDING_INDEX_NAME}_new RENAME TO {EMBEDDING_INDEX_NAME}")
+            logger.info(f"Built {EMBEDDING_INDEX} index on embeddings ({options}) in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+
+def start_index_maintenance():
+    """Re-checks the embedding index every EMBEDDING_INDEX_CHECK_INTERVAL seconds in a daemon thread."""
+    def run():
+        while True:
+            time.sleep(EMBEDDING_INDEX_CHECK_INTERVAL)
+            try:
+                maintain_embedding_index()
+            except Exception as e:
+                logger.error(f"Error maintaining the embedding index: {e}")
+
+    threading.Thread(target=run, name="embedding-index-maintenance", daemon=True).start()
+
+
 def initialize_database():
     """Run database setup on application start."""
     create_database()
-    setup_tables()
\ No newline at end of file
+    setup_tables()
+    maintain_embedding_index()
\ No newline at end of file
@@ -1,9 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.endpoints import router as v1_router
 from app.api.v2.endpoints import router as v2_router
+from app.database.setup import start_index_maintenance
+from app.database.connection import db_pool
+from app.services.inference import inference_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("Application starting up...")
+    # Connections are opened and their pgvector types registered here, not on the first request
+    await db_pool.open(wait=True)
+    # Rebuilds the embedding index as the gallery grows; it was checked once already on import
+    start_index_maintenance()
+
+    yield
+
+    print("Application shutting down...")
+    inference_executor.shutdown()
+    await db_pool.close()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Face Recognition API",
     description="API for face recognition services with WebSocket support",
     version="2.0",
@@ -22,12 +43,3 @@ app.add_middleware(
 # Include both API versions
 app.include_router(v1_router, prefix="/api/v1", tags=["v1 - REST API"])
 app.include_router(v2_router, prefix="/api/v2", tags=["v2 - WebSocket API"])
-
-# Optional: Add lifespan events if needed
-@app.on_event("startup")
-async def startup_event():
-    print("Application starting up...")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("Application shutting down...")
\ No newline at end of file
@@ -2,6 +2,7 @@ from fastapi import HTTPException, UploadFile
 from typing import List, Optional
 from app.models.schemas import Face
 import numpy as np
+import threading
 from collections import deque
 
 class FaceRecognitionService:
@@ -15,6 +16,10 @@ class FaceRecognitionService:
         self.noTalkingFramesCounter = 0
         # Initialize MediaPipe Face Mesh
         self.mp_face_mesh = face_mesh
+        # Inference runs on several worker threads: FaceMesh keeps per-graph state and
+        # must see one frame at a time, and the speaker history is read from the event loop
+        self.face_mesh_lock = threading.Lock()
+        self.tracking_lock = threading.Lock()
 
     def _get_face_center(self, landmarks):
         """Calculate the center of a face from landmarks"""
@@ -38,9 +43,14 @@ class FaceRecognitionService:
 
     def _update_speaker_tracking(self, frame):
         """Detect talking faces and update tracking history"""
+        with self.face_mesh_lock:
+            results = self.mp_face_mesh.process(frame)
+        with self.tracking_lock:
+            self._record_talking_faces(frame, results)
+
+    def _record_talking_faces(self, frame, results):
         self.h, self.w, _ = frame.shape
-        
-        results = self.mp_face_mesh.process(frame)
+
         if not results.multi_face_landmarks:
             if self.noTalkingFramesCounter > 20 and len(self.talking_centroids_history) > 0:
                 self.talking_centroids_history.clear()
@@ -73,10 +83,12 @@ class FaceRecognitionService:
         - centroid: (x,y) average position of speaker(s)
         - is_trustworthy: bool indicating if the location is reliable
         """
-        if not self.talking_centroids_history:
+        with self.tracking_lock:
+            history = list(self.talking_centroids_history)
+        if not history:
             return {'centroid': None, 'is_trustworthy': False}
             
-        centroids = np.array(self.talking_centroids_history)
+        centroids = np.array(history)
         num_frames = len(centroids)
             # Exponential weighting (higher weight for recent frames)
         alpha = 0.9  # Weight decay factor, adjust as needed
@@ -0,0 +1,110 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads running detection and embedding; ONNX Runtime releases the GIL while a model runs
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Jobs waiting across all streams before new ones are turned away
+INFERENCE_MAX_QUEUED = int(os.getenv("INFERENCE_MAX_QUEUED", "32"))
+
+
+class InferenceBusy(Exception):
+    """Every queue slot is taken; the caller should skip this frame."""
+
+
+# Stream that REST uploads share, so they take turns with the camera streams as one
+REST_STREAM = "rest"
+
+Job = Tuple[Callable[..., Any], tuple, asyncio.Future]
+
+
+class InferenceExecutor:
+    """
+    Runs model inference on a pool of worker threads so the event loop only
+    handles I/O. Each stream (a WebSocket, or "rest" for uploads) has its
+    own queue, and free workers take jobs from the streams in turn, so a
+    busy stream cannot starve the others. A /identify socket waits for each
+    frame's result before reading the next, so it never has more than one
+    job waiting; clients that fall behind drop frames on their side. All
+    bookkeeping happens on the event loop; only `fn` runs on a worker.
+    """
+    def __init__(self, workers: int = INFERENCE_WORKERS, max_queued: int = INFERENCE_MAX_QUEUED):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.queues: Dict[Hashable, Deque[Job]] = {}
+        # Streams with waiting jobs, in the order they get a worker next
+        self.turns: Deque[Hashable] = deque()
+        self.queued = 0
+        self.running = 0
+
+    async def run(self, stream: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs `fn(*args)` on a worker once it is `stream`'s turn and returns
+        its result, or raises InferenceBusy when `max_queued` jobs are
+        already waiting across all streams.
+        """
+        if self.queued >= self.max_queued:
+            raise InferenceBusy(f"Inference queue full ({self.queued} jobs waiting)")
+
+        queue = self.queues.get(stream)
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self.queues[stream] = deque()
+            self.turns.append(stream)
+        queue.append((fn, args, future))
+        self.queued += 1
+        self._dispatch()
+        return await future
+
+    def shutdown(self):
+        for queue in self.queues.values():
+            for _, _, future in queue:
+                future.cancel()
+        self.queues.clear()
+        self.turns.clear()
+        self.queued = 0
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.workers and self.turns:
+            stream = self.turns.popleft()
+            queue = self.queues[stream]
+            fn, args, future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                # Back of the line until every other waiting stream has had a turn
+                self.turns.append(stream)
+            else:
+                del self.queues[stream]
+            if future.done():
+                # The caller went away while the job was waiting
+                continue
+            self.running += 1
+            loop.run_in_executor(self.pool, fn, *args).add_done_callback(
+                lambda work, future=future: self._finished(work, future))
+
+    def _finished(self, work: asyncio.Future, future: asyncio.Future):
+        self.running -= 1
+        if work.cancelled():
+            if not future.done():
+                future.cancel()
+        else:
+            error = work.exception()
+            if future.done():
+                pass
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(work.result())
+        self._dispatch()
+
+
+inference_executor = InferenceExecutor()
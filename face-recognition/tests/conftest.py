@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the service as the app package, the way uvicorn app.main:app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
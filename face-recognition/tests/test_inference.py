@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.inference import InferenceExecutor, InferenceBusy
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class Gate:
+    """A job that holds its worker until opened, so the others queue up behind it."""
+    def __init__(self):
+        self.event = threading.Event()
+
+    def __call__(self):
+        self.event.wait(5)
+        return "gate"
+
+
+def test_streams_take_turns_for_a_worker():
+    async def scenario():
+        executor = InferenceExecutor(workers=1, max_queued=10)
+        order = []
+        gate = Gate()
+        blocker = asyncio.create_task(executor.run("camera-1", gate))
+        await settle()
+        jobs = [asyncio.create_task(executor.run(stream, order.append, f"{stream}#{n}"))
+                for stream, n in (("camera-1", 1), ("camera-1", 2), ("camera-1", 3), ("camera-2", 1), ("rest", 1))]
+        await settle()
+        gate.event.set()
+        await asyncio.gather(blocker, *jobs)
+        executor.shutdown()
+        return order
+
+    # camera-1 queued three frames first, but each stream gets a worker in turn
+    assert asyncio.run(scenario()) == ["camera-1#1", "camera-2#1", "rest#1", "camera-1#2", "camera-1#3"]
+
+
+def test_jobs_beyond_the_queue_limit_are_turned_away():
+    async def scenario():
+        executor = InferenceExecutor(workers=1, max_queued=1)
+        gate = Gate()
+        blocker = asyncio.create_task(executor.run("camera-1", gate))
+        await settle()
+        waiting = asyncio.create_task(executor.run("camera-2", lambda: "done"))
+        await settle()
+        with pytest.raises(InferenceBusy):
+            await executor.run("camera-3", lambda: "never")
+        gate.event.set()
+        results = await asyncio.gather(blocker, waiting)
+        executor.shutdown()
+        return results
+
+    assert asyncio.run(scenario()) == ["gate", "done"]
+
+
+def test_job_whose_caller_went_away_is_skipped():
+    async def scenario():
+        executor = InferenceExecutor(workers=1, max_queued=10)
+        ran = []
+        gate = Gate()
+        blocker = asyncio.create_task(executor.run("camera-1", gate))
+        await settle()
+        abandoned = asyncio.create_task(executor.run("camera-2", ran.append, "abandoned"))
+        kept = asyncio.create_task(executor.run("camera-3", ran.append, "kept"))
+        await settle()
+        abandoned.cancel()
+        gate.event.set()
+        await asyncio.gather(blocker, kept)
+        executor.shutdown()
+        return ran, executor
+
+    ran, executor = asyncio.run(scenario())
+    assert ran == ["kept"]
+    assert (executor.queued, executor.running) == (0, 0)
+
+
+def test_errors_reach_the_caller_and_free_the_worker():
+    def fail():
+        raise ValueError("bad frame")
+
+    async def scenario():
+        executor = InferenceExecutor(workers=1, max_queued=10)
+        with pytest.raises(ValueError):
+            await executor.run("camera-1", fail)
+        result = await executor.run("camera-1", lambda: "next")
+        executor.shutdown()
+        return result, executor.running
+
+    assert asyncio.run(scenario()) == ("next", 0)
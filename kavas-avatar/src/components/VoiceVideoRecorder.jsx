@@ -28,16 +28,13 @@ export const VoiceVideoRecorder = ({ onAudioReceived, isTalking }) => {
         canvasRef.current
       ) {
 
-        const videoBase64 = captureVideoFrame();
-
-        if (ws_img.current?.readyState === WebSocket.OPEN) {
-          ws_img.current.send(
-            JSON.stringify({
-              video: videoBase64, // Send only video
-            })
-          );
-          console.log("Sent video frame");
-        }
+        // Send the JPEG as a binary message; no base64 on either side
+        captureVideoFrame((frameBlob) => {
+          if (frameBlob && ws_img.current?.readyState === WebSocket.OPEN) {
+            ws_img.current.send(frameBlob);
+            console.log("Sent video frame");
+          }
+        });
       }
     }, 200); // 1000ms / 10 = 100ms (10 frames per second)
 
@@ -297,16 +294,12 @@ export const VoiceVideoRecorder = ({ onAudioReceived, isTalking }) => {
     }
   };
 
-  const captureVideoFrame = () => {
+  const captureVideoFrame = (onFrame) => {
     const context = canvasRef.current.getContext("2d");
     context.drawImage(videoRef.current, 0, 0, 640, 480);
 
-    // Get the base64 image data
-    const imageData = canvasRef.current.toDataURL("image/jpeg").split(",")[1];
-
-    // saveImageToFile(imageData);
-    return imageData
-
+    // Get the encoded JPEG bytes
+    canvasRef.current.toBlob(onFrame, "image/jpeg");
   };
 
   useEffect(() => {
@@ -0,0 +1,22 @@
+"""
+Record/replay load testing for the orchestrator.
+
+1. Record real kiosk sessions by starting the orchestrator with
+   RECORD_SESSIONS_DIR=recordings. Every session is written to a
+   recordings/<session>-<time>.jsonl.gz file when it closes.
+
+2. Start the stub upstreams instead of the voice, face and RAG services:
+
+       python -m loadtest.stubs --voice-latency 0.3 --face-latency 0.05 --rag-latency 1.5
+
+   and point the orchestrator's lip-sync at the stub rhubarb:
+
+       RHUBARB_PATH=loadtest/rhubarb_stub.py uvicorn main:app --port 8004
+
+3. Replay the recordings at N times real speed with M concurrent sessions:
+
+       python -m loadtest.replay recordings --speed 2 --sessions 20
+
+   The replay scrapes /metrics before and after the run and prints the
+   per-stage latency percentiles, time to first audio and frame drop rates.
+"""
@@ -0,0 +1,184 @@
+"""
+Replays recorded kiosk sessions against a running orchestrator.
+
+    python -m loadtest.replay recordings --speed 2 --sessions 20
+
+Each replayed session opens its own /ws/media and /ws/img sockets with a
+unique session id and sends the recorded messages at their original offsets
+divided by --speed. Recordings are assigned to sessions round robin.
+With --chunked, recorded utterances are streamed as "audio_chunk" messages
+in real time (divided by --speed) starting at their recorded offset, the
+way a client that streams while the user talks would send them.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import websockets
+
+from stream.recorder import read_recording, entry_payload, iter_recordings
+from stream.session import MEDIA_CHANNEL, IMG_CHANNEL
+from stream.audio import decode_audio
+from .report import scrape, build_report, format_report
+
+
+class ReplayStats:
+    def __init__(self):
+        self.utterances = 0
+        self.frames = 0
+        self.answers = 0
+        self.greetings = 0
+        self.chunks = 0
+        self.endpoints = 0
+        self.invalid = 0
+        self.errors = 0
+
+    def summary(self) -> dict:
+        return {
+            "utterances": self.utterances,
+            "answers": self.answers,
+            "invalid": self.invalid,
+            "greetings": self.greetings,
+            "unanswered": max(0, self.utterances - self.answers - self.invalid),
+            "chunks": self.chunks,
+            "endpoints": self.endpoints,
+            "frames": self.frames,
+            "errors": self.errors,
+        }
+
+
+async def _read_answers(ws, stats: ReplayStats):
+    try:
+        async for message in ws:
+            data = json.loads(message)
+            if data.get("endpoint"):
+                stats.endpoints += 1
+                continue
+            if not data.get("valid", True):
+                stats.invalid += 1
+                continue
+            if data.get("greeting"):
+                stats.greetings += 1
+                continue
+            stats.chunks += 1
+            # A one-shot answer has no "seq"; a streamed one starts at 0
+            if data.get("seq", 0) == 0:
+                stats.answers += 1
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+def chunk_utterance(payload: str, chunk_seconds: float) -> list[str]:
+    """Splits a recorded {"audio": ...} message into audio_chunk messages and an audio_end."""
+    data = json.loads(payload)
+    samples, rate = decode_audio(base64.b64decode(data["audio"]))
+    step = max(1, int(rate * chunk_seconds))
+    messages = [json.dumps({"audio_chunk": base64.b64encode(samples[i:i + step].astype("<i2").tobytes()).decode("ascii"),
+                            "sample_rate": rate})
+                for i in range(0, len(samples), step)]
+    messages.append(json.dumps({"audio_end": True, "stream": data.get("stream", False)}))
+    return messages
+
+
+async def _stream_utterance(ws, messages: list[str], interval: float, previous: Optional[asyncio.Task]):
+    # A client streams one utterance at a time
+    if previous is not None:
+        await previous
+    for message in messages:
+        await ws.send(message)
+        await asyncio.sleep(interval)
+
+
+async def replay_session(url: str, session_id: str, entries: list[dict], speed: float, drain: float,
+                         stats: ReplayStats, chunk_seconds: float = 0.0):
+    media = await websockets.connect(f"{url}/ws/media?session_id={session_id}", max_size=None)
+    img = await websockets.connect(f"{url}/ws/img?session_id={session_id}", max_size=None)
+    reader = asyncio.create_task(_read_answers(media, stats))
+    sockets = {MEDIA_CHANNEL: media, IMG_CHANNEL: img}
+    streaming: list[asyncio.Task] = []
+    start = time.monotonic()
+    try:
+        for entry in entries:
+            delay = entry["t"] / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            payload = entry_payload(entry)
+            if payload is None:
+                continue
+            if entry["channel"] == MEDIA_CHANNEL and '"audio"' in payload:
+                stats.utterances += 1
+                if chunk_seconds:
+                    messages = chunk_utterance(payload, chunk_seconds)
+                    previous = streaming[-1] if streaming else None
+                    streaming.append(asyncio.create_task(_stream_utterance(media, messages, chunk_seconds / speed,
+                                                                           previous)))
+                    continue
+            elif entry["channel"] == IMG_CHANNEL:
+                stats.frames += 1
+            await sockets[entry["channel"]].send(payload)
+        await asyncio.gather(*streaming)
+        # Leave time for answers to utterances sent at the end
+        await asyncio.sleep(drain)
+    except websockets.exceptions.ConnectionClosed as e:
+        print(f"Session {session_id}: connection closed: {e}")
+        stats.errors += 1
+    finally:
+        for task in streaming:
+            task.cancel()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await img.close()
+        await media.close()
+
+
+async def run(args) -> dict:
+    recordings = [read_recording(path)[1] for path in iter_recordings(args.recordings)]
+    if not recordings:
+        raise SystemExit("No recordings found")
+    metrics_url = args.metrics_url or _metrics_url(args.url)
+
+    before = await scrape(metrics_url)
+    stats = ReplayStats()
+    started = time.time()
+    await asyncio.gather(*(
+        replay_session(args.url, f"{args.prefix}-{i}", recordings[i % len(recordings)], args.speed, args.drain, stats,
+                       args.chunk_seconds if args.chunked else 0.0)
+        for i in range(args.sessions)
+    ))
+    client = {**stats.summary(), "duration": round(time.time() - started, 1)}
+    # Let sessions close so the frame counters are final
+    await asyncio.sleep(1.0)
+    after = await scrape(metrics_url)
+    return build_report(before, after, client)
+
+
+def _metrics_url(ws_url: str) -> str:
+    parsed = urlparse(ws_url)
+    scheme = "https" if parsed.scheme == "wss" else "http"
+    return f"{scheme}://{parsed.netloc}/metrics"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions against the orchestrator")
+    parser.add_argument("recordings", nargs="+", help="recording files or directories of recordings")
+    parser.add_argument("--url", default="ws://127.0.0.1:8004", help="orchestrator WebSocket base URL")
+    parser.add_argument("--metrics-url", default=None, help="defaults to /metrics on the orchestrator host")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--sessions", type=int, default=1, help="concurrent sessions")
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds to wait for answers after the last message")
+    parser.add_argument("--chunked", action="store_true", help="stream utterances as audio_chunk messages")
+    parser.add_argument("--chunk-seconds", type=float, default=0.1, help="audio per chunk with --chunked")
+    parser.add_argument("--prefix", default="loadtest", help="session id prefix")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Turns two scrapes of the orchestrator's /metrics endpoint into a load test
+report: latency percentiles per stage and frame outcome rates over the run.
+"""
+import math
+import re
+from typing import Optional
+
+import httpx
+
+STAGE_LATENCY = "orchestrator_stage_latency_seconds"
+TIME_TO_FIRST_AUDIO = "orchestrator_time_to_first_audio_seconds"
+FACE_ROUNDTRIP = "orchestrator_face_roundtrip_seconds"
+FRAMES = "orchestrator_frames_total"
+UTTERANCES = "orchestrator_utterances_total"
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> dict[str, dict[tuple, float]]:
+    """Parses Prometheus text format into {sample name: {labels: value}}."""
+    samples: dict[str, dict[tuple, float]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, _, labels, value = match.groups()
+        key = tuple(sorted(_LABEL.findall(labels or "")))
+        samples.setdefault(name, {})[key] = float(value)
+    return samples
+
+
+async def scrape(metrics_url: str) -> dict[str, dict[tuple, float]]:
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(metrics_url)
+        response.raise_for_status()
+        return parse_metrics(response.text)
+
+
+def delta(before: dict, after: dict, name: str) -> dict[tuple, float]:
+    old = before.get(name, {})
+    return {key: value - old.get(key, 0.0) for key, value in after.get(name, {}).items()}
+
+
+def histogram_series(before: dict, after: dict, name: str, group_by: str) -> dict[str, list[tuple[float, float]]]:
+    """Cumulative (upper bound, count) buckets of the run, grouped by one label."""
+    series: dict[str, list[tuple[float, float]]] = {}
+    for key, count in delta(before, after, f"{name}_bucket").items():
+        labels = dict(key)
+        bound = math.inf if labels["le"] == "+Inf" else float(labels["le"])
+        series.setdefault(labels.get(group_by, ""), []).append((bound, count))
+    for buckets in series.values():
+        buckets.sort()
+    return series
+
+
+def quantile(buckets: list[tuple[float, float]], q: float) -> Optional[float]:
+    """Linear interpolation within the bucket, as histogram_quantile does."""
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def latency_table(before: dict, after: dict, name: str, group_by: str) -> list[dict]:
+    rows = []
+    for group, buckets in sorted(histogram_series(before, after, name, group_by).items()):
+        count = buckets[-1][1]
+        if count <= 0:
+            continue
+        row = {group_by: group, "count": int(count)}
+        for q in PERCENTILES:
+            row[f"p{int(q * 100)}"] = quantile(buckets, q)
+        rows.append(row)
+    return rows
+
+
+def frame_rates(before: dict, after: dict) -> dict:
+    outcomes = {dict(key).get("outcome"): value for key, value in delta(before, after, FRAMES).items()}
+    received = outcomes.get("received", 0.0)
+    rates = {outcome: int(value) for outcome, value in outcomes.items()}
+    if received:
+        rates["drop_rate"] = outcomes.get("dropped", 0.0) / received
+        rates["coalesce_rate"] = outcomes.get("coalesced", 0.0) / received
+    return rates
+
+
+def build_report(before: dict, after: dict, client: Optional[dict] = None) -> dict:
+    return {
+        "stages": latency_table(before, after, STAGE_LATENCY, "stage"),
+        "time_to_first_audio": latency_table(before, after, TIME_TO_FIRST_AUDIO, "mode"),
+        "face_roundtrip": latency_table(before, after, FACE_ROUNDTRIP, "stage"),
+        "stage_errors": {dict(key).get("stage"): int(value)
+                         for key, value in delta(before, after, "orchestrator_stage_errors_total").items() if value},
+        "frames": frame_rates(before, after),
+        "utterances": {dict(key).get("outcome"): int(value)
+                       for key, value in delta(before, after, UTTERANCES).items() if value},
+        "client": client or {},
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for title, key, label in (("Stage latency", "stages", "stage"),
+                              ("Time to first audio", "time_to_first_audio", "mode"),
+                              ("Face round trip", "face_roundtrip", "stage")):
+        rows = report[key]
+        if not rows:
+            continue
+        lines.append(title)
+        for row in rows:
+            name = row[label] or "all"
+            lines.append(f"  {name:<16} n={row['count']:<6} " +
+                         " ".join(f"p{int(q * 100)}={_ms(row[f'p{int(q * 100)}'])}" for q in PERCENTILES))
+    if report["stage_errors"]:
+        lines.append("Stage errors")
+        lines.extend(f"  {stage:<16} {count}" for stage, count in report["stage_errors"].items())
+    frames = report["frames"]
+    if frames:
+        lines.append("Frames")
+        lines.append("  " + " ".join(f"{k}={v}" for k, v in frames.items() if not k.endswith("_rate")))
+        if "drop_rate" in frames:
+            lines.append(f"  drop rate {frames['drop_rate']:.1%}, coalesce rate {frames['coalesce_rate']:.1%}")
+    if report["utterances"]:
+        lines.append("Utterances")
+        lines.append("  " + " ".join(f"{k}={v}" for k, v in report["utterances"].items()))
+    if report["client"]:
+        lines.append("Client")
+        lines.append("  " + " ".join(f"{k}={v}" for k, v in report["client"].items()))
+    return "\n".join(lines)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Drop-in for the rhubarb binary during load tests. Accepts the same
+`-f json -r phonetic <wav>` arguments, sleeps LOADTEST_LIPSYNC_LATENCY
+seconds and prints one mouth cue per 100 ms of audio.
+"""
+import json
+import os
+import sys
+import time
+import wave
+
+CUES = "ABCDEFX"
+
+
+def main():
+    wav_path = sys.argv[-1]
+    with wave.open(wav_path, "rb") as wav_file:
+        duration = wav_file.getnframes() / wav_file.getframerate()
+    time.sleep(float(os.getenv("LOADTEST_LIPSYNC_LATENCY", "0.1")))
+    cues = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + 0.1)
+        cues.append({"start": round(start, 2), "end": round(end, 2), "value": CUES[len(cues) % len(CUES)]})
+        start = end
+    json.dump({"metadata": {"soundFile": wav_path, "duration": round(duration, 2)}, "mouthCues": cues}, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Stand-ins for the voice, face and RAG services with configurable latencies,
+so the orchestrator can be loaded without GPUs, cameras or the OpenAI API.
+The responses follow the shapes of VoiceRecognitionResponse,
+FaceRecognitionResponse and RAGResponse. With --redis-port a minimal
+Redis-protocol server holds session state, for running several
+orchestrators with SESSION_STORE_URL=redis://127.0.0.1:<port>.
+
+    python -m loadtest.stubs --voice-latency 0.3 --face-latency 0.05 --rag-latency 1.5
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+import uuid
+import wave
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, File, Form, UploadFile, WebSocket, WebSocketDisconnect, Response
+from pydantic import BaseModel
+
+from stream.types import VoiceRecognitionResponse, FaceRecognitionResponse, Match, RAGResponse
+
+# Seconds of speech the TTS stub returns per character of text
+TTS_SECONDS_PER_CHAR = 0.06
+TTS_SAMPLE_RATE = 24000
+
+ANSWER = ("Welcome to the exhibition. The main hall is straight ahead on your left. "
+          "Guided tours start every hour at the information desk. "
+          "Let me know if you would like directions to anything else.")
+
+
+class StubLatency:
+    def __init__(self, voice: float, tts: float, face: float, rag: float, enroll: float, jitter: float):
+        self.voice = voice
+        self.tts = tts
+        self.face = face
+        self.rag = rag
+        self.enroll = enroll
+        self.jitter = jitter
+
+    async def wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        spread = seconds * self.jitter
+        await asyncio.sleep(max(0.0, random.uniform(seconds - spread, seconds + spread)))
+
+
+class TTSRequest(BaseModel):
+    text: str
+
+
+class QueriesRequest(BaseModel):
+    queries: list[dict]
+    history: Optional[list[dict]] = None
+    session_id: Optional[str] = None
+
+
+def silent_wav(seconds: float, framerate: int = TTS_SAMPLE_RATE) -> bytes:
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(framerate)
+        wav_file.writeframes(b"\x00\x00" * int(seconds * framerate))
+    return wav_buffer.getvalue()
+
+
+def create_voice_app(latency: StubLatency, speakers: int) -> FastAPI:
+    app = FastAPI(title="voice stub")
+    speaker_ids = [uuid.uuid5(uuid.NAMESPACE_OID, f"loadtest-speaker-{i}") for i in range(speakers)]
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.post("/voice/process")
+    async def process(file: UploadFile = File(...)):
+        await file.read()
+        await latency.wait(latency.voice)
+        return [VoiceRecognitionResponse(userid=random.choice(speaker_ids) if speaker_ids else None,
+                                         transcription="Where is the main hall?",
+                                         score=0.9)]
+
+    @app.websocket("/voice/stream")
+    async def stream(websocket: WebSocket):
+        await websocket.accept()
+        receiving: set[int] = set()
+        send_lock = asyncio.Lock()
+
+        async def answer(number: int):
+            await latency.wait(latency.voice)
+            results = [VoiceRecognitionResponse(userid=random.choice(speaker_ids) if speaker_ids else None,
+                                                transcription="Where is the main hall?",
+                                                score=0.9)]
+            async with send_lock:
+                await websocket.send_text(json.dumps({"type": "result", "utterance": number,
+                                                      "results": [json.loads(r.json()) for r in results]}))
+
+        try:
+            while True:
+                data = await websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    break
+                if data.get("text") is None:
+                    continue
+                message = json.loads(data["text"])
+                if message.get("type") == "start":
+                    receiving.add(message["utterance"])
+                elif message.get("type") == "end" and message["utterance"] in receiving:
+                    receiving.discard(message["utterance"])
+                    asyncio.create_task(answer(message["utterance"]))
+                elif message.get("type") == "cancel":
+                    receiving.discard(message["utterance"])
+        except WebSocketDisconnect:
+            pass
+
+    @app.post("/voice/add_user")
+    async def add_user(file: UploadFile = File(...), user_id: str = Form(...)):
+        await file.read()
+        await latency.wait(latency.enroll)
+        return {"user_id": user_id}
+
+    @app.post("/voice/tts")
+    async def tts(request: TTSRequest):
+        await latency.wait(latency.tts)
+        return Response(content=silent_wav(len(request.text) * TTS_SECONDS_PER_CHAR), media_type="audio/wav")
+
+    return app
+
+
+def create_face_app(latency: StubLatency, faces: int) -> FastAPI:
+    app = FastAPI(title="face stub")
+
+    @app.websocket("/api/v2/identify")
+    async def identify(websocket: WebSocket):
+        await websocket.accept()
+        frame_index = 0
+        try:
+            while True:
+                data = await websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    break
+                if data.get("text") is not None:
+                    message = json.loads(data["text"])
+                    if message.get("action") == "close":
+                        break
+                    if message.get("action") == "configure":
+                        continue
+                    request_id = message.get("request_id", frame_index)
+                else:
+                    request_id = frame_index
+                frame_index += 1
+
+                await latency.wait(latency.face)
+                matches = [Match(person_id=f"loadtest-person-{i}", confidence=0.8,
+                                 bbox=[100.0 + 150 * i, 100.0, 220.0 + 150 * i, 260.0])
+                           for i in range(faces)]
+                response = FaceRecognitionResponse(
+                    matches=matches,
+                    face_detected=faces > 0,
+                    processed_faces=faces,
+                    status="success",
+                    tracked=[m.person_id for m in matches],
+                    # Like MatchTimeTracker: new while present for 10-30 frames
+                    new_faces=[m.person_id for m in matches] if 10 <= frame_index <= 30 else [],
+                    request_id=request_id,
+                )
+                await websocket.send_json(response.dict())
+        except WebSocketDisconnect:
+            pass
+
+    @app.post("/api/v2/embed")
+    async def embed(image: UploadFile = File(...), person_id: str = Form(...)):
+        await image.read()
+        await latency.wait(latency.enroll)
+        return {"status": "success", "person_id": person_id}
+
+    @app.post("/api/v2/update")
+    async def update(image: UploadFile = File(...), person_id: str = Form(...)):
+        await image.read()
+        await latency.wait(latency.enroll)
+        return {"status": "success", "person_id": person_id}
+
+    @app.post("/api/v2/mark-greeted")
+    async def mark_greeted(person_ids: list[str] = Form(...)):
+        return {"status": "success", "message": f"Marked {len(person_ids)} users as greeted"}
+
+    return app
+
+
+def create_rag_app(latency: StubLatency) -> FastAPI:
+    app = FastAPI(title="rag stub")
+
+    @app.post("/rag/multi_query")
+    async def multi_query(request: QueriesRequest):
+        await latency.wait(latency.rag)
+        prompt = " ".join(query["question"] for query in request.queries)
+        if request.history is not None:
+            print(f"rag stub: session {request.session_id} asked with {len(request.history)} earlier turns")
+        return RAGResponse(generation=ANSWER, prompt=prompt)
+
+    @app.get("/users/{user_id}/greet")
+    async def greet(user_id: str):
+        await latency.wait(latency.rag)
+        return RAGResponse(generation="Hello again, nice to see you!")
+
+    @app.get("/users/{user_id}/details")
+    async def details(user_id: str):
+        return Response(status_code=404)
+
+    return app
+
+
+class RedisStub:
+    """
+    Just enough of the Redis protocol for the orchestrator's session store:
+    PING, AUTH, SELECT, GET, SET (with EX), DEL and EXPIRE on one keyspace.
+    """
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, Optional[float]]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes]:
+        count = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, command: list[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name in (b"PING", b"AUTH", b"SELECT"):
+            return b"+PONG\r\n" if name == b"PING" else b"+OK\r\n"
+        if name == b"GET":
+            value = self._get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires_at = None
+            if len(args) >= 4 and args[2].upper() == b"EX":
+                expires_at = time.time() + int(args[3])
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % removed
+        if name == b"EXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return b":0\r\n"
+            self.data[args[0]] = (value, time.time() + int(args[1]))
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            del self.data[key]
+            return None
+        return value
+
+
+async def serve(apps: list[tuple[FastAPI, int]], host: str, redis_port: Optional[int] = None):
+    servers = [uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+               for app, port in apps]
+    tasks = [server.serve() for server in servers]
+    if redis_port:
+        redis = await asyncio.start_server(RedisStub().handle, host, redis_port)
+        tasks.append(redis.serve_forever())
+    await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub voice, face and RAG services for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--voice-port", type=int, default=8001)
+    parser.add_argument("--face-port", type=int, default=8000)
+    parser.add_argument("--rag-port", type=int, default=8002)
+    parser.add_argument("--redis-port", type=int, default=None, help="also serve a Redis stand-in for session state")
+    parser.add_argument("--voice-latency", type=float, default=0.3, help="seconds per /voice/process call")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds per /voice/tts call")
+    parser.add_argument("--face-latency", type=float, default=0.05, help="seconds per identified frame")
+    parser.add_argument("--rag-latency", type=float, default=1.5, help="seconds per RAG answer")
+    parser.add_argument("--enroll-latency", type=float, default=0.2, help="seconds per enrollment write")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative spread of every latency")
+    parser.add_argument("--faces", type=int, default=1, help="faces reported in every frame")
+    parser.add_argument("--speakers", type=int, default=3, help="distinct known voices, 0 for always unknown")
+    args = parser.parse_args()
+
+    latency = StubLatency(args.voice_latency, args.tts_latency, args.face_latency,
+                          args.rag_latency, args.enroll_latency, args.jitter)
+    print(f"Stubs: voice :{args.voice_port}, face :{args.face_port}, rag :{args.rag_port}"
+          + (f", redis :{args.redis_port}" if args.redis_port else ""))
+    asyncio.run(serve([
+        (create_voice_app(latency, args.speakers), args.voice_port),
+        (create_face_app(latency, args.faces), args.face_port),
+        (create_rag_app(latency), args.rag_port),
+    ], args.host, args.redis_port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from fastapi.middleware.cors import CORSMiddleware
 from stream.router import router as stream_router
+from stream.clients import service_clients
+from stream.enrollment import enrollment_queue
+from stream.warmup import warmup
+from stream.session_state import session_store
 from dotenv import load_dotenv
 
 load_dotenv()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    await service_clients.start()
+    await enrollment_queue.start()
+    # Runs in the background; /ready reports when it is done
+    warmup.start()
+
+    yield
+
+    # Shutdown
+    await warmup.close()
+    await enrollment_queue.close()
+    await session_store.close()
+    await service_clients.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,159 @@
+import io
+import os
+import wave
+from math import gcd
+from typing import Optional
+import numpy as np
+from scipy.signal import resample_poly
+import logging
+
+try:
+    import soundfile
+except ImportError:  # FLAC uploads need soundfile; WAV works without it
+    soundfile = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# What the voice service's diarization and embedding models expect
+VOICE_SAMPLE_RATE = 16000
+# Sample rate assumed for headerless 16-bit mono PCM from the client
+CLIENT_SAMPLE_RATE = int(os.getenv("CLIENT_SAMPLE_RATE", "48000"))
+# "wav" or "flac" (lossless, about half the size of 16 kHz WAV)
+VOICE_UPLOAD_FORMAT = os.getenv("VOICE_UPLOAD_FORMAT", "wav").lower()
+
+
+def decode_audio(data: bytes) -> tuple[np.ndarray, int]:
+    """
+    Decodes client audio into mono int16 samples and their sample rate.
+    WAV payloads are read from their header, stereo is downmixed, and
+    anything without a RIFF header is taken as 16-bit mono PCM at
+    CLIENT_SAMPLE_RATE.
+    """
+    if data[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(data)) as wav_file:
+                channels = wav_file.getnchannels()
+                sampwidth = wav_file.getsampwidth()
+                framerate = wav_file.getframerate()
+                frames = wav_file.readframes(wav_file.getnframes())
+            if sampwidth == 2:
+                samples = np.frombuffer(frames, dtype="<i2")
+                if channels > 1:
+                    samples = _downmix(samples.reshape(-1, channels))
+                return samples, framerate
+        except (wave.Error, EOFError) as e:
+            if soundfile is None:
+                raise
+            logger.info(f"wave could not read the upload ({e}), trying soundfile")
+        if soundfile is None:
+            raise ValueError(f"Unsupported WAV sample width {sampwidth * 8} bits")
+        samples, framerate = soundfile.read(io.BytesIO(data), dtype="int16", always_2d=True)
+        return _downmix(samples), framerate
+
+    return pcm_samples(data), CLIENT_SAMPLE_RATE
+
+
+def pcm_samples(data: bytes) -> np.ndarray:
+    """Headerless 16-bit mono PCM as int16 samples; a trailing odd byte is ignored."""
+    usable = len(data) - len(data) % 2
+    return np.frombuffer(data[:usable], dtype="<i2")
+
+
+def _downmix(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1 or samples.shape[1] == 1:
+        return samples.reshape(-1)
+    return samples.mean(axis=1, dtype=np.float32).astype(np.int16)
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int = VOICE_SAMPLE_RATE) -> np.ndarray:
+    """Polyphase resampling of int16 samples from `rate` to `target_rate`."""
+    if rate == target_rate or samples.size == 0:
+        return samples
+    divisor = gcd(rate, target_rate)
+    resampled = resample_poly(samples.astype(np.float32), target_rate // divisor, rate // divisor)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+class StreamResampler:
+    """
+    Resamples int16 audio that arrives in chunks, giving the same samples as
+    `resample` on the whole recording. Input within the filter's reach of the
+    newest sample is held back until more audio (or `flush`) arrives.
+    """
+    def __init__(self, rate: int, target_rate: int = VOICE_SAMPLE_RATE):
+        divisor = gcd(rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = rate // divisor
+        self.passthrough = self.up == self.down
+        # resample_poly's filter spans 10 * max(up, down) upsampled samples each side
+        reach = -(-10 * max(self.up, self.down) // self.up) + 1
+        self.reach = -(-reach // self.down) * self.down
+        # Zeros stand in for the audio before the start, as resample_poly pads
+        self.buffer = np.zeros(self.reach, dtype=np.float32)
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        if self.passthrough:
+            return samples
+        self.buffer = np.concatenate([self.buffer, samples.astype(np.float32)])
+        settled = (len(self.buffer) - self.reach) // self.down * self.down
+        if settled <= self.reach:
+            return np.empty(0, dtype=np.int16)
+        out = self._emit(resample_poly(self.buffer[:settled + self.reach], self.up, self.down), settled)
+        self.buffer = self.buffer[settled - self.reach:]
+        return out
+
+    def flush(self) -> np.ndarray:
+        if self.passthrough or len(self.buffer) <= self.reach:
+            return np.empty(0, dtype=np.int16)
+        out = self._emit(resample_poly(self.buffer, self.up, self.down), None)
+        self.buffer = np.zeros(self.reach, dtype=np.float32)
+        return out
+
+    def _emit(self, resampled: np.ndarray, settled: Optional[int]) -> np.ndarray:
+        start = self.reach * self.up // self.down
+        end = None if settled is None else settled * self.up // self.down
+        return np.clip(np.round(resampled[start:end]), -32768, 32767).astype(np.int16)
+
+
+def to_voice_samples(data: bytes) -> np.ndarray:
+    """Client audio as 16 kHz mono int16 samples."""
+    samples, rate = decode_audio(data)
+    return resample(samples, rate)
+
+
+def encode_audio(samples: np.ndarray, rate: int, fmt: str = VOICE_UPLOAD_FORMAT) -> tuple[bytes, str, str]:
+    """Encodes mono int16 samples; returns (bytes, file name, content type)."""
+    if fmt == "flac":
+        if soundfile is not None:
+            buffer = io.BytesIO()
+            soundfile.write(buffer, samples, rate, format="FLAC", subtype="PCM_16")
+            return buffer.getvalue(), "audio.flac", "audio/flac"
+        logger.warning("VOICE_UPLOAD_FORMAT=flac needs soundfile; uploading WAV instead")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue(), "audio.wav", "audio/wav"
+
+
+def prepare_voice_upload(data: bytes, fmt: str = VOICE_UPLOAD_FORMAT) -> tuple[bytes, str, str]:
+    """
+    Client audio as 16 kHz mono 16-bit audio in `fmt`, ready for the voice
+    service, which then skips its own conversion.
+    """
+    return encode_audio(to_voice_samples(data), VOICE_SAMPLE_RATE, fmt)
+
+
+def audio_duration(data: bytes) -> float:
+    """Duration in seconds of client audio, read from the WAV header if present."""
+    if data[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(data)) as wav_file:
+                return wav_file.getnframes() / wav_file.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    return len(data) / (2 * CLIENT_SAMPLE_RATE)
@@ -0,0 +1,95 @@
+import os
+from typing import Optional
+import httpx
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class UpstreamConfig:
+    """
+    Connection settings for one upstream service, read from the environment
+    with the service prefix, e.g. VOICE_HTTP_TIMEOUT or RAG_HTTP_MAX_CONNECTIONS.
+    """
+    def __init__(self, name: str, base_url: str, timeout: float, max_connections: int, max_keepalive: int):
+        prefix = name.upper()
+        self.name = name
+        self.base_url = base_url
+        self.timeout = float(os.getenv(f"{prefix}_HTTP_TIMEOUT", timeout))
+        self.connect_timeout = float(os.getenv(f"{prefix}_HTTP_CONNECT_TIMEOUT", 5.0))
+        self.max_connections = int(os.getenv(f"{prefix}_HTTP_MAX_CONNECTIONS", max_connections))
+        self.max_keepalive = int(os.getenv(f"{prefix}_HTTP_MAX_KEEPALIVE", max_keepalive))
+
+    def build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=60.0,
+            ),
+        )
+
+
+def _upstream_configs() -> dict[str, UpstreamConfig]:
+    voice_host = os.getenv("VOICE_RECOGNITION_HOST", "127.0.0.1")
+    voice_port = os.getenv("VOICE_RECOGNITION_PORT", "8001")
+    face_host = os.getenv("FACE_RECOGNITION_HOST", "127.0.0.1")
+    face_port = os.getenv("FACE_RECOGNITION_PORT", "8000")
+    rag_host = os.getenv("RAG_HOST", "localhost")
+    rag_port = os.getenv("RAG_PORT", "8002")
+    return {
+        "voice": UpstreamConfig("voice", f"http://{voice_host}:{voice_port}", timeout=60.0, max_connections=16, max_keepalive=8),
+        "face": UpstreamConfig("face", f"http://{face_host}:{face_port}", timeout=60.0, max_connections=16, max_keepalive=8),
+        "rag": UpstreamConfig("rag", f"http://{rag_host}:{rag_port}", timeout=120.0, max_connections=32, max_keepalive=16),
+    }
+
+
+class ServiceClients:
+    """
+    One keep-alive connection pool per upstream service. Opened by the app
+    lifespan and shared by every session; a pool is created on first use if
+    the lifespan has not run (e.g. when a module is imported on its own).
+    """
+    def __init__(self):
+        self.configs: dict[str, UpstreamConfig] = {}
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    async def start(self):
+        self.configs = _upstream_configs()
+        for name, config in self.configs.items():
+            if name not in self.clients:
+                self.clients[name] = config.build_client()
+                logger.info(f"HTTP pool for {name} -> {config.base_url} "
+                            f"(timeout={config.timeout}s, max_connections={config.max_connections})")
+
+    async def close(self):
+        for name, client in list(self.clients.items()):
+            await client.aclose()
+        self.clients = {}
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client: Optional[httpx.AsyncClient] = self.clients.get(name)
+        if client is None or client.is_closed:
+            if not self.configs:
+                self.configs = _upstream_configs()
+            client = self.configs[name].build_client()
+            self.clients[name] = client
+        return client
+
+    @property
+    def voice(self) -> httpx.AsyncClient:
+        return self.get("voice")
+
+    @property
+    def face(self) -> httpx.AsyncClient:
+        return self.get("face")
+
+    @property
+    def rag(self) -> httpx.AsyncClient:
+        return self.get("rag")
+
+
+service_clients = ServiceClients()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VOICE = "voice"
+FACE = "face"
+
+ENROLLMENT_WORKERS = int(os.getenv("ENROLLMENT_WORKERS", "2"))
+ENROLLMENT_MAX_RETRIES = int(os.getenv("ENROLLMENT_MAX_RETRIES", "3"))
+ENROLLMENT_RETRY_DELAY = float(os.getenv("ENROLLMENT_RETRY_DELAY", "1.0"))
+
+
+class EnrollmentJob:
+    def __init__(self, user_id, modality: str, action: Callable[..., Awaitable[Any]], payload: bytes, seq: int = 0):
+        self.user_id = user_id
+        self.modality = modality
+        self.action = action
+        self.payload = payload
+        self.submitted_at = time.time()
+        # Order of the sample among all submissions; a retry of an older one never overwrites a newer one
+        self.seq = seq
+        self.attempts = 0
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return (str(self.user_id), self.modality)
+
+
+class EnrollmentQueue:
+    """
+    Persists voice and face enrollments in the background so the answer does
+    not wait for an embedding pass. Jobs are keyed by (user, modality): a new
+    submission for a key that is still pending replaces the pending payload
+    instead of queueing a second write. Failed jobs (an exception or a None
+    result) are retried with a linear backoff, unless a newer sample for the
+    same key was submitted meanwhile.
+    """
+    def __init__(self, workers: int = ENROLLMENT_WORKERS, max_retries: int = ENROLLMENT_MAX_RETRIES,
+                 retry_delay: float = ENROLLMENT_RETRY_DELAY):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.pending: dict[tuple[str, str], EnrollmentJob] = {}
+        # Sequence number of the newest sample submitted per (user, modality) not yet written or given up on
+        self.latest: dict[tuple[str, str], int] = {}
+        self.next_seq = 0
+        # Serializes writes for the same (user, modality) across workers
+        self.locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: list[asyncio.Task] = []
+        # Backoff timers of failed jobs, kept so they are not garbage-collected and can be cancelled on close
+        self.retries: set[asyncio.Task] = set()
+        self.last_lag = 0.0
+        self.counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "retried": 0,
+            "failed": 0,
+        }
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.queue = asyncio.Queue()
+        for key in self.pending:
+            self.queue.put_nowait(key)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Enrollment queue started with {self.workers} workers")
+
+    async def close(self):
+        retrying = len(self.retries)
+        for task in self.tasks + list(self.retries):
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.retries, return_exceptions=True)
+        self.tasks = []
+        self.retries.clear()
+        if self.pending or retrying:
+            logger.warning(f"Enrollment queue closed with {len(self.pending)} pending jobs "
+                           f"and {retrying} waiting to be retried")
+
+    def submit(self, user_id, modality: str, action: Callable[..., Awaitable[Any]], payload: bytes):
+        """Schedules `action(user_id, payload)` and returns immediately."""
+        if payload is None:
+            logger.warning(f"Skipping {modality} enrollment for {user_id}: no payload")
+            return
+        if not self.tasks:
+            asyncio.get_running_loop().create_task(self.start())
+        job = EnrollmentJob(user_id, modality, action, payload, self.next_seq)
+        self.next_seq += 1
+        self.latest[job.key] = job.seq
+        self.counters["submitted"] += 1
+        existing = self.pending.get(job.key)
+        if existing is not None:
+            # Keep the place in the queue, write the newest sample
+            existing.action = action
+            existing.payload = payload
+            existing.seq = job.seq
+            self.counters["deduplicated"] += 1
+            return
+        self.pending[job.key] = job
+        if self.queue is not None:
+            self.queue.put_nowait(job.key)
+
+    def depth(self) -> int:
+        return len(self.pending)
+
+    def lag(self) -> float:
+        """Age in seconds of the oldest job that has not been written yet."""
+        if not self.pending:
+            return 0.0
+        return time.time() - min(job.submitted_at for job in self.pending.values())
+
+    def stats(self) -> dict:
+        return {**self.counters, "depth": self.depth(), "lag": self.lag(), "last_lag": self.last_lag}
+
+    async def _worker(self):
+        while True:
+            key = await self.queue.get()
+            lock = self.locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                job = self.pending.pop(key, None)
+                if job is None:
+                    continue
+                job.attempts += 1
+                try:
+                    result = await job.action(job.user_id, job.payload)
+                except Exception as e:
+                    logger.error(f"{job.modality} enrollment for {job.user_id} failed: {e}")
+                    result = None
+            if not lock.locked() and key not in self.pending:
+                self.locks.pop(key, None)
+
+            if result is not None:
+                self._settle(job)
+                self.counters["completed"] += 1
+                self.last_lag = time.time() - job.submitted_at
+                logger.info(f"Enrolled {job.modality} for {job.user_id} after {self.last_lag:.2f}s")
+            elif job.attempts <= self.max_retries:
+                self.counters["retried"] += 1
+                retry = asyncio.create_task(self._retry(job))
+                self.retries.add(retry)
+                retry.add_done_callback(self.retries.discard)
+            else:
+                self._settle(job)
+                self.counters["failed"] += 1
+                logger.error(f"Giving up on {job.modality} enrollment for {job.user_id} after {job.attempts} attempts")
+
+    async def _retry(self, job: EnrollmentJob):
+        await asyncio.sleep(self.retry_delay * job.attempts)
+        if job.key in self.pending or self.latest.get(job.key) != job.seq:
+            # A newer sample for this user and modality is queued or was already written
+            return
+        self.pending[job.key] = job
+        self.queue.put_nowait(job.key)
+
+    def _settle(self, job: EnrollmentJob):
+        """Forgets the key once its newest sample is written or given up on."""
+        if self.latest.get(job.key) == job.seq:
+            del self.latest[job.key]
+
+
+enrollment_queue = EnrollmentQueue()
@@ -0,0 +1,120 @@
+import os
+import statistics
+import time
+from collections import Counter, deque
+from typing import NamedTuple, Optional
+
+from .types import FaceRecognitionResponse, Match
+
+# Snapshots kept per session; at ~15 fps this is roughly 40 seconds
+FACE_HISTORY_SIZE = int(os.getenv("FACE_HISTORY_SIZE", "600"))
+# Fraction of the window's snapshots a person must appear in to count as present
+FACE_VOTE_RATIO = float(os.getenv("FACE_VOTE_RATIO", "0.3"))
+# How far before an utterance a snapshot may be when none fall inside it
+FACE_HISTORY_GRACE = float(os.getenv("FACE_HISTORY_GRACE", "2.0"))
+
+
+class FaceSnapshot(NamedTuple):
+    timestamp: float
+    frame: bytes
+    state: FaceRecognitionResponse
+
+
+class FaceStateHistory:
+    """
+    Bounded, time-ordered ring buffer of face recognition results for one
+    session, so identity fusion can look at the faces seen while a person
+    was actually speaking instead of whatever the last frame returned.
+    """
+    def __init__(self, max_size: int = FACE_HISTORY_SIZE):
+        self.snapshots: deque[FaceSnapshot] = deque(maxlen=max_size)
+
+    def add(self, frame: bytes, state: FaceRecognitionResponse, timestamp: Optional[float] = None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        # Pipelined responses can complete slightly out of capture order
+        if self.snapshots and timestamp < self.snapshots[-1].timestamp:
+            timestamp = self.snapshots[-1].timestamp
+        self.snapshots.append(FaceSnapshot(timestamp, frame, state))
+
+    def latest(self) -> Optional[FaceSnapshot]:
+        return self.snapshots[-1] if self.snapshots else None
+
+    def clear(self):
+        self.snapshots.clear()
+
+    def window(self, t_start: float, t_end: float, grace: float = FACE_HISTORY_GRACE) -> list[FaceSnapshot]:
+        """
+        Snapshots captured between t_start and t_end. If none were, the last
+        snapshot from up to `grace` seconds before t_start is used instead.
+        """
+        in_window = [s for s in self.snapshots if t_start <= s.timestamp <= t_end]
+        if in_window:
+            return in_window
+        before = [s for s in self.snapshots if t_start - grace <= s.timestamp < t_start]
+        return before[-1:]
+
+    def aggregate(self, t_start: float, t_end: float, min_ratio: float = FACE_VOTE_RATIO) -> Optional[FaceSnapshot]:
+        """
+        Fuses the snapshots in [t_start, t_end] into one FaceRecognitionResponse
+        by voting. A known person is kept if they appear in at least `min_ratio`
+        of the snapshots. The face count is the median over the window, and
+        the remaining slots are Unknown faces. The returned frame is the
+        latest one whose own result agrees best with the fused result, so
+        enrollment uploads a representative image.
+        """
+        snapshots = self.window(t_start, t_end)
+        if not snapshots:
+            return None
+
+        total = len(snapshots)
+        votes = Counter()
+        confidences: dict[str, list[float]] = {}
+        bboxes: dict[str, Optional[list[float]]] = {}
+        tracked = set()
+        for snapshot in snapshots:
+            seen = set()
+            for match in snapshot.state.matches:
+                if match.person_id == "Unknown" or match.person_id in seen:
+                    continue
+                seen.add(match.person_id)
+                votes[match.person_id] += 1
+                confidences.setdefault(match.person_id, []).append(match.confidence or 0.0)
+                bboxes[match.person_id] = match.bbox
+            tracked.update(snapshot.state.tracked or [])
+
+        face_count = statistics.median_low(len(s.state.matches) for s in snapshots)
+        face_detected = sum(1 for s in snapshots if s.state.face_detected) * 2 > total
+
+        known = [person_id for person_id, count in votes.most_common() if count / total >= min_ratio]
+        known = known[:face_count]
+        matches = [
+            Match(person_id=person_id,
+                  confidence=sum(confidences[person_id]) / len(confidences[person_id]),
+                  bbox=bboxes[person_id])
+            for person_id in known
+        ]
+
+        latest = snapshots[-1].state
+        unknown_bboxes = [m.bbox for m in latest.matches if m.person_id == "Unknown"]
+        for i in range(face_count - len(matches)):
+            bbox = unknown_bboxes[i] if i < len(unknown_bboxes) else None
+            matches.append(Match(person_id="Unknown", confidence=0, bbox=bbox))
+
+        fused = FaceRecognitionResponse(
+            matches=matches,
+            face_detected=face_detected and face_count > 0,
+            processed_faces=face_count,
+            status="success",
+            tracked=[person_id for person_id in known if person_id in tracked],
+            new_faces=latest.new_faces,
+            lip_center=latest.lip_center,
+        )
+
+        known_set = set(known)
+        def agreement(snapshot: FaceSnapshot) -> tuple[int, bool, float]:
+            ids = {m.person_id for m in snapshot.state.matches if m.person_id != "Unknown"}
+            return (len(ids & known_set) - len(ids - known_set),
+                    len(snapshot.state.matches) == face_count,
+                    snapshot.timestamp)
+        best = max(snapshots, key=agreement)
+        return FaceSnapshot(best.timestamp, best.frame, fused)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+from typing import NamedTuple, Optional
+import logging
+
+from .types import FaceRecognitionResponse, Match
+from .utils import get_user_greeting
+from .speech import render_speech
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GREETINGS_ENABLED = os.getenv("GREETINGS_ENABLED", "1") == "1"
+# A prepared greeting is discarded once its person has been out of view this many seconds
+GREETING_TTL = float(os.getenv("GREETING_TTL", "60"))
+# Face bounding box width in pixels at which a person counts as at the kiosk
+GREETING_MIN_FACE_WIDTH = float(os.getenv("GREETING_MIN_FACE_WIDTH", "120"))
+
+
+class PreparedGreeting(NamedTuple):
+    person_id: str
+    text: str
+    speech: tuple[bytes, dict]
+    prepared_at: float
+
+
+class Greeter:
+    """
+    Per-session greeting slot. When the face service reports people in
+    `new_faces`, their greeting is fetched from the RAG service and rendered
+    (TTS and lip-sync) in the background. The prepared greeting waits in the
+    slot until its person is in frame and close enough to the kiosk, so it
+    can play without waiting on RAG or TTS. It is kept for as long as its
+    person stays in view, however far away, and is only discarded once they
+    have been gone `ttl` seconds; someone who lingers in the background is
+    therefore prepared for once, not again every `ttl` seconds.
+    """
+    def __init__(self, ttl: float = GREETING_TTL, min_face_width: float = GREETING_MIN_FACE_WIDTH):
+        self.ttl = ttl
+        self.min_face_width = min_face_width
+        self.preparing: dict[str, asyncio.Task] = {}
+        self.ready: dict[str, PreparedGreeting] = {}
+        # When each person with a greeting preparing or ready was last in frame
+        self.last_seen: dict[str, float] = {}
+        # Played in this session; the face service may still list them as new
+        # until mark_greeted has gone through
+        self.greeted: set[str] = set()
+
+    def observe(self, face_state: FaceRecognitionResponse):
+        """Starts preparing greetings for newly reported people."""
+        now = time.time()
+        for match in face_state.matches:
+            if match.person_id in self.last_seen:
+                self.last_seen[match.person_id] = now
+        for person_id in face_state.new_faces or []:
+            if person_id == "Unknown" or person_id in self.greeted:
+                continue
+            if person_id in self.ready or person_id in self.preparing:
+                continue
+            self.last_seen[person_id] = now
+            self.preparing[person_id] = asyncio.create_task(self._prepare(person_id))
+
+    def take(self, face_state: FaceRecognitionResponse) -> Optional[PreparedGreeting]:
+        """Removes and returns a ready greeting whose person is at the kiosk."""
+        self._expire()
+        for match in face_state.matches:
+            greeting = self.ready.get(match.person_id)
+            if greeting is not None and self._is_close(match):
+                del self.ready[match.person_id]
+                self.last_seen.pop(match.person_id, None)
+                return greeting
+        return None
+
+    def mark_played(self, person_id: str):
+        self.greeted.add(person_id)
+
+    def close(self):
+        for task in self.preparing.values():
+            task.cancel()
+        self.preparing.clear()
+        self.ready.clear()
+        self.last_seen.clear()
+
+    async def _prepare(self, person_id: str):
+        try:
+            start = time.time()
+            greeting = await get_user_greeting(person_id)
+            speech = await render_speech(greeting.generation)
+            self.ready[person_id] = PreparedGreeting(person_id, greeting.generation, speech, time.time())
+            logger.info(f"Greeting for {person_id} prepared in {time.time() - start:.2f}s")
+        except Exception as e:
+            # Dropped from `preparing` below, so a later sighting retries
+            logger.error(f"Could not prepare greeting for {person_id}: {e}")
+            self.last_seen.pop(person_id, None)
+        finally:
+            self.preparing.pop(person_id, None)
+
+    def _expire(self):
+        deadline = time.time() - self.ttl
+        for person_id, greeting in list(self.ready.items()):
+            if self.last_seen.get(person_id, greeting.prepared_at) < deadline:
+                del self.ready[person_id]
+                self.last_seen.pop(person_id, None)
+
+    def _is_close(self, match: Match) -> bool:
+        if not match.bbox or len(match.bbox) < 4:
+            return False
+        return match.bbox[2] - match.bbox[0] >= self.min_face_width
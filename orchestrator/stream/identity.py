@@ -0,0 +1,239 @@
+import os
+import time
+from typing import List, Optional
+
+from .types import FaceRecognitionResponse, Match
+from .metrics import registry
+
+# Seconds a binding is trusted before the full fusion runs again
+IDENTITY_BINDING_TTL = float(os.getenv("IDENTITY_BINDING_TTL", "120"))
+# Seconds without a tracker confirmation for a binding's confidence to halve
+IDENTITY_BINDING_HALF_LIFE = float(os.getenv("IDENTITY_BINDING_HALF_LIFE", "30"))
+# Confidence below which a binding no longer short-circuits fusion
+IDENTITY_BINDING_MIN_CONFIDENCE = float(os.getenv("IDENTITY_BINDING_MIN_CONFIDENCE", "0.5"))
+# Overlap (intersection over union) an unknown face needs with a bound face to be taken for it
+IDENTITY_FACE_MIN_OVERLAP = float(os.getenv("IDENTITY_FACE_MIN_OVERLAP", "0.3"))
+# Seconds a bound face may go unseen before an unknown face in the same place counts as someone else
+IDENTITY_FACE_MAX_GAP = float(os.getenv("IDENTITY_FACE_MAX_GAP", "2"))
+
+IDENTITY_LOOKUPS = registry.counter(
+    "orchestrator_identity_binding_lookups_total",
+    "Identity binding lookups by result (hit or miss).",
+)
+ENROLLMENTS_SUPPRESSED = registry.counter(
+    "orchestrator_enrollments_suppressed_total",
+    "Enrollment writes skipped because the same one was made while its binding was fresh, by modality.",
+)
+
+
+class IdentityBinding:
+    """
+    A voice bound to the face that was seen speaking with it and to the
+    person identity fusion settled on. `face_id` is the face service's id
+    for that face (None while it was still unknown); `bbox` is where it was
+    last seen, so an unknown face can be followed from frame to frame.
+    """
+    def __init__(self, voice_id: str, person_id: str, new_user: bool = False, face: Optional[Match] = None):
+        self.voice_id = voice_id
+        self.person_id = person_id
+        # Created together with a brand new user whose enrollment may still be pending
+        self.new_user = new_user
+        self.face_id: Optional[str] = None
+        self.bbox: Optional[List[float]] = None
+        self.bound_at = time.time()
+        self.face_seen_at = self.bound_at
+        self.confirmed_at = self.bound_at
+        self.seen = False
+        self.observe(face, self.bound_at)
+
+    def observe(self, face: Optional[Match], now: float):
+        """Records `face` as this speaker's face, seen at `now`."""
+        if face is None:
+            return
+        if face.person_id != "Unknown":
+            self.face_id = face.person_id
+        if face.bbox:
+            self.bbox = face.bbox
+        self.face_seen_at = now
+
+    def confidence(self, now: float, half_life: float) -> float:
+        return 0.5 ** ((now - self.confirmed_at) / half_life)
+
+    def snapshot(self) -> dict:
+        return {"voice_id": self.voice_id, "person_id": self.person_id, "new_user": self.new_user,
+                "face_id": self.face_id, "bbox": self.bbox, "face_seen_at": self.face_seen_at,
+                "bound_at": self.bound_at, "confirmed_at": self.confirmed_at, "seen": self.seen}
+
+    @classmethod
+    def restore(cls, state: dict) -> "IdentityBinding":
+        binding = cls(state["voice_id"], state["person_id"], state["new_user"])
+        binding.face_id = state.get("face_id")
+        binding.bbox = state.get("bbox")
+        binding.bound_at = state["bound_at"]
+        binding.face_seen_at = state.get("face_seen_at", binding.bound_at)
+        binding.confirmed_at = state["confirmed_at"]
+        binding.seen = state["seen"]
+        return binding
+
+
+class IdentityBindings:
+    """
+    Per-session table binding a voice id to the face seen speaking with it
+    and, through identity fusion, to a person id. A binding lives at most
+    `ttl` seconds; in between its confidence halves every `half_life`
+    seconds unless its face is confirmed still in view. While a binding is
+    fresh and its face is in the frame the orchestrator skips identity
+    fusion for that voice and does not repeat enrollment writes it already
+    made.
+
+    The face service does not expose its internal track ids, so a face
+    counts as the same track when the service reports its person or face id
+    (recognized or tracked), or, while it is unknown, when a face overlaps
+    where it was seen at most `face_max_gap` seconds ago.
+    """
+    def __init__(self, ttl: float = IDENTITY_BINDING_TTL, half_life: float = IDENTITY_BINDING_HALF_LIFE,
+                 min_confidence: float = IDENTITY_BINDING_MIN_CONFIDENCE,
+                 face_min_overlap: float = IDENTITY_FACE_MIN_OVERLAP,
+                 face_max_gap: float = IDENTITY_FACE_MAX_GAP):
+        self.ttl = ttl
+        self.half_life = half_life
+        self.min_confidence = min_confidence
+        self.face_min_overlap = face_min_overlap
+        self.face_max_gap = face_max_gap
+        self.bindings: dict[str, IdentityBinding] = {}
+        # (user id, modality) -> when the enrollment was submitted
+        self.enrollments: dict[tuple[str, str], float] = {}
+
+    def bind(self, voice_id, person_id, face: Optional[Match] = None, new_user: bool = False) -> IdentityBinding:
+        """Binds `voice_id` to `person_id` and to `face`, the face seen speaking with it."""
+        voice_id, person_id = str(voice_id), str(person_id)
+        now = time.time()
+        binding = self.bindings.get(voice_id)
+        if binding is not None and binding.person_id == person_id and self._is_fresh(binding, now):
+            binding.confirmed_at = now
+            binding.observe(face, now)
+            return binding
+        binding = IdentityBinding(voice_id, person_id, new_user, face)
+        self.bindings[voice_id] = binding
+        return binding
+
+    def confirm(self, face_state: FaceRecognitionResponse):
+        """Refreshes the bindings whose face is still in view and follows where it is."""
+        if not self.bindings:
+            return
+        now = time.time()
+        recognized = {m.person_id for m in face_state.matches if m.person_id != "Unknown"}
+        for binding in self.bindings.values():
+            if binding.person_id in recognized:
+                binding.seen = True
+            if self._in_view(binding, face_state, now):
+                binding.confirmed_at = now
+
+    def lookup(self, voice_id, face_state: FaceRecognitionResponse) -> Optional[IdentityBinding]:
+        """The fresh binding for `voice_id` if its face is in `face_state`."""
+        self._expire()
+        binding = self.bindings.get(str(voice_id))
+        if binding is None or not self._in_view(binding, face_state, time.time()):
+            IDENTITY_LOOKUPS.inc(result="miss")
+            return None
+        IDENTITY_LOOKUPS.inc(result="hit")
+        return binding
+
+    def pending_new_user(self, face: Match, face_state: FaceRecognitionResponse) -> Optional[IdentityBinding]:
+        """
+        The fresh binding of a new user the face service has not recognized
+        yet if `face` is theirs: their id is tracked, or `face` is where
+        their face was seen moments ago. The same unknown speaker is then
+        not enrolled again while the first enrollment lands, while a
+        stranger who steps up after them is still enrolled as a new user.
+        """
+        self._expire()
+        now = time.time()
+        tracked = set(face_state.tracked or [])
+        pending = [b for b in self.bindings.values() if b.new_user and not b.seen]
+        for binding in sorted(pending, key=lambda b: b.bound_at, reverse=True):
+            if binding.person_id in tracked or self._follow(binding, [face], now):
+                return binding
+        return None
+
+    def should_enroll(self, user_id, modality: str) -> bool:
+        """
+        False if the same enrollment was already submitted within the TTL;
+        otherwise records it and returns True.
+        """
+        now = time.time()
+        key = (str(user_id), modality)
+        submitted_at = self.enrollments.get(key)
+        if submitted_at is not None and now - submitted_at < self.ttl:
+            ENROLLMENTS_SUPPRESSED.inc(modality=modality)
+            return False
+        self.enrollments[key] = now
+        return True
+
+    def clear(self):
+        self.bindings.clear()
+        self.enrollments.clear()
+
+    def snapshot(self) -> dict:
+        """The fresh bindings and enrollments, for the session store."""
+        self._expire()
+        return {
+            "bindings": [binding.snapshot() for binding in self.bindings.values()],
+            "enrollments": [[user_id, modality, submitted_at]
+                            for (user_id, modality), submitted_at in self.enrollments.items()],
+        }
+
+    def restore(self, state: dict):
+        """Takes over a snapshot made by this or another replica; stale entries expire as usual."""
+        self.bindings = {b["voice_id"]: IdentityBinding.restore(b) for b in state.get("bindings", [])}
+        self.enrollments = {(user_id, modality): submitted_at
+                            for user_id, modality, submitted_at in state.get("enrollments", [])}
+        self._expire()
+
+    def _in_view(self, binding: IdentityBinding, face_state: FaceRecognitionResponse, now: float) -> bool:
+        """Whether `binding`'s face is in `face_state`; records where it was seen if so."""
+        ids = {binding.person_id, binding.face_id} - {None}
+        for match in face_state.matches:
+            if match.person_id in ids:
+                binding.observe(match, now)
+                return True
+        if ids & set(face_state.tracked or []):
+            binding.face_seen_at = now
+            return True
+        return self._follow(binding, [m for m in face_state.matches if m.person_id == "Unknown"], now)
+
+    def _follow(self, binding: IdentityBinding, faces: List[Match], now: float) -> bool:
+        """Moves `binding`'s face to the one of `faces` that continues it, if any."""
+        if now - binding.face_seen_at > self.face_max_gap:
+            return False
+        best = max(faces, key=lambda m: box_overlap(binding.bbox, m.bbox), default=None)
+        if best is None or box_overlap(binding.bbox, best.bbox) < self.face_min_overlap:
+            return False
+        binding.observe(best, now)
+        return True
+
+    def _is_fresh(self, binding: IdentityBinding, now: float) -> bool:
+        return (now - binding.bound_at < self.ttl
+                and binding.confidence(now, self.half_life) >= self.min_confidence)
+
+    def _expire(self):
+        now = time.time()
+        for voice_id, binding in list(self.bindings.items()):
+            if not self._is_fresh(binding, now):
+                del self.bindings[voice_id]
+        for key, submitted_at in list(self.enrollments.items()):
+            if now - submitted_at >= self.ttl:
+                del self.enrollments[key]
+
+
+def box_overlap(a: Optional[List[float]], b: Optional[List[float]]) -> float:
+    """Intersection over union of two [x1, y1, x2, y2] boxes; 0 if either is missing."""
+    if not a or not b or len(a) < 4 or len(b) < 4:
+        return 0.0
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
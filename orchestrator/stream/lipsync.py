@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import logging
+
+from .metrics import span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RHUBARB_PATH = os.getenv("RHUBARB_PATH", os.path.join("rhubarb", "rhubarb.exe"))
+
+
+class LipSyncError(Exception):
+    pass
+
+
+class LipSyncEngine:
+    """
+    Runs rhubarb as an async subprocess. Each job gets its own temp directory,
+    at most `max_workers` jobs run at once, and a job that exceeds `timeout`
+    seconds is killed. The viseme JSON is read from rhubarb's stdout.
+    """
+    def __init__(self, rhubarb_path: str = RHUBARB_PATH, max_workers: int | None = None, timeout: float | None = None):
+        self.rhubarb_path = rhubarb_path
+        self.max_workers = max_workers or int(os.getenv("LIPSYNC_MAX_WORKERS", os.cpu_count() or 2))
+        self.timeout = timeout or float(os.getenv("LIPSYNC_TIMEOUT", "30"))
+        self.semaphore = asyncio.Semaphore(self.max_workers)
+
+    async def generate(self, audio: bytes) -> dict:
+        """Generate rhubarb mouth cues for in-memory WAV bytes."""
+        with span("lipsync"):
+            return await self._generate(audio)
+
+    async def _generate(self, audio: bytes) -> dict:
+        async with self.semaphore:
+            start_time = time.time()
+            with tempfile.TemporaryDirectory(prefix="lipsync-") as tmp_dir:
+                wav_path = os.path.join(tmp_dir, "audio.wav")
+                await asyncio.to_thread(_write_file, wav_path, audio)
+
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        self.rhubarb_path, "-f", "json", "-r", "phonetic", wav_path,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
+                except OSError as e:
+                    raise LipSyncError(f"Could not start rhubarb at {self.rhubarb_path}: {e}")
+
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise LipSyncError(f"Lip sync timed out after {self.timeout}s")
+                except asyncio.CancelledError:
+                    process.kill()
+                    await process.wait()
+                    raise
+
+            if process.returncode != 0:
+                raise LipSyncError(f"Command failed: {stderr.decode(errors='replace')}")
+
+            try:
+                lipsync_data = json.loads(stdout)
+            except json.JSONDecodeError as e:
+                raise LipSyncError(f"Invalid rhubarb output: {e}")
+
+            logger.info(f"Lip sync done in {int((time.time() - start_time) * 1000)}ms")
+            return lipsync_data
+
+
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+lip_sync_engine = LipSyncEngine()
@@ -0,0 +1,170 @@
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+# Latency buckets in seconds, from a fast socket send up to a slow RAG answer
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in items)
+    return "{" + body + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+
+class Gauge:
+    """
+    A gauge whose value is set directly or read from a callback at scrape
+    time. The callback returns a number or a list of (labels, value) pairs.
+    """
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], list | float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self.values[_label_key(labels)] = value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        values = dict(self.values)
+        if self.callback is not None:
+            result = self.callback()
+            if isinstance(result, list):
+                for labels, value in result:
+                    values[_label_key(labels)] = value
+            else:
+                values[()] = result
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = [0] * len(self.buckets) + [0.0, 0]
+            self.values[key] = series
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(key)} {series[-1]}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram(
+    "orchestrator_stage_latency_seconds",
+    "Latency of each answer pipeline stage.",
+)
+STAGE_ERRORS = registry.counter(
+    "orchestrator_stage_errors_total",
+    "Pipeline stages that raised an exception.",
+)
+TIME_TO_FIRST_AUDIO = registry.histogram(
+    "orchestrator_time_to_first_audio_seconds",
+    "Time from receiving an utterance until the first answer audio was sent, by delivery mode.",
+)
+FACE_ROUNDTRIP = registry.histogram(
+    "orchestrator_face_roundtrip_seconds",
+    "Time from sending a frame to the face service until its response arrived.",
+)
+FRAMES = registry.counter(
+    "orchestrator_frames_total",
+    "Video frames by outcome (received, coalesced, sent, completed, dropped, errors).",
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block (sync or async) as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
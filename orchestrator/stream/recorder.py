@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterator, Optional, Union
+import logging
+
+from .metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# When set, every session's client messages are recorded into this directory
+RECORD_SESSIONS_DIR = os.getenv("RECORD_SESSIONS_DIR")
+# Messages a session may have waiting for its writer before further ones are dropped from the recording
+RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", "1000"))
+
+RECORDED_MESSAGES_DROPPED = registry.counter(
+    "orchestrator_recorded_messages_dropped_total",
+    "Messages left out of a session recording because its writer fell behind.",
+)
+
+_CLOSE = object()
+
+
+class SessionRecorder:
+    """
+    Records the messages a kiosk sends on /ws/media and /ws/img into a gzip
+    JSON-lines file, one line per message with its offset from the start of
+    the session. Text messages are kept as sent; binary frames are stored
+    base64 encoded. The loadtest package replays these files.
+
+    `record` only queues the message; a writer thread per recording encodes,
+    compresses and writes it, so the event loop never waits on the disk.
+    """
+    def __init__(self, session_id: str, directory: str, queue_size: int = RECORD_QUEUE_SIZE):
+        self.session_id = session_id
+        self.started_at = time.time()
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+        self.path = os.path.join(directory, f"{safe_id}-{int(self.started_at)}.jsonl.gz")
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.messages = 0
+        self.dropped = 0
+        self.closed = False
+        self.writer = threading.Thread(target=self._run, args=(directory,), name=f"recorder-{safe_id}", daemon=True)
+        self.writer.start()
+
+    def record(self, channel: str, message: Union[str, bytes]):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait((round(time.time() - self.started_at, 4), channel, message))
+        except queue.Full:
+            self.dropped += 1
+            RECORDED_MESSAGES_DROPPED.inc()
+
+    async def close(self):
+        """Stops recording and waits for the writer to flush what was queued."""
+        if self.closed:
+            return
+        self.closed = True
+        # Blocks only if the queue is full, and the writer is draining it
+        await asyncio.to_thread(self.queue.put, _CLOSE)
+        await asyncio.to_thread(self.writer.join)
+
+    def _run(self, directory: str):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            file = gzip.open(self.path, "wt", encoding="utf-8")
+        except OSError as e:
+            logger.error(f"Could not record session {self.session_id}: {e}")
+            self.closed = True
+            while self.queue.get() is not _CLOSE:
+                pass
+            return
+        logger.info(f"Recording session {self.session_id} to {self.path}")
+        with file:
+            file.write(json.dumps({"session_id": self.session_id, "started_at": self.started_at}) + "\n")
+            while (item := self.queue.get()) is not _CLOSE:
+                offset, channel, message = item
+                entry = {"t": offset, "channel": channel}
+                if isinstance(message, bytes):
+                    entry["bytes"] = base64.b64encode(message).decode("ascii")
+                else:
+                    entry["text"] = message
+                file.write(json.dumps(entry) + "\n")
+                self.messages += 1
+        logger.info(f"Recorded {self.messages} messages to {self.path}"
+                    + (f" ({self.dropped} dropped)" if self.dropped else ""))
+
+
+def create_recorder(session_id: str) -> Optional[SessionRecorder]:
+    if not RECORD_SESSIONS_DIR:
+        return None
+    return SessionRecorder(session_id, RECORD_SESSIONS_DIR)
+
+
+def read_recording(path: str) -> tuple[dict, list[dict]]:
+    """Returns the header and the message entries of a recorded session."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        entries = [json.loads(line) for line in f if line.strip()]
+    return header, entries
+
+
+def entry_payload(entry: dict) -> Union[str, bytes]:
+    """The message of a recorded entry in the form it was originally sent."""
+    if "bytes" in entry:
+        return base64.b64decode(entry["bytes"])
+    return entry["text"]
+
+
+def iter_recordings(paths: list[str]) -> Iterator[str]:
+    """Expands directories into the recordings they contain."""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".jsonl.gz"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
@@ -1,206 +1,312 @@
-import asyncio
-import io
 import json
 import time
 import base64
-import wave
-import numpy as np
+import binascii
+import os
+from typing import Optional
 # import cv2
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter, Response
+from fastapi.responses import JSONResponse
 from starlette.websockets import WebSocketState
-import os
-import time
-import subprocess
 
-from .service import ProcessRequest
+from .session import Session, session_registry, MEDIA_CHANNEL, IMG_CHANNEL
+from .speech import stream_answer
+from .enrollment import enrollment_queue
+from .utterances import Utterance, UtteranceQueue, REJECTED
+from .metrics import registry, span, TIME_TO_FIRST_AUDIO
+from .audio import pcm_samples, CLIENT_SAMPLE_RATE
+from .warmup import warmup
+from .vad import VAD_ENDPOINTING, VAD_CLIPS
 router = APIRouter(prefix="", tags=["voice"])
 
-RHUBARB_PATH = os.path.join("rhubarb", "rhubarb.exe")
+# Default delivery mode for clients that do not set "stream" themselves
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "0") == "1"
 
-# Track processing status
-isProcessing = False
-isProcessingVideo = False
+registry.gauge("orchestrator_active_sessions", "Kiosk sessions with at least one open socket.",
+               lambda: len(session_registry))
+registry.gauge("orchestrator_face_in_flight", "Frames sent to the face service and awaiting a response, per session.",
+               lambda: [({"session": s.session_id}, len(s.video.in_flight)) for s in session_registry.sessions.values()])
+registry.gauge("orchestrator_face_mailbox_pending", "Frames waiting in the latest-frame mailbox, per session.",
+               lambda: [({"session": s.session_id}, int(s.video.mailbox.frame is not None))
+                        for s in session_registry.sessions.values()])
+registry.gauge("orchestrator_enrollment_queue_depth", "Enrollment writes waiting to be persisted.",
+               enrollment_queue.depth)
+registry.gauge("orchestrator_enrollment_queue_lag_seconds", "Age of the oldest enrollment write not yet persisted.",
+               enrollment_queue.lag)
+
+def read_frame_message(message: dict) -> Optional[bytes]:
+    """
+    Returns the encoded frame carried by a /ws/img message: the raw bytes of
+    a binary message, or the base64 "video" field of a legacy JSON message.
+    """
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    data = json.loads(message["text"])
+    video_payload = data.get("video")
+    return base64.b64decode(video_payload) if video_payload else None
 
-def convert_to_wav(audio_data: bytes, channels: int = 1, sampwidth: int = 2, framerate: int = 48000) -> bytes:
+async def send_result(websocket: WebSocket, response: tuple[bytes, dict], received_at: float):
     """
-    Convert raw PCM audio data to a WAV file in memory.
-    Assumes 16-bit PCM.
+    Send a rendered answer (TTS audio and its lip-sync track) to the client.
     """
-    audio_array = np.frombuffer(audio_data, dtype=np.int16)
-    wav_buffer = io.BytesIO()
-    with wave.open(wav_buffer, 'wb') as wav_file:
-        wav_file.setnchannels(channels)
-        wav_file.setsampwidth(sampwidth)
-        wav_file.setframerate(framerate)
-        wav_file.writeframes(audio_array.tobytes())
-    wav_buffer.seek(0)
-    return wav_buffer.read()
-
-def exec_command(command):
-    """Executes a shell command and returns the output or raises an error."""
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Command failed: {e.stderr}")
+        if response:
+            audio, lipsync_data = response
+            byte_string = base64.b64encode(audio).decode('utf-8')
 
-def lip_sync_message(message):
-    """Converts MP3 to WAV and generates lip-sync JSON."""
-    start_time = time.time()
-    print(f"Starting conversion for message {message}")
-    print(RHUBARB_PATH)
+            json_data = {'audio': byte_string,
+                         'lipsync': lipsync_data,
+                         'valid': True}
+            with span("socket_send"):
+                await websocket.send_text(json.dumps(json_data))
+            TIME_TO_FIRST_AUDIO.observe(time.time() - received_at, mode="single")
+    except WebSocketDisconnect:
+        print("Client disconnected from result sender")
+    except Exception as e:
+        print("Error sending results:", e)
 
-    
-    # Convert MP3 to WAV
-    # exec_command(f"ffmpeg -y -i audios/message_{message}.mp3 audios/message_{message}.wav")
-    # print(f"Conversion done in {int((time.time() - start_time) * 1000)}ms")
 
-    # Generate lip-sync JSON
-    exec_command(f'"{RHUBARB_PATH}" -f json -o ./{message}.json ./{message}.wav -r phonetic')
-    print(f"Lip sync done in {int((time.time() - start_time) * 1000)}ms")
+async def send_streamed_results(websocket: WebSocket, answer: str, received_at: float):
+    """
+    Send an answer to the client as sentence chunks as soon as each one is ready.
+    """
+    try:
+        chunks = await stream_answer(websocket, answer, received_at=received_at)
+        print(f"Streamed answer in {chunks} chunks")
+    except WebSocketDisconnect:
+        print("Client disconnected from streamed sender")
+    except Exception as e:
+        print("Error streaming results:", e)
+
 
-async def send_results_periodically(websocket: WebSocket, response):
+async def answer_utterance(session: Session, utterance: Utterance):
     """
-    Send the latest recognition results back to the client every second.
+    Answer one queued utterance and send the result over the session's
+    current media socket. Called by the session's UtteranceQueue, which
+    runs them one at a time; the answer goes out under `session.speaking`,
+    so it never overlaps a greeting. `session.is_processing` is set for
+    exactly as long as this runs.
     """
-    global isProcessing
+    session.is_processing = True
+    try:
+        if utterance.stream:
+            answer = await session.request_handler.generate_answer(utterance.audio_payload, utterance.received_at,
+                                                                   utterance.voice_upload)
+            if answer:
+                # Waits for a greeting that is still going out
+                async with session.speaking:
+                    await send_streamed_results(session.media_socket, answer, utterance.received_at)
+                return
+        else:
+            response = await session.request_handler(utterance.audio_payload, utterance.received_at,
+                                                     utterance.voice_upload)
+            if response:
+                async with session.speaking:
+                    await send_result(session.media_socket, response, utterance.received_at)
+                return
+        print("RESPONDED WITH INVALID")
+        await notify_client(session, {'valid': False})
+    finally:
+        session.is_processing = False
+        session.save()
+
 
+async def notify_client(session: Session, message: dict):
+    websocket = session.media_socket
+    if websocket is None:
+        return
     try:
-        print("sending response",type(response), response)
-        if response and hasattr(response, 'content'):
-            byte_string = base64.b64encode(response.content).decode('utf-8')
-            # save it temporarly
-            # Generate a random UUID
-            unique_filename = "generated_audio"
+        await websocket.send_text(json.dumps(message))
+    except Exception as e:
+        print("Error notifying client:", e)
+
+
+async def end_streamed_utterance(session: Session, stream: bool, received_at: float, quiet: bool = False):
+    """
+    Ends the utterance the client is streaming in chunks and queues it. The
+    voice service starts on it right away, while it waits in the queue.
+    One without speech is dropped with {"valid": false, "status": "no_speech"},
+    or silently if `quiet`.
+    """
+    voice_upload, session.voice_upload = session.voice_upload, None
+    if not await session.request_handler.finish_voice_upload(voice_upload):
+        print("No speech in the streamed utterance; dropping it")
+        if not quiet:
+            await notify_client(session, {'valid': False, 'status': 'no_speech'})
+        return
+    outcome = session.utterances.submit(Utterance(None, stream, received_at, voice_upload))
+    if outcome == REJECTED:
+        await voice_upload.cancel()
+    print(f"Utterance {outcome} ({session.utterances.depth()} waiting)")
 
-            # Decode the base64 string back to bytes
-            audio_bytes = base64.b64decode(byte_string)
 
-            # save the audio temporarly
-            with open(unique_filename + '.wav', 'wb') as wav_file:
-                wav_file.write(audio_bytes)
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage latencies, frame outcomes and queue gauges."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
 
-             ## generate the lipsync
-            lip_sync_message(unique_filename)
 
-            ## load the json
-            with open(unique_filename + '.json', 'rb') as json_file:
-                lipsync_data = json.load(json_file)
+@router.get("/health")
+async def health():
+    """Liveness: the process is up and serving."""
+    return {"status": "healthy"}
 
-            json_data = {'audio': byte_string,
-                         'lipsync': lipsync_data,
-                         'valid': True}
-            # Send audio content as binary
-            asyncio.create_task(websocket.send_text(json.dumps(json_data)))
-            time.sleep(1)
-            isProcessing = False
-    except WebSocketDisconnect:
-        print("Client disconnected from periodic sender")
 
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 once the startup warm-up has completed, 503 with the step states until then."""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@router.get("/enrollments")
+async def enrollment_stats():
+    """Depth, lag and outcome counters of the background enrollment queue."""
+    return enrollment_queue.stats()
 
-request_handler = ProcessRequest()
-isProcessing = False
 
 @router.websocket("/ws/media")
-async def websocket_media(websocket: WebSocket):
+async def websocket_media(websocket: WebSocket, session_id: Optional[str] = None):
     """
     WebSocket endpoint that always expects a message with audio.
+    The kiosk pairs this socket with its /ws/img socket by connecting both
+    with the same `session_id` query parameter.
     Each message should be a JSON object:
       {
          "audio": "<base64-encoded-audio-data>",
-         "is_end": true/false
+         "is_end": true/false,
+         "stream": true/false
       }
+    Instead of one "audio" message an utterance may be streamed while the
+    user is still talking, as messages carrying base64 16-bit mono PCM:
+      {"audio_chunk": "<base64-pcm>", "sample_rate": 48000}
+    followed by {"audio_end": true, "stream": true/false}. The chunks are
+    forwarded to the voice service as they arrive; one that cannot be
+    decoded is dropped with {"valid": false, "status": "invalid_chunk"}. With VAD_ENDPOINTING=1
+    the orchestrator ends the utterance itself after a pause, sends
+    {"endpoint": true} and treats further chunks as the next utterance.
+    With "stream" (or STREAM_ANSWERS=1) the answer is sent as sentence
+    chunks tagged with "seq", "total" and "final" instead of one message.
+    Utterances that arrive while an answer is in progress wait in the
+    session's UtteranceQueue. One that cannot be queued, or waited too long,
+    is answered with {"valid": false, "status": "rejected" | "expired"}.
     """
-    global isProcessing
-    
     await websocket.accept()
-    
+    session = await session_registry.attach(session_id, MEDIA_CHANNEL, websocket)
+    if session.utterances is None:
+        session.utterances = UtteranceQueue(lambda utterance: answer_utterance(session, utterance),
+                                            lambda message: notify_client(session, message))
+
     try:
         while True:
             # Expect text messages (JSON format) with audio keys.
             message = await websocket.receive_text()
             start = time.time()
-            if isProcessing:
-                print("Already processing, ignoring new request.")
+            session.touch()
+            session.record(MEDIA_CHANNEL, message)
+            try:
+                data = json.loads(message)
+            except Exception as e:
+                print("Invalid JSON received:", e)
+                continue
 
-            else:
+            if data.get("audio_chunk"):
                 try:
-                    isProcessing = True
-                    data = json.loads(message)
-                except Exception as e:
-                    isProcessing = False
-                    print("Invalid JSON received:", e)
+                    samples = pcm_samples(base64.b64decode(data["audio_chunk"]))
+                    sample_rate = int(data.get("sample_rate") or CLIENT_SAMPLE_RATE)
+                except (binascii.Error, KeyError, TypeError, ValueError) as e:
+                    # Drop the chunk; the rest of the utterance can still be answered
+                    print("Invalid audio chunk received:", e)
+                    await websocket.send_text(json.dumps({'valid': False, 'status': 'invalid_chunk'}))
+                    continue
+                if session.voice_upload is None:
+                    session.voice_upload = await session.request_handler.open_voice_upload(sample_rate)
+                await session.voice_upload.feed(samples)
+                if VAD_ENDPOINTING and session.voice_upload.ended:
+                    # The speaker went quiet: answer without waiting for audio_end
+                    VAD_CLIPS.inc(result="endpointed")
+                    await websocket.send_text(json.dumps({"endpoint": True}))
+                    await end_streamed_utterance(session, bool(data.get("stream", STREAM_ANSWERS)), start)
+                    session.endpointed = True
+                continue
+
+            if data.get("audio_end"):
+                # Whatever followed a pause the orchestrator already answered needs no reply of its own
+                endpointed, session.endpointed = session.endpointed, False
+                if session.voice_upload is None:
+                    if not endpointed:
+                        await websocket.send_text(json.dumps({'valid': False}))
                     continue
+                await end_streamed_utterance(session, bool(data.get("stream", STREAM_ANSWERS)), start,
+                                             quiet=endpointed)
+                continue
 
-                audio_payload = data.get("audio")
+            audio_payload = data.get("audio")
+            if not audio_payload:
+                print("Missing audio payload; skipping this message.")
+                await websocket.send_text(json.dumps({'valid': False}))
+                continue
 
-                response = await request_handler(audio_payload)
-                if response:
-                    end = time.time()
-                    print(f'Total TIme: ' , end - start)
-                    asyncio.create_task(send_results_periodically(websocket, response))
-                else:
-                    print("RESPONDED WITH INVALID")
-                    json_data = {'valid': False}
-                    asyncio.create_task(websocket.send_text(json.dumps(json_data)))
-                    isProcessing = False
-                     
+            # Queued behind any answer in progress instead of being dropped
+            utterance = Utterance(audio_payload, bool(data.get("stream", STREAM_ANSWERS)), start)
+            outcome = session.utterances.submit(utterance)
+            print(f"Utterance {outcome} ({session.utterances.depth()} waiting)")
 
     except WebSocketDisconnect:
         print("Client disconnected")
     finally:
         if websocket.client_state == WebSocketState.CONNECTED:
             await websocket.close()
+        if session.media_socket is websocket and session.voice_upload is not None:
+            voice_upload, session.voice_upload = session.voice_upload, None
+            await voice_upload.cancel()
+        if session.media_socket is websocket and session.utterances is not None:
+            # Nobody is left to hear the answers to waiting utterances
+            utterances, session.utterances = session.utterances, None
+            await utterances.close()
+        await session_registry.detach(session, MEDIA_CHANNEL, websocket)
         print("WebSocket closed")
     
 
 @router.websocket("/ws/img")
-async def websocket_img(websocket: WebSocket):
+async def websocket_img(websocket: WebSocket, session_id: Optional[str] = None):
     """
-    WebSocket endpoint that always expects a message with both audio and video.
-    Each message should be a JSON object:
+    WebSocket endpoint that always expects a video frame.
+    Connect with the same `session_id` query parameter as the /ws/media socket.
+    Frames are preferably sent as binary messages holding the encoded JPEG.
+    A text message with a JSON object is still accepted:
       {
          "video": "<base64-encoded-video-data>"
          "is_end": true/false
       }
     """
-
-    global isProcessingVideo
-    global isProcessing
-
     await websocket.accept()
+    session = await session_registry.attach(session_id, IMG_CHANNEL, websocket)
 
     try:
         while True:
-            # Expect text messages (JSON format) with video key.
-            message = await websocket.receive_text()
-            start = time.time()
-            if isProcessingVideo:
-                print("Already processing video, ignoring new request.")
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            session.touch()
+            session.record(IMG_CHANNEL, message["bytes"] if message.get("bytes") is not None else message.get("text"))
+            try:
+                frame = read_frame_message(message)
+            except Exception as e:
+                print("Invalid frame received:", e)
+                continue
 
-            else:
-                try:
-                    isProcessingVideo = True
-                    data = json.loads(message)
-                except Exception as e:
-                    isProcessingVideo = False
-                    print("Invalid JSON received:", e)
-                    continue
+            if not frame:
+                print("Missing video payload; skipping this message.")
+                continue
 
-                video_payload = data.get("video")
-                # try:
-                response = await request_handler.process_video(video_payload, isProcessing)
-                if response:
-                    end = time.time()
-                    print(f'Video process Total TIme: ', end - start)
-                    isProcessingVideo = False
-                else:
-                    isProcessingVideo = False
+            # Newest frame wins; the video stage paces frames to the face service
+            session.video.submit(frame)
 
     except WebSocketDisconnect:
         print("Client disconnected")
     finally:
         if websocket.client_state == WebSocketState.CONNECTED:
             await websocket.close()
+        await session_registry.detach(session, IMG_CHANNEL, websocket)
         print("WebSocket closed")
-    
\ No newline at end of file
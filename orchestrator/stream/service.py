@@ -1,31 +1,31 @@
 import base64
 import uuid
-import cv2
-import numpy as np
-from typing import Any, Optional
+from typing import Optional
 import time
-import httpx
-import io
-from PIL import Image
-import wave
-from .utils import answer_user_query, generate_tts, add_voice_user, add_face_user, update_face_user
-from .types import GenerateRequest, VoiceRecognitionResponse, FaceRecognitionResponse
-from fastapi import UploadFile
-from starlette.datastructures import UploadFile as StarletteUploadFile
-from io import BytesIO
+from .utils import answer_user_query, add_voice_user, add_face_user, update_face_user
+from .types import GenerateRequest, VoiceRecognitionResponse, FaceRecognitionResponse, Match
+from .clients import service_clients
+from .face_history import FaceStateHistory
+from .enrollment import enrollment_queue, VOICE, FACE
+from .metrics import span
+from .speech import render_speech
+from .upstream_socket import SupervisedWebSocket
+from .identity import IdentityBindings
+from .audio import to_voice_samples, encode_audio, audio_duration, VOICE_SAMPLE_RATE
+from .voice_stream import VoiceChannel, VoiceUpload
+from .vad import SpeechGate, trim_silence, VAD_ENABLED
+from .session_state import SESSION_HISTORY_TURNS
 
-import websockets
 import asyncio
-import json
 import os
-from asyncio import Lock
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ProcessRequest:
-    def __init__(self):
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id
         # self.transcription = ""
         self.queries: list[VoiceRecognitionResponse] = []
         self.voice_user = []
@@ -33,8 +33,11 @@ class ProcessRequest:
         # self.user_id = None
         self.image = None
         self.audio = None
-        self.face_rec_ws = None
         self.latest_face_rec_state: Optional[FaceRecognitionResponse] = None
+        self.face_history = FaceStateHistory()
+        self.identity = IdentityBindings()
+        # The face identify_user took for the speaker's, if it could tell which one it was
+        self.speaker_face: Optional[Match] = None
         self.face_rec_config = {
             "action": "configure",
             "threshold": 0.5,
@@ -42,146 +45,125 @@ class ProcessRequest:
         }
         face_host = os.getenv("FACE_RECOGNITION_HOST")
         face_port = os.getenv("FACE_RECOGNITION_PORT")
-        voice_host = os.getenv("VOICE_RECOGNITION_HOST","")
-        voice_port = os.getenv("VOICE_RECOGNITION_PORT","")
         self.face_rec_url = f"ws://{face_host}:{face_port}/api/v2/identify"
-        self.voice_rec_url = f"http://{voice_host}:{voice_port}/voice/process"
-        self.ws_lock = Lock()
+        # Connected, health-checked and reconnected in the background
+        self.face_link = SupervisedWebSocket("face", self.face_rec_url, configure=self.face_rec_config)
+        voice_host = os.getenv("VOICE_RECOGNITION_HOST")
+        voice_port = os.getenv("VOICE_RECOGNITION_PORT")
+        # Utterances go to the voice service over this socket, POST /voice/process when it is down
+        self.voice = VoiceChannel(f"ws://{voice_host}:{voice_port}/voice/stream")
+        # Background level measured by the speech gate, carried over to the next utterance
+        self.noise_floor: Optional[float] = None
+        # Last SESSION_HISTORY_TURNS {"prompt", "generation"} turns, sent along with each RAG query
+        self.history: list[dict] = []
         self.isQueryNoise = False
-    async def _ensure_face_rec_connection(self):
-        """Ensures the WebSocket connection for face recognition is active."""
-        if self.face_rec_ws and (await self.face_rec_ws.ping()):
-            return True
 
-        print("Face Rec WebSocket connection not active. Attempting to connect...")
-        try:
-            self.face_rec_ws = await websockets.connect(self.face_rec_url)
-            print(f"Connected to Face Rec WebSocket at {self.face_rec_url}")
-            await self.face_rec_ws.send(json.dumps(self.face_rec_config))
-            await asyncio.sleep(0.1)  # Brief pause after configuration
-            print(f"Face Rec WebSocket configured: {self.face_rec_config}")
-            return True
-        except (websockets.exceptions.WebSocketException, ConnectionRefusedError, OSError) as e:
-            print(f"Failed to connect or configure Face Rec WebSocket: {e}")
-            self.face_rec_ws = None
-            self.latest_face_rec_state = None # Clear state on connection failure
-            return False
-        except Exception as e:
-             print(f"An unexpected error occurred during WebSocket connection/configuration: {e}")
-             self.face_rec_ws = None
-             self.latest_face_rec_state = None
-             return False
-    def convert_to_wav(self,audio_data: bytes, channels: int = 1, sampwidth: int = 2, framerate: int = 48000) -> bytes:
+    async def process_audio(self, audio_data, voice_upload: Optional[VoiceUpload] = None):
         """
-        Convert raw PCM audio data to a WAV file in memory.
-        Assumes 16-bit PCM.
+        Identifies and transcribes the speakers of an utterance, either the
+        client's recording in `audio_data` or one already streamed to the
+        voice service as `voice_upload`.
         """
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_file:
-            wav_file.setnchannels(channels)
-            wav_file.setsampwidth(sampwidth)
-            wav_file.setframerate(framerate)
-            wav_file.writeframes(audio_array.tobytes())
-        wav_buffer.seek(0)
-        return wav_buffer.read()
-
-    
-    async def process_audio(self,audio_data):
-        print("Processing audio data...")
+        logger.info("Processing audio data...")
         try:
-            start = time.time()
-            if len(audio_data) == 0:
-                print("Empty audio data")
-                return
-            wav_data = self.convert_to_wav(audio_data)
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.voice_rec_url,
-                    files={"file": ("audio.wav", wav_data, "audio/wav")},
+            if voice_upload is not None:
+                await voice_upload.finish()
+                res = None
+                if voice_upload.streaming:
+                    with span("voice_service"):
+                        res = await voice_upload.recognized()
+                # Kept for voice enrollment and for the POST fallback
+                upload, filename, content_type = await asyncio.to_thread(voice_upload.encoded)
+                self.audio = upload
+                if res is not None:
+                    return [VoiceRecognitionResponse(**item) for item in res]
+            else:
+                if len(audio_data) == 0:
+                    logger.warning("Empty audio data")
+                    return
+                # 16 kHz mono is what KAVAS needs, so it can skip its own conversion
+                with span("wav_conversion"):
+                    samples = await asyncio.to_thread(to_voice_samples, audio_data)
+                if VAD_ENABLED:
+                    with span("vad"):
+                        speech, self.noise_floor = await asyncio.to_thread(trim_silence, samples, self.noise_floor)
+                    if speech is None:
+                        logger.info("No speech in the utterance; not sending it to the voice service")
+                        return None
+                    samples = speech
+                upload, filename, content_type = await asyncio.to_thread(encode_audio, samples, VOICE_SAMPLE_RATE)
+                self.audio = upload
+                voice_upload = await self.voice.open()
+                res = None
+                if voice_upload.streaming:
+                    with span("voice_service"):
+                        await voice_upload.feed(samples)
+                        res = await voice_upload.recognized()
+                if res is not None:
+                    return [VoiceRecognitionResponse(**item) for item in res]
+            with span("voice_service"):
+                response = await service_clients.voice.post(
+                    "/voice/process",
+                    files={"file": (filename, upload, content_type)},
                     timeout=30.0
                 )
-                if response.status_code == 200:
-                    res =  response.json()
-                    
-                    print("time taken to process voice: ", time.time() - start)
-                    return [VoiceRecognitionResponse(**item) for item in res]
+            if response.status_code == 200:
+                res =  response.json()
+                return [VoiceRecognitionResponse(**item) for item in res]
 
         except Exception as e:
-            print("Error processing audio:", e)
+            logger.error(f"Error processing audio: {e}")
             return None
         
-    async def _process_video_frame_ws(self, img: np.ndarray):
-        """Sends a video frame over WebSocket and updates the face rec state."""
-        if not await self._ensure_face_rec_connection():
-            print("Cannot process video frame, WebSocket connection failed.")
-            return
-
-        if self.face_rec_ws is None:
-             print("Cannot process video frame, WebSocket is None.")
-             return
-        try:
-            async with self.ws_lock:  # Enforce sequential access
-                # Encode and send frame
-                _, buffer = cv2.imencode('.jpg', img)
-                if buffer is None:
-                    print("Error: cv2.imencode failed.")
-                    return
-                
-                # debug_image_path = f"debug_frame_{int(time.time())}.jpg"
-                # cv2.imwrite(debug_image_path, img)
-                # print(f"Saved debug image to {debug_image_path}")
-                image_base64 = base64.b64encode(buffer).decode('utf-8')
-                
-                message = json.dumps({
-                    "image": image_base64,
-                    "timestamp": time.time()
-                })
-
-                await self.face_rec_ws.send(message)
-                
-                # Wait for response (now protected by lock)
-                response_str = await asyncio.wait_for(self.face_rec_ws.recv(), timeout=5.0)
-                response_data = json.loads(response_str)
-                if response_data.get("status") == "error":
-                    logger.error(f"Face recognition error: {response_data.get('error')}")
-                    return
-
-                self.latest_face_rec_state = FaceRecognitionResponse(**response_data) 
-                
-        except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK) as e:
-            print(f"Face Rec WebSocket connection closed during send/recv: {e}")
-            self.face_rec_ws = None
-            self.latest_face_rec_state = None
-        except json.JSONDecodeError as e:
-            print(f"Failed to decode Face Rec JSON response: {e} - Response: {response_str}")
-        except asyncio.TimeoutError:
-            print("Timeout waiting for face recognition response.")
-        except Exception as e:
-            print(f"Error during Face Rec WebSocket send/recv/process: {type(e).__name__}: {e}")
-    
-    async def process_input(self, audio_data):
+    async def open_voice_upload(self, sample_rate: int) -> VoiceUpload:
+        """Starts an utterance the client streams in chunks, gated by VAD if enabled."""
+        gate = SpeechGate(self.noise_floor) if VAD_ENABLED else None
+        return await self.voice.open(sample_rate, gate)
+
+    async def finish_voice_upload(self, voice_upload: VoiceUpload) -> bool:
+        """Ends a streamed utterance; False if it held no speech and was dropped."""
+        await voice_upload.finish()
+        if voice_upload.gate is not None:
+            self.noise_floor = voice_upload.gate.noise_floor
+        return not voice_upload.no_speech
+
+    async def process_input(self, audio_data, received_at: Optional[float] = None,
+                            voice_upload: Optional[VoiceUpload] = None):
         """
-        Processes audio and video input, identifies user using latest face state.
+        Processes audio and video input, identifies user using the faces seen
+        while the utterance was being spoken.
         """
+        t_end = received_at or time.time()
+        if voice_upload is not None:
+            t_start = t_end - voice_upload.duration()
+        else:
+            t_start = t_end - audio_duration(audio_data) if audio_data else t_end
         voice_user_result = None
-        if audio_data:
-            voice_user_result = await self.process_audio(audio_data)
+        if audio_data or voice_upload is not None:
+            voice_user_result = await self.process_audio(audio_data, voice_upload)
             if voice_user_result:
                 self.queries = voice_user_result
             else:
                 self.isQueryNoise = True
         
-        if self.latest_face_rec_state is None:
+        face_snapshot = self.face_history.aggregate(t_start, t_end)
+        if face_snapshot is None:
             print("No face recognition state available")
             self.isQueryNoise = True
             return
         
-        current_face_state = self.latest_face_rec_state.model_copy()
+        current_face_state = face_snapshot.state
+        # Enroll from the frame that best represents the utterance window
+        self.image = face_snapshot.frame
 
         if voice_user_result and current_face_state.matches:
-            user_id = await self.identify_user(voice_user_result, current_face_state)
+            with span("identity_fusion"):
+                user_id = await self.identify_user(voice_user_result, current_face_state)
             print("User_ID:", user_id)
+            if user_id:
+                # Fusion files the speaker's voice under their person id, so the voice is bound by that id;
+                # what the binding adds is the face seen speaking, which later utterances must match
+                self.identity.bind(user_id, user_id, face=self.speaker_face)
         else:
             print("process_input: No voice result or face state with matches available for identification.")
 
@@ -208,6 +190,15 @@ class ProcessRequest:
         
         # Initialize queries
         self.queries = voice_users
+        self.speaker_face = None
+
+        # A speaker bound to a face that is still in view skips the decision tree
+        if len(voice_ids) == 1 and not null_voice_ids and face_detected:
+            voice_id = next(iter(voice_ids))
+            binding = self.identity.lookup(voice_id, face_user)
+            if binding is not None:
+                print("SCENARIO: BOUND IDENTITY")
+                return binding.person_id
 
         # No face detected: noise
         if not face_detected or processed_faces == 0:
@@ -232,11 +223,18 @@ class ProcessRequest:
                 print("SCENARIO 1: ONE UNRECOGNIZED VOICE")
                 if processed_faces == 1:
                     face = face_matches[0]
+                    self.speaker_face = face
                     if face.person_id == "Unknown":
                         print("SUB-SCENARIO 1.1: ONE UNKNOWN FACE DETECTED")
-                        new_id = uuid.uuid4()
-                        await add_voice_user(new_id, self.audio)
-                        await add_face_user(new_id, self.image)
+                        pending = self.identity.pending_new_user(face, face_user)
+                        if pending is not None:
+                            # The same face was enrolled moments ago and is not recognized yet; do not enroll again
+                            new_id = uuid.UUID(pending.person_id)
+                        else:
+                            new_id = uuid.uuid4()
+                            self.identity.bind(new_id, new_id, face=face, new_user=True)
+                        self._enroll(new_id, VOICE, add_voice_user, self.audio)
+                        self._enroll(new_id, FACE, add_face_user, self.image)
                         corrected_queries = [
                             VoiceRecognitionResponse(userid=new_id, transcription=voice_user.transcription, score=voice_user.score)
                             if voice_user.userid is None else voice_user
@@ -247,7 +245,7 @@ class ProcessRequest:
                     else:
                         print("SUB-SCENARIO 1.2: ONE KNOWN FACE DETECTED")
                         user_id = uuid.UUID(face.person_id)
-                        await add_voice_user(user_id, self.audio)
+                        self._enroll(user_id, VOICE, add_voice_user, self.audio)
                         corrected_queries = [
                             VoiceRecognitionResponse(userid=user_id, transcription=voice_user.transcription,score=voice_user.score)
                             if voice_user.userid is None else voice_user
@@ -269,10 +267,11 @@ class ProcessRequest:
                 # Subscenario 2.1: One face match
                 if processed_faces == 1:
                     print("SUB-SCENARIO 2.1: ONE FACE MATCH")
+                    self.speaker_face = face_matches[0]
                     # Subscenario 2.1.1: Face not recognized
                     if unknown_face_count == 1 and not known_face_matches:
                         print("SUB-SCENARIO 2.1.1: FACE NOT RECOGNIZED")
-                        await add_face_user(voice_id, self.image)
+                        self._enroll(voice_id, FACE, add_face_user, self.image)
                         return str(voice_id)
                     # Subscenario 2.1.2: Face recognized
                     elif len(known_face_matches) == 1:
@@ -283,7 +282,7 @@ class ProcessRequest:
                             return str(voice_id)
                         else:
                             print("SUB-SCENARIO 2.1.2.2: FACE ID != VOICE ID")
-                            await update_face_user(voice_id, self.image)
+                            self._enroll(voice_id, FACE, update_face_user, self.image)
                             return str(voice_id)
                 # Subscenario 2.2: Multiple face matches
                 elif processed_faces > 1:
@@ -292,18 +291,19 @@ class ProcessRequest:
                     # Subscenario 2.2.1: All faces not recognized
                     if unknown_face_count == processed_faces and not known_face_matches:
                         print("SUB-SCENARIO 2.2.1: ALL FACES NOT RECOGNIZED")
-                        await add_face_user(voice_id, self.image)
+                        self._enroll(voice_id, FACE, add_face_user, self.image)
                         return str(voice_id)
                     # Subscenario 2.2.2: Mixed recognition on face
                     elif known_face_matches and unknown_face_count > 0:
                         print("SUB-SCENARIO 2.2.2: MIXED RECOGNITION ON FACE")
                         if str(voice_id) in face_ids:
                             print("SUB-SCENARIO 2.2.2.1: VOICE ID IN LIST OF FACE IDs")
+                            self.speaker_face = _face_of(known_face_matches, voice_id)
                             self.queries = [v for v in voice_users if v.userid == voice_id]
                             return str(voice_id)
                         else:
                             print("SUB-SCENARIO 2.2.2.2: VOICE ID NOT IN LIST OF FACE IDs")
-                            await add_face_user(voice_id, self.image)
+                            self._enroll(voice_id, FACE, add_face_user, self.image)
                             self.queries = [v for v in voice_users if v.userid == voice_id]
                             return str(voice_id)
                     # Subscenario 2.2.3: All recognized faces
@@ -311,11 +311,12 @@ class ProcessRequest:
                         print("SUB-SCENARIO 2.2.3: ALL RECOGNIZED FACES")
                         if str(voice_id) in face_ids:
                             print("SUB-SCENARIO 2.2.3.1: VOICE ID IN LIST OF FACE IDs")
+                            self.speaker_face = _face_of(known_face_matches, voice_id)
                             self.queries = [v for v in voice_users if v.userid == voice_id]
                             return str(voice_id)
                         else:
                             print("SUB-SCENARIO 2.2.3.2: VOICE ID NOT IN LIST OF FACE IDs")
-                            await update_face_user(voice_id, self.image)
+                            self._enroll(voice_id, FACE, update_face_user, self.image)
                             return str(voice_id)
         else:
             print("SCENARIO: MULTIPLE VOICES DETECTED")
@@ -327,6 +328,7 @@ class ProcessRequest:
                 matching_voices = [v for v in voice_users if v.userid is None or str(v.userid) in face_ids]
                 if len(matching_voices) == 1:
                     print("SUB-SCENARIO: ONE MATCHING VOICE")
+                    self.speaker_face = _face_of(known_face_matches, matching_voices[0].userid)
                     return str(matching_voices[0].userid)
                 elif matching_voices:
                     print("SUB-SCENARIO: MULTIPLE MATCHING VOICES")
@@ -348,8 +350,29 @@ class ProcessRequest:
         self.isQueryNoise = True
         self.queries = []
 
-    async def __call__(self, audio_payload):
-        if not audio_payload:
+    def _enroll(self, user_id, modality: str, action, payload):
+        """Queues an enrollment write unless the same one was made while its binding is fresh."""
+        if self.identity.should_enroll(user_id, modality):
+            enrollment_queue.submit(user_id, modality, action, payload)
+
+    async def __call__(self, audio_payload, received_at: Optional[float] = None,
+                       voice_upload: Optional[VoiceUpload] = None):
+        answer = await self.generate_answer(audio_payload, received_at, voice_upload)
+        if answer is None:
+            return None
+
+        return await render_speech(answer)
+
+    async def generate_answer(self, audio_payload, received_at: Optional[float] = None,
+                              voice_upload: Optional[VoiceUpload] = None) -> Optional[str]:
+        """
+        Identify the speaker(s) in `audio_payload` and return the RAG answer
+        text, or None when the audio is noise or nothing was transcribed.
+        `received_at` is when the utterance finished arriving; it anchors the
+        window of face results used for identification. An utterance the
+        client streamed in chunks comes as `voice_upload` instead.
+        """
+        if not audio_payload and voice_upload is None:
             print("Missing audio payload; skipping this message.")
             return None
         
@@ -357,101 +380,69 @@ class ProcessRequest:
         
         if audio_payload:
             try:
-                audio_data = base64.b64decode(audio_payload)
+                with span("base64_decode"):
+                    audio_data = base64.b64decode(audio_payload)
             except Exception as e:
                 print("Error decoding audio payload:", e)
         
 
 
-        # Convert audio bytes to UploadFile
-        audio_upload_file = None
-        if audio_data:
-            audio_upload_file = UploadFile(
-            filename="audio.wav",
-            file=BytesIO(audio_data),
-            )
-
-        # Convert image bytes to UploadFile
-
-        if audio_upload_file:
-            self.audio = audio_upload_file
-
-        # Pass the converted UploadFile objects to process_input
-        await self.process_input(audio_data)
+        await self.process_input(audio_data, received_at, voice_upload)
         
         if self.isQueryNoise:
             self.isQueryNoise = False
             return None
         
-        if audio_payload and self.queries != []:
+        if self.queries != []:
             print("send transcription to RAG")
-            answer = await answer_user_query([GenerateRequest(user_id = str(x.userid) if x.userid else str(uuid.uuid4()), question = x.transcription).dict() for x in self.queries])
+            with span("rag"):
+                answer = await answer_user_query([GenerateRequest(user_id = str(x.userid) if x.userid else str(uuid.uuid4()), question = x.transcription).dict() for x in self.queries],
+                                                 self.history, self.session_id)
             
             
             print("Answer from RAG: ", answer.generation)
+            prompt = answer.prompt or " ".join(x.transcription for x in self.queries)
+            self.history = _recent(self.history + [{"prompt": prompt, "generation": answer.generation}])
             self.queries = []
-
-            start_time_tts = time.time()
-            response_tts = await generate_tts(answer.generation)
-            end_time_tts = time.time()
-            
-            print(f'Total TTS TIme: ' , end_time_tts - start_time_tts)
-            return response_tts
+            return answer.generation
         else:
             print("No transcription available")
             return None
         
         
-    async def process_video(self, img_payload, isProcessingAudio):
+    def update_face_state(self, frame: bytes, face_state: FaceRecognitionResponse, captured_at: Optional[float] = None):
+        """
+        Records the face recognition result for `frame`, captured at
+        `captured_at`. The frame is kept as-is (encoded JPEG) for enrollment
+        uploads. Greetings for `new_faces` are prepared by the session's
+        Greeter.
+        """
+        self.image = frame
+        self.latest_face_rec_state = face_state
+        self.face_history.add(frame, face_state, captured_at)
+        self.identity.confirm(face_state)
 
-        if not img_payload:
-            print("Missing video payload; skipping this message.")
-            return None
+    def snapshot(self) -> dict:
+        """What another replica needs to carry on this session's conversation."""
+        return {"identity": self.identity.snapshot(), "noise_floor": self.noise_floor, "history": self.history}
 
-        img = None
+    def restore(self, state: dict):
+        self.identity.restore(state.get("identity", {}))
+        self.noise_floor = state.get("noise_floor")
+        self.history = _recent(state.get("history", []))
 
-        try:
-            video_bytes = base64.b64decode(img_payload)
-            np_arr = np.frombuffer(video_bytes, np.uint8)
-            img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        except Exception as e:
-            print("Error decoding video payload:", e)
+    async def close(self):
+        """Closes the face recognition and voice WebSockets and stops their supervisors."""
+        print("Close requested. Shutting down WebSocket connection...")
+        await self.face_link.close(goodbye={"action": "close"})
+        await self.voice.close()
+        self.latest_face_rec_state = None
+        print("Face Rec WebSocket connection closed.")
 
-        # Convert image bytes to UploadFile
-        img_upload_file = None
-        if img is not None:
-            _, img_encoded = cv2.imencode('.jpg', img)
-            img_bytes = img_encoded.tobytes()
-            img_upload_file = UploadFile(
-                filename="image.jpg",
-                file=BytesIO(img_bytes),
-            )
 
-        if img_upload_file:
-            self.image = img_upload_file
+def _recent(history: list[dict]) -> list[dict]:
+    return history[-SESSION_HISTORY_TURNS:] if SESSION_HISTORY_TURNS > 0 else []
 
-        # Pass the converted UploadFile objects to process_input
-        await self._process_video_frame_ws(img)
-        
-        if self.latest_face_rec_state.new_faces and not isProcessingAudio:
-            # TODO: Greeting init
-            # First send request to rag greet new_faces holds the list of new users
-            # Then format(add tts and stuff) and send to avatar
-            # then send mark_greeted face rec with this function mark_greeted_users(new_faces)
-            pass
-        
-    async def close(self):
-        """Closes the WebSocket connection."""
-        print("Close requested. Shutting down WebSocket connection...")
-        if self.face_rec_ws and (await self.face_rec_ws.ping()):
-             try:
-                  await self.face_rec_ws.send(json.dumps({"action": "close"}))
-                  await self.face_rec_ws.close()
-                  print("Face Rec WebSocket connection closed.")
-             except Exception as e:
-                  print(f"Error closing WebSocket: {e}")
-             finally:
-                  self.face_rec_ws = None
-                  self.latest_face_rec_state = {}
-        else:
-             print("WebSocket connection already closed or never established.")
\ No newline at end of file
+
+def _face_of(matches: list[Match], person_id) -> Optional[Match]:
+    return next((match for match in matches if match.person_id == str(person_id)), None)
@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import json
+import time
+from typing import Optional
+from fastapi import WebSocket
+import logging
+
+from .service import ProcessRequest
+from .types import FaceRecognitionResponse
+from .video import VideoStage
+from .recorder import create_recorder
+from .greeting import Greeter, PreparedGreeting, GREETINGS_ENABLED
+from .utils import mark_greeted_users
+from .utterances import UtteranceQueue
+from .voice_stream import VoiceUpload
+from .session_state import session_store, SESSION_STORE_OPERATIONS
+from .metrics import span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+
+MEDIA_CHANNEL = "media"
+IMG_CHANNEL = "img"
+
+
+class Session:
+    """
+    State owned by one kiosk: its media and image sockets, its own
+    ProcessRequest (and through it the face-rec WebSocket), its video
+    stage and the concurrency guards that used to be module globals in
+    the router.
+    """
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.request_handler = ProcessRequest(session_id)
+        self.video = VideoStage(self.request_handler, on_result=self._on_face_result)
+        self.sockets: dict[str, WebSocket] = {}
+        self.is_processing = False
+        # Held while a greeting or an answer goes out over the media socket, so the two never interleave
+        self.speaking = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        # Only set when RECORD_SESSIONS_DIR is configured
+        self.recorder = create_recorder(session_id)
+        self.greeter = Greeter() if GREETINGS_ENABLED else None
+        # Created by the /ws/media endpoint, which knows how to answer
+        self.utterances: Optional[UtteranceQueue] = None
+        # Utterance the client is still streaming in chunks
+        self.voice_upload: Optional[VoiceUpload] = None
+        # The orchestrator ended the client's utterance at a pause (VAD_ENDPOINTING)
+        self.endpointed = False
+        self.save_task: Optional[asyncio.Task] = None
+        self.save_pending = False
+        # Set once the stored state has been loaded (or given up on); sockets wait for it
+        self.restored = asyncio.Event()
+        self.resume_task: Optional[asyncio.Task] = None
+
+    @property
+    def media_socket(self) -> Optional[WebSocket]:
+        return self.sockets.get(MEDIA_CHANNEL)
+
+    @property
+    def img_socket(self) -> Optional[WebSocket]:
+        return self.sockets.get(IMG_CHANNEL)
+
+    def start(self):
+        """Connects the upstream sockets now rather than on the first frame or utterance."""
+        self.request_handler.face_link.start()
+        self.request_handler.voice.start()
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def snapshot(self) -> dict:
+        state = self.request_handler.snapshot()
+        state["greeted"] = sorted(self.greeter.greeted) if self.greeter is not None else []
+        state["saved_at"] = time.time()
+        return state
+
+    async def restore(self) -> bool:
+        """
+        Picks up the state a previous socket, or another replica, left in the
+        session store. A session the store does not know starts fresh, and so
+        does one whose state cannot be read.
+        """
+        try:
+            state = await session_store.load(self.session_id)
+        except Exception as e:
+            SESSION_STORE_OPERATIONS.inc(op="load", result="error")
+            logger.error(f"Session {self.session_id}: could not load its state: {e}")
+            return False
+        if state is None:
+            SESSION_STORE_OPERATIONS.inc(op="load", result="miss")
+            return False
+        SESSION_STORE_OPERATIONS.inc(op="load", result="hit")
+        self.request_handler.restore(state)
+        if self.greeter is not None:
+            self.greeter.greeted.update(state.get("greeted", []))
+        logger.info(f"Session {self.session_id}: resumed state saved {time.time() - state.get('saved_at', 0):.0f}s ago")
+        return True
+
+    async def resume(self):
+        """Restores the stored state, then connects upstream; run outside the registry lock."""
+        try:
+            await self.restore()
+        except Exception as e:
+            logger.error(f"Session {self.session_id}: could not restore its state: {e}")
+        finally:
+            self.restored.set()
+        self.start()
+
+    def save(self):
+        """Saves the session state in the background, so answers never wait on the store."""
+        if self.save_task is not None and not self.save_task.done():
+            # Picked up by the running save once it is done
+            self.save_pending = True
+            return
+        self.save_task = asyncio.create_task(self._save())
+
+    async def _save(self):
+        while True:
+            self.save_pending = False
+            try:
+                await session_store.save(self.session_id, self.snapshot())
+                SESSION_STORE_OPERATIONS.inc(op="save", result="ok")
+            except Exception as e:
+                SESSION_STORE_OPERATIONS.inc(op="save", result="error")
+                logger.error(f"Session {self.session_id}: could not save its state: {e}")
+            if not self.save_pending:
+                return
+
+    def _on_face_result(self, frame: bytes, face_state: FaceRecognitionResponse, captured_at: float):
+        self.request_handler.update_face_state(frame, face_state, captured_at)
+        if self.greeter is None:
+            return
+        self.greeter.observe(face_state)
+        # Nobody is greeted in the middle of being answered
+        if self.is_processing or self.speaking.locked() or self.media_socket is None:
+            return
+        greeting = self.greeter.take(face_state)
+        if greeting is not None:
+            asyncio.create_task(self._play_greeting(greeting))
+
+    async def _play_greeting(self, greeting: PreparedGreeting):
+        try:
+            audio, lipsync_data = greeting.speech
+            message = {'audio': base64.b64encode(audio).decode('utf-8'),
+                       'lipsync': lipsync_data,
+                       'valid': True,
+                       'greeting': True}
+            async with self.speaking:
+                if self.media_socket is None:
+                    return
+                with span("socket_send"):
+                    await self.media_socket.send_text(json.dumps(message))
+            self.greeter.mark_played(greeting.person_id)
+            self.save()
+            logger.info(f"Session {self.session_id}: greeted {greeting.person_id}")
+            await mark_greeted_users([greeting.person_id])
+        except Exception as e:
+            logger.error(f"Session {self.session_id}: greeting {greeting.person_id} failed: {e}")
+
+    def record(self, channel: str, message):
+        if self.recorder is not None:
+            self.recorder.record(channel, message)
+
+    async def close(self):
+        # A save before the restore finished would overwrite the stored state with a blank one
+        if self.resume_task is not None:
+            await asyncio.wait([self.resume_task])
+        if self.utterances is not None:
+            await self.utterances.close()
+        if self.greeter is not None:
+            self.greeter.close()
+        if self.recorder is not None:
+            await self.recorder.close()
+        await self.video.close()
+        # The final state, for whichever replica the kiosk reconnects to
+        self.save()
+        await self.save_task
+        try:
+            await self.request_handler.close()
+        except Exception as e:
+            logger.error(f"Session {self.session_id}: error closing request handler: {e}")
+
+
+class SessionRegistry:
+    """
+    Pairs the /ws/media and /ws/img sockets of a kiosk by session id.
+    A session is created when its first socket attaches, resuming any state
+    the session store holds for its id, and is torn down once both of its
+    sockets have gone away. The store is read outside the lock, so a slow
+    store only holds up the sockets of the session being resumed.
+    """
+    def __init__(self):
+        self.sessions: dict[str, Session] = {}
+        self.lock = asyncio.Lock()
+
+    async def attach(self, session_id: Optional[str], channel: str, websocket: WebSocket) -> Session:
+        session_id = session_id or DEFAULT_SESSION_ID
+        async with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                session.resume_task = asyncio.create_task(session.resume())
+                self.sessions[session_id] = session
+                logger.info(f"Session {session_id} created ({len(self.sessions)} active)")
+            if channel in session.sockets:
+                # A reconnecting kiosk takes over the channel from its stale socket
+                logger.warning(f"Session {session_id}: replacing existing {channel} socket")
+            session.sockets[channel] = websocket
+            session.touch()
+        try:
+            # Frames and utterances only start once the session is back in its stored state
+            await session.restored.wait()
+        except asyncio.CancelledError:
+            await self.detach(session, channel, websocket)
+            raise
+        return session
+
+    async def detach(self, session: Session, channel: str, websocket: WebSocket):
+        async with self.lock:
+            if session.sockets.get(channel) is websocket:
+                session.sockets.pop(channel)
+            if session.sockets or self.sessions.get(session.session_id) is not session:
+                return
+            self.sessions.pop(session.session_id)
+        logger.info(f"Session {session.session_id} closed ({len(self.sessions)} active)")
+        await session.close()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+session_registry = SessionRegistry()
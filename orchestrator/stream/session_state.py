@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import ssl
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import urlparse
+import logging
+
+from .metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "memory" keeps session state in this process; redis://[:password@]host:port/db shares it between
+# replicas, rediss:// does the same over TLS
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "memory")
+# Seconds a session's state is kept after it was last saved
+SESSION_STATE_TTL = int(os.getenv("SESSION_STATE_TTL", "3600"))
+# Conversation turns kept per session and sent to the RAG service as history
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "10"))
+# Seconds a single store command may take before the session carries on without it
+SESSION_STORE_TIMEOUT = float(os.getenv("SESSION_STORE_TIMEOUT", "2"))
+
+SESSION_STORE_OPERATIONS = registry.counter(
+    "orchestrator_session_store_operations_total",
+    "Session state loads and saves by operation and result (hit, miss, ok, error).",
+)
+
+
+class SessionStoreError(Exception):
+    pass
+
+
+class SessionStore(ABC):
+    """
+    Where session state lives between sockets and between replicas. State
+    is a JSON-serializable dict; `load` returns None for an unknown or
+    expired session.
+    """
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def save(self, session_id: str, state: dict):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; state survives reconnects but not a restart or another replica."""
+    def __init__(self, ttl: int = SESSION_STATE_TTL):
+        self.ttl = ttl
+        self.entries: dict[str, tuple[float, str]] = {}
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        entry = self.entries.get(session_id)
+        if entry is None or entry[0] < time.time():
+            self.entries.pop(session_id, None)
+            return None
+        return json.loads(entry[1])
+
+    async def save(self, session_id: str, state: dict):
+        self._expire()
+        self.entries[session_id] = (time.time() + self.ttl, json.dumps(state))
+
+    async def delete(self, session_id: str):
+        self.entries.pop(session_id, None)
+
+    def _expire(self):
+        now = time.time()
+        for session_id, (expires_at, _) in list(self.entries.items()):
+            if expires_at < now:
+                del self.entries[session_id]
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Keeps session state in Redis, or anything speaking its protocol, under
+    `<prefix><session id>` with a TTL, so any replica can resume a session.
+    Speaks RESP over one connection with just the commands it needs
+    (AUTH, SELECT, GET, SET EX, DEL), reconnecting once per command when the
+    connection has dropped. A rediss:// URL connects over TLS, verifying the
+    server's certificate.
+    """
+    def __init__(self, url: str, ttl: int = SESSION_STATE_TTL, timeout: float = SESSION_STORE_TIMEOUT,
+                 prefix: str = "orchestrator:session:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ssl = ssl.create_default_context() if parsed.scheme == "rediss" else None
+        self.ttl = ttl
+        self.timeout = timeout
+        self.prefix = prefix
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        value = await self.command("GET", self.prefix + session_id)
+        return json.loads(value) if value is not None else None
+
+    async def save(self, session_id: str, state: dict):
+        await self.command("SET", self.prefix + session_id, json.dumps(state), "EX", str(self.ttl))
+
+    async def delete(self, session_id: str):
+        await self.command("DEL", self.prefix + session_id)
+
+    async def close(self):
+        self._disconnect()
+
+    async def command(self, *args: str):
+        async with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.writer is None:
+                        await self._connect()
+                    return await asyncio.wait_for(self._roundtrip(args), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    self._disconnect()
+                    if attempt == 1:
+                        raise SessionStoreError(f"Redis at {self.host}:{self.port} unavailable: {e}")
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        try:
+            if self.password:
+                await asyncio.wait_for(self._roundtrip(("AUTH", self.password)), self.timeout)
+            if self.db:
+                await asyncio.wait_for(self._roundtrip(("SELECT", str(self.db))), self.timeout)
+        except BaseException:
+            # Never leave a connection behind that skipped AUTH or SELECT
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        writer, self.writer, self.reader = self.writer, None, None
+        if writer is not None:
+            writer.close()
+
+    async def _roundtrip(self, args):
+        self.writer.write(encode_command(args))
+        await self.writer.drain()
+        return await read_reply(self.reader)
+
+
+def encode_command(args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg.encode("utf-8") if isinstance(arg, str) else arg
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise SessionStoreError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode("utf-8")
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise SessionStoreError(f"Unexpected reply from Redis: {line!r}")
+
+
+def create_session_store(url: str = SESSION_STORE_URL) -> SessionStore:
+    if url.startswith(("redis://", "rediss://")):
+        tls = " over TLS" if url.startswith("rediss://") else ""
+        logger.info(f"Session state in Redis at {url.split('@')[-1]}{tls}")
+        return RedisSessionStore(url)
+    return MemorySessionStore()
+
+
+session_store = create_session_store()
@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+from typing import Optional
+from fastapi import WebSocket
+import logging
+
+from .lipsync import lip_sync_engine, LipSyncError
+from .utils import generate_tts
+from .speech_cache import speech_cache
+from .metrics import span, TIME_TO_FIRST_AUDIO
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sentences shorter than this are merged into the next one so TTS is not
+# called for fragments like "Hi." or "Sure!"
+MIN_SENTENCE_CHARS = int(os.getenv("STREAM_MIN_SENTENCE_CHARS", "20"))
+# How many sentences may be in TTS/lip-sync ahead of the one being sent
+STREAM_LOOKAHEAD = int(os.getenv("STREAM_LOOKAHEAD", "2"))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n+')
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS) -> list[str]:
+    """Split an answer into sentence chunks suitable for incremental TTS."""
+    sentences = []
+    pending = ""
+    for part in _SENTENCE_END.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+async def render_speech(text: str) -> tuple[bytes, dict]:
+    """
+    Synthesize `text` and generate its lip-sync track. Renderings are cached,
+    so a repeated answer skips both the TTS call and rhubarb.
+    """
+    cached = await speech_cache.get(text)
+    if cached is not None:
+        return cached
+
+    with span("tts"):
+        response = await generate_tts(text)
+    if response.status_code != 200:
+        raise Exception(f"TTS failed with status {response.status_code}")
+    audio = response.content
+    try:
+        lipsync_data = await lip_sync_engine.generate(audio)
+    except LipSyncError as e:
+        # Still play the audio, just without mouth cues
+        logger.error(f"Lip sync failed: {e}")
+        return audio, {"mouthCues": []}
+    await speech_cache.put(text, audio, lipsync_data)
+    return audio, lipsync_data
+
+
+async def stream_answer(websocket: WebSocket, text: str, lookahead: int = STREAM_LOOKAHEAD,
+                        received_at: Optional[float] = None) -> int:
+    """
+    Send `text` to the avatar one sentence at a time. Up to `lookahead`
+    sentences go through TTS and lip-sync concurrently while earlier chunks
+    are sent, and chunks always go out in order. Each message carries:
+      {
+         "audio": "<base64 wav>", "lipsync": {...}, "valid": true,
+         "seq": 0, "total": 3, "final": false
+      }
+    Returns the number of chunks sent. `received_at` is when the utterance
+    arrived and is used for the time-to-first-audio metric.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return 0
+
+    start = received_at or time.time()
+    semaphore = asyncio.Semaphore(max(1, lookahead))
+
+    async def render(sentence: str):
+        async with semaphore:
+            return await render_speech(sentence)
+
+    tasks = [asyncio.create_task(render(sentence)) for sentence in sentences]
+    sent = 0
+    try:
+        for seq, task in enumerate(tasks):
+            message = {
+                'seq': seq,
+                'total': len(sentences),
+                'final': seq == len(sentences) - 1,
+            }
+            try:
+                audio, lipsync_data = await task
+            except Exception as e:
+                # Tell the client the chunk is missing so it does not wait for it
+                logger.error(f"Skipping chunk {seq}: {e}")
+                await websocket.send_text(json.dumps({**message, 'valid': False}))
+                continue
+            message.update({
+                'audio': base64.b64encode(audio).decode('utf-8'),
+                'lipsync': lipsync_data,
+                'valid': True,
+            })
+            with span("socket_send"):
+                await websocket.send_text(json.dumps(message))
+            if sent == 0:
+                TIME_TO_FIRST_AUDIO.observe(time.time() - start, mode="stream")
+                logger.info(f"Time to first audio chunk: {time.time() - start:.3f}s")
+            sent += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+    return sent
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+from .metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPEECH_CACHE_MEMORY_BYTES = int(os.getenv("SPEECH_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+SPEECH_CACHE_DISK_BYTES = int(os.getenv("SPEECH_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+SPEECH_CACHE_DIR = os.getenv("SPEECH_CACHE_DIR", os.path.join("output", "speech_cache"))
+# Part of the cache key: must change whenever the voice service's voice or
+# rhubarb's recognizer changes, so old renderings are not served
+TTS_VOICE = os.getenv("TTS_VOICE", "af_bella")
+LIPSYNC_RECOGNIZER = "phonetic"
+
+SPEECH_CACHE_REQUESTS = registry.counter(
+    "orchestrator_speech_cache_requests_total",
+    "Speech cache lookups by result (memory, disk or miss).",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text: str, voice: str = TTS_VOICE, recognizer: str = LIPSYNC_RECOGNIZER) -> str:
+    material = json.dumps([normalize_text(text), voice, recognizer])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SpeechCache:
+    """
+    Content-addressed cache of rendered speech: the TTS WAV and its rhubarb
+    mouth cues, keyed by the normalized text and the voice parameters. Hot
+    entries live in a memory LRU bounded by bytes; every entry is also
+    written to a disk tier that evicts the least recently used files once it
+    grows past `disk_bytes`. A disk hit is promoted back into memory.
+    """
+    def __init__(self, memory_bytes: int = SPEECH_CACHE_MEMORY_BYTES, disk_bytes: int = SPEECH_CACHE_DISK_BYTES,
+                 directory: Optional[str] = SPEECH_CACHE_DIR):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = directory if disk_bytes > 0 else None
+        self.memory: OrderedDict[str, tuple[bytes, dict, int]] = OrderedDict()
+        self.memory_used = 0
+        # key -> file size, oldest access first
+        self.disk: Optional[OrderedDict[str, int]] = None
+        self.disk_used = 0
+        self.counters = {"memory": 0, "disk": 0, "miss": 0}
+
+    async def get(self, text: str) -> Optional[tuple[bytes, dict]]:
+        key = cache_key(text)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self._count("memory")
+            return entry[0], entry[1]
+
+        if self.directory is not None:
+            await self._load_disk_index()
+            if key in self.disk:
+                try:
+                    audio, lipsync_data = await asyncio.to_thread(self._read_file, key)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Dropping unreadable speech cache entry {key}: {e}")
+                    self._forget_file(key)
+                else:
+                    self.disk.move_to_end(key)
+                    self._remember(key, audio, lipsync_data)
+                    self._count("disk")
+                    return audio, lipsync_data
+
+        self._count("miss")
+        return None
+
+    async def put(self, text: str, audio: bytes, lipsync_data: dict):
+        key = cache_key(text)
+        self._remember(key, audio, lipsync_data)
+        if self.directory is None:
+            return
+        await self._load_disk_index()
+        if key in self.disk:
+            return
+        try:
+            size = await asyncio.to_thread(self._write_file, key, audio, lipsync_data)
+        except OSError as e:
+            logger.warning(f"Could not write speech cache entry {key}: {e}")
+            return
+        self.disk[key] = size
+        self.disk_used += size
+        while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+            oldest = next(iter(self.disk))
+            await asyncio.to_thread(self._remove_file, oldest)
+            self._forget_file(oldest)
+
+    async def open(self):
+        """Reads the disk index now instead of on the first lookup."""
+        if self.directory is not None:
+            await self._load_disk_index()
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters.values())
+        hits = self.counters["memory"] + self.counters["disk"]
+        return {
+            **self.counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_used,
+            "disk_entries": len(self.disk or {}),
+            "disk_bytes": self.disk_used,
+        }
+
+    def _count(self, result: str):
+        self.counters[result] += 1
+        SPEECH_CACHE_REQUESTS.inc(result=result)
+
+    def _remember(self, key: str, audio: bytes, lipsync_data: dict):
+        size = len(audio) + len(json.dumps(lipsync_data))
+        if size > self.memory_bytes:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_used -= previous[2]
+        self.memory[key] = (audio, lipsync_data, size)
+        self.memory_used += size
+        while self.memory_used > self.memory_bytes:
+            _, (_, _, evicted) = self.memory.popitem(last=False)
+            self.memory_used -= evicted
+
+    async def _load_disk_index(self):
+        if self.disk is not None:
+            return
+        self.disk = OrderedDict()
+        try:
+            entries = await asyncio.to_thread(self._scan_directory)
+        except OSError as e:
+            logger.warning(f"Speech cache disk tier disabled: {e}")
+            self.directory = None
+            return
+        for key, size in entries:
+            if key in self.disk:
+                continue
+            self.disk[key] = size
+            self.disk_used += size
+        logger.info(f"Speech cache: {len(self.disk)} entries ({self.disk_used} bytes) on disk")
+
+    def _forget_file(self, key: str):
+        size = self.disk.pop(key, None)
+        if size is not None:
+            self.disk_used -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.speech")
+
+    def _scan_directory(self) -> list[tuple[str, int]]:
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".speech"):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name[:-len(".speech")], stat.st_size))
+        entries.sort()
+        return [(key, size) for _, key, size in entries]
+
+    def _read_file(self, key: str) -> tuple[bytes, dict]:
+        # One JSON line with the mouth cues, then the WAV bytes
+        with open(self._path(key), "rb") as f:
+            lipsync_data = json.loads(f.readline())
+            audio = f.read()
+        os.utime(self._path(key))
+        return audio, lipsync_data
+
+    def _write_file(self, key: str, audio: bytes, lipsync_data: dict) -> int:
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(lipsync_data).encode("utf-8") + b"\n")
+            f.write(audio)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+speech_cache = SpeechCache()
+
+registry.gauge("orchestrator_speech_cache_bytes", "Bytes held by each speech cache tier.",
+               lambda: [({"tier": "memory"}, speech_cache.memory_used), ({"tier": "disk"}, speech_cache.disk_used)])
@@ -22,6 +22,7 @@ class FaceRecognitionResponse(BaseModel):
    new_faces: Optional[List[str]] = []
    lip_center: Optional[List[float]] = []
    error: Optional[str] = None
+   request_id: Optional[int] = None
 
 
 class GenerateRequest(BaseModel):
@@ -30,6 +31,8 @@ class GenerateRequest(BaseModel):
 
 class RAGResponse(BaseModel):
     generation: str
+    # The question the RAG service answered, as it phrased it from the queries
+    prompt: Optional[str] = None
 
 class CreateVoiceUserResponse(BaseModel):
     user_id: UUID
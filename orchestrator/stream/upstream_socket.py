@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import random
+import time
+import weakref
+from typing import Optional
+import websockets
+import logging
+
+from .metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between heartbeats on an idle upstream socket, and how long a pong may take
+UPSTREAM_HEARTBEAT_INTERVAL = float(os.getenv("UPSTREAM_HEARTBEAT_INTERVAL", "10"))
+UPSTREAM_HEARTBEAT_TIMEOUT = float(os.getenv("UPSTREAM_HEARTBEAT_TIMEOUT", "5"))
+# Reconnect delays double from the initial value up to the maximum
+UPSTREAM_BACKOFF_INITIAL = float(os.getenv("UPSTREAM_BACKOFF_INITIAL", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "30"))
+# Consecutive failed connects after which the circuit opens
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "3"))
+
+CONNECTING = "connecting"
+CONNECTED = "connected"
+CIRCUIT_OPEN = "circuit_open"
+CLOSED = "closed"
+
+UPSTREAM_CONNECTS = registry.counter(
+    "orchestrator_upstream_socket_connects_total",
+    "Upstream WebSocket connection attempts by upstream and result.",
+)
+UPSTREAM_HEARTBEAT_FAILURES = registry.counter(
+    "orchestrator_upstream_socket_heartbeat_failures_total",
+    "Heartbeats that got no pong in time, by upstream.",
+)
+
+_live_sockets: "weakref.WeakSet[SupervisedWebSocket]" = weakref.WeakSet()
+
+
+def _socket_states() -> list:
+    counts: dict[tuple[str, str], int] = {}
+    for socket in list(_live_sockets):
+        key = (socket.name, socket.state)
+        counts[key] = counts.get(key, 0) + 1
+    return [({"upstream": name, "state": state}, count) for (name, state), count in counts.items()]
+
+
+registry.gauge("orchestrator_upstream_sockets", "Supervised upstream WebSockets by upstream and state.",
+               _socket_states)
+
+
+class SupervisedWebSocket:
+    """
+    A WebSocket to an upstream service kept alive by a background supervisor
+    instead of by checks on the hot path. The supervisor connects, replays
+    the `configure` message, sends a heartbeat ping every `heartbeat` seconds
+    while connected and reconnects with exponential backoff when the socket
+    drops. After `breaker_threshold` failed connects in a row the circuit is
+    open: `connection()` keeps returning None, so callers fail fast, until a
+    backoff retry gets through.
+    """
+    def __init__(self, name: str, url: str, configure: Optional[dict] = None,
+                 heartbeat: float = UPSTREAM_HEARTBEAT_INTERVAL, heartbeat_timeout: float = UPSTREAM_HEARTBEAT_TIMEOUT,
+                 backoff_initial: float = UPSTREAM_BACKOFF_INITIAL, backoff_max: float = UPSTREAM_BACKOFF_MAX,
+                 breaker_threshold: int = UPSTREAM_BREAKER_THRESHOLD):
+        self.name = name
+        self.url = url
+        self.configure_message = configure
+        self.heartbeat = heartbeat
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.ws = None
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.lost = asyncio.Event()
+        self.connected = asyncio.Event()
+        self.supervisor: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.supervisor is None or self.supervisor.done():
+            self.state = CONNECTING
+            _live_sockets.add(self)
+            self.supervisor = asyncio.create_task(self._supervise())
+
+    def connection(self):
+        """The open socket, or None right away while it is (re)connecting."""
+        self.start()
+        return self.ws if self.state == CONNECTED else None
+
+    async def wait_connected(self, timeout: float) -> bool:
+        self.start()
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def connection_lost(self, ws):
+        """Reports that `ws` failed, so the supervisor reconnects now."""
+        if ws is self.ws and self.state == CONNECTED:
+            logger.warning(f"{self.name} socket lost")
+            self._drop()
+            self.lost.set()
+
+    async def configure(self, message: dict):
+        """Sends `message` now if connected and replays it on every reconnect."""
+        self.configure_message = message
+        ws = self.connection()
+        if ws is not None:
+            try:
+                await ws.send(json.dumps(message))
+            except websockets.exceptions.WebSocketException as e:
+                self.connection_lost(ws)
+                logger.warning(f"{self.name} configure failed: {e}")
+
+    async def close(self, goodbye: Optional[dict] = None):
+        if self.supervisor and not self.supervisor.done():
+            self.supervisor.cancel()
+            try:
+                await self.supervisor
+            except (asyncio.CancelledError, Exception):
+                pass
+        ws, self.ws = self.ws, None
+        self.state = CLOSED
+        self.connected.clear()
+        _live_sockets.discard(self)
+        if ws is None:
+            return
+        try:
+            if goodbye is not None:
+                await ws.send(json.dumps(goodbye))
+            await ws.close()
+        except Exception as e:
+            logger.warning(f"Error closing {self.name} socket: {e}")
+
+    def _drop(self):
+        ws, self.ws = self.ws, None
+        self.state = CONNECTING if self.failures < self.breaker_threshold else CIRCUIT_OPEN
+        self.connected.clear()
+        if ws is not None:
+            asyncio.create_task(ws.close())
+
+    async def _supervise(self):
+        while True:
+            if self.ws is None:
+                await self._connect()
+                continue
+            self.lost.clear()
+            try:
+                await asyncio.wait_for(self.lost.wait(), self.heartbeat)
+                # Reported lost; reconnect on the next pass
+                continue
+            except asyncio.TimeoutError:
+                pass
+            await self._check_heartbeat()
+
+    async def _connect(self):
+        delay = self.retry_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            ws = await websockets.connect(self.url, ping_interval=None, max_size=None,
+                                          open_timeout=self.heartbeat_timeout)
+            if self.configure_message is not None:
+                try:
+                    await ws.send(json.dumps(self.configure_message))
+                except BaseException:
+                    # Connected but not configured; close it rather than leave it open
+                    await ws.close()
+                    raise
+        except (websockets.exceptions.WebSocketException, OSError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            UPSTREAM_CONNECTS.inc(upstream=self.name, result="failure")
+            backoff = min(self.backoff_max, self.backoff_initial * 2 ** (self.failures - 1))
+            # Jitter so sessions do not reconnect in lockstep
+            self.retry_at = time.monotonic() + backoff * random.uniform(0.8, 1.2)
+            if self.failures >= self.breaker_threshold:
+                if self.state != CIRCUIT_OPEN:
+                    logger.error(f"{self.name} unreachable after {self.failures} attempts, circuit open: {e}")
+                self.state = CIRCUIT_OPEN
+            else:
+                logger.warning(f"{self.name} connect failed ({e}), retrying in {backoff:.1f}s")
+            return
+        UPSTREAM_CONNECTS.inc(upstream=self.name, result="success")
+        if self.failures:
+            logger.info(f"{self.name} reconnected after {self.failures} failed attempts")
+        else:
+            logger.info(f"Connected to {self.name} at {self.url}")
+        self.failures = 0
+        self.retry_at = 0.0
+        self.ws = ws
+        self.state = CONNECTED
+        self.connected.set()
+
+    async def _check_heartbeat(self):
+        ws = self.ws
+        try:
+            pong = await ws.ping()
+            await asyncio.wait_for(pong, self.heartbeat_timeout)
+        except (websockets.exceptions.WebSocketException, asyncio.TimeoutError, OSError) as e:
+            UPSTREAM_HEARTBEAT_FAILURES.inc(upstream=self.name)
+            logger.warning(f"{self.name} heartbeat failed: {type(e).__name__}")
+            self.connection_lost(ws)
@@ -1,9 +1,7 @@
-import httpx
-import requests
 from .types import RAGResponse, GenerateRequest, CreateVoiceUserResponse, CreateFaceUserResponse
+from .clients import service_clients
 import uuid
-import os
-from fastapi import UploadFile
+from typing import Optional
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -12,12 +10,8 @@ logger = logging.getLogger(__name__)
 async def generate_tts(
     text: str,
 ):
-    host = os.getenv("VOICE_RECOGNITION_HOST")
-    port = os.getenv("VOICE_RECOGNITION_PORT")
     try:
-        url = f"http://{host}:{port}/voice/tts"
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={"text":text}, timeout=60.0)
+        response = await service_clients.voice.post("/voice/tts", json={"text":text})
         
         return response
     except:
@@ -26,12 +20,16 @@ async def generate_tts(
 
 async def answer_user_query(
     queries: list[GenerateRequest],
+    history: Optional[list[dict]] = None,
+    session_id: Optional[str] = None,
 ):
     try:
-        url = "http://localhost:8002/rag/multi_query"
-        response = requests.post(url, json={
-            "queries":queries,
-        })
+        payload = {"queries": queries}
+        if history is not None:
+            # The conversation so far travels with the request, so any RAG instance can answer
+            payload["history"] = history
+            payload["session_id"] = session_id
+        response = await service_clients.rag.post("/rag/multi_query", json=payload)
         res = response.json()
         print("JSON OUTPUT")
         return RAGResponse(**res)
@@ -39,42 +37,40 @@ async def answer_user_query(
         raise e
 
 
-async def add_voice_user(id: uuid.UUID, audio: UploadFile):
-    host = os.getenv("VOICE_RECOGNITION_HOST")
-    port = os.getenv("VOICE_RECOGNITION_PORT")
+async def get_user_greeting(user_id: str) -> RAGResponse:
+    """Personal greeting for a recognized user from the RAG service."""
+    response = await service_clients.rag.get(f"/users/{user_id}/greet")
+    response.raise_for_status()
+    return RAGResponse(**response.json())
+
+
+async def add_voice_user(id: uuid.UUID, audio: bytes):
     try:
-        url = f"http://{host}:{port}/voice/add_user"
-        # Reset file pointer before sending
-        await audio.seek(0)
-        
-        files = {"file": ("voice.wav", audio.file, audio.content_type)}
+        # Enrollment audio is uploaded in the same format as /voice/process
+        if audio[:4] == b"fLaC":
+            files = {"file": ("voice.flac", audio, "audio/flac")}
+        else:
+            files = {"file": ("voice.wav", audio, "audio/wav")}
         data = {"user_id": str(id)}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, files=files, data=data, timeout=60.0)
+        response = await service_clients.voice.post("/voice/add_user", files=files, data=data)
 
         return CreateVoiceUserResponse(**response.json())
     except:
         raise Exception("can't add voice user")
 
 
-async def add_face_user(id: uuid.UUID, image: UploadFile):
+async def add_face_user(id: uuid.UUID, image: bytes):
     """Minimal face embedding consumer that returns response object or None"""
     try:
-        host = os.getenv("FACE_RECOGNITION_HOST")
-        port = os.getenv("FACE_RECOGNITION_PORT")
-        url = f"http://{host}:{port}/api/v2/embed"
-        # Reset file pointer before sending
-        await image.seek(0)
-        files = {"image": ("image.jpg", image.file, image.content_type)}
+        files = {"image": ("image.jpg", image, "image/jpeg")}
         data = {"person_id": str(id)}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, files=files, data=data, timeout=60.0)
-            data = response.json()  
-            if response.status_code in (200, 201) and data.get("status") == "success":
-                return CreateFaceUserResponse(user_id=data["person_id"])
-            
-            logger.error(f"Embed failed for {id}: {data.get('message', 'Unknown error')}")
-            return None
+        response = await service_clients.face.post("/api/v2/embed", files=files, data=data)
+        data = response.json()  
+        if response.status_code in (200, 201) and data.get("status") == "success":
+            return CreateFaceUserResponse(user_id=data["person_id"])
+        
+        logger.error(f"Embed failed for {id}: {data.get('message', 'Unknown error')}")
+        return None
     except Exception as e:
         logger.info(f"Error adding face user {id}")
         return None
@@ -84,43 +80,32 @@ async def add_face_user(id: uuid.UUID, image: UploadFile):
 async def mark_greeted_users(person_ids: list[str]):
     """Consumer for marking multiple users as greeted"""
     try:
-        host = os.getenv("FACE_RECOGNITION_HOST")
-        port = os.getenv("FACE_RECOGNITION_PORT")
-        url = f"http://{host}:{port}/api/v2/mark-greeted"
-        
-        form_data = [("person_ids", pid) for pid in person_ids]
+        form_data = {"person_ids": person_ids}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, data=form_data, timeout=30.0)
-            data = response.json()
+        response = await service_clients.face.post("/api/v2/mark-greeted", data=form_data, timeout=30.0)
+        data = response.json()
 
-            if response.status_code == 200 and data.get("status") == "success":
-                return data
-            
-            logger.error(f"Mark greeted failed: {data.get('message', 'Unknown error')}")
-            return None
+        if response.status_code == 200 and data.get("status") == "success":
+            return data
+        
+        logger.error(f"Mark greeted failed: {data.get('message', 'Unknown error')}")
+        return None
     except Exception as e:
         logger.error(f"Error in mark_greeted_users: {str(e)}")
         return None
 
 
-async def update_face_user(id: uuid.UUID, image: UploadFile):
+async def update_face_user(id: uuid.UUID, image: bytes):
     try:
-        host = os.getenv("FACE_RECOGNITION_HOST")
-        port = os.getenv("FACE_RECOGNITION_PORT")
-        url = f"http://{host}:{port}/api/v2/update"
-        # Reset file pointer before sending
-        await image.seek(0)
-        files = {"image": ("image.jpg", image.file, image.content_type)}
+        files = {"image": ("image.jpg", image, "image/jpeg")}
         data = {"person_id": str(id)}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, files=files, data=data, timeout=60.0)
-            data = response.json()  
-            if response.status_code in (200, 201) and data.get("status") == "success":
-                return CreateFaceUserResponse(user_id=data["person_id"])
-            
-            logger.error(f"Embed failed for {id}: {data.get('message', 'Unknown error')}")
-            return None
+        response = await service_clients.face.post("/api/v2/update", files=files, data=data)
+        data = response.json()  
+        if response.status_code in (200, 201) and data.get("status") == "success":
+            return CreateFaceUserResponse(user_id=data["person_id"])
+        
+        logger.error(f"Embed failed for {id}: {data.get('message', 'Unknown error')}")
+        return None
     except:
         print("Error updating face user {id}")
         return None
\ No newline at end of file
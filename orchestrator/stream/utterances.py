@@ -0,0 +1,214 @@
+import asyncio
+import base64
+import io
+import os
+import time
+import wave
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import logging
+
+from .metrics import registry, STAGE_LATENCY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Utterances a session may have waiting behind the one being answered
+UTTERANCE_QUEUE_SIZE = int(os.getenv("UTTERANCE_QUEUE_SIZE", "2"))
+# Seconds after which a waiting utterance is no longer worth answering
+UTTERANCE_DEADLINE = float(os.getenv("UTTERANCE_DEADLINE", "20"))
+# A new utterance within this many seconds of the last waiting one is merged into it
+UTTERANCE_MERGE_GAP = float(os.getenv("UTTERANCE_MERGE_GAP", "5"))
+# Node-wide limits: utterances queued or in progress, and answered concurrently
+UTTERANCE_MAX_PENDING = int(os.getenv("UTTERANCE_MAX_PENDING", "32"))
+UTTERANCE_MAX_ACTIVE = int(os.getenv("UTTERANCE_MAX_ACTIVE", "8"))
+
+UTTERANCES = registry.counter(
+    "orchestrator_utterances_total",
+    "Utterances by outcome (queued, merged, rejected, expired, answered).",
+)
+
+QUEUED = "queued"
+MERGED = "merged"
+REJECTED = "rejected"
+
+
+class Utterance:
+    def __init__(self, audio_payload: Optional[str], stream: bool, received_at: float, voice_upload=None):
+        self.audio_payload = audio_payload
+        # Set instead of audio_payload when the client streamed the utterance in chunks
+        self.voice_upload = voice_upload
+        self.stream = stream
+        self.received_at = received_at
+        self.last_received_at = received_at
+        self.parts = 1
+
+
+def merge_audio(first: bytes, second: bytes) -> Optional[bytes]:
+    """
+    Appends `second` to `first`. WAV files are joined frame-wise when their
+    formats match; headerless PCM is concatenated. Returns None if the two
+    cannot be joined.
+    """
+    try:
+        with wave.open(io.BytesIO(first)) as a, wave.open(io.BytesIO(second)) as b:
+            if a.getparams()[:3] != b.getparams()[:3]:
+                return None
+            merged = io.BytesIO()
+            with wave.open(merged, "wb") as out:
+                out.setparams(a.getparams())
+                out.writeframes(a.readframes(a.getnframes()) + b.readframes(b.getnframes()))
+            return merged.getvalue()
+    except (wave.Error, EOFError):
+        if first[:4] == b"RIFF" or second[:4] == b"RIFF":
+            return None
+        return first + second
+
+
+class AdmissionControl:
+    """
+    Node-wide limits shared by every session's queue: at most `max_pending`
+    utterances may be waiting or in progress, and at most `max_active` are
+    answered at the same time. Utterances beyond `max_pending` are rejected
+    up front so an overloaded node sheds new questions instead of letting
+    every queue run past its deadline.
+    """
+    def __init__(self, max_pending: int = UTTERANCE_MAX_PENDING, max_active: int = UTTERANCE_MAX_ACTIVE):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.active = 0
+        self.semaphore = asyncio.Semaphore(max(1, max_active))
+
+    def try_admit(self) -> bool:
+        if self.pending >= self.max_pending:
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+
+admission_control = AdmissionControl()
+
+registry.gauge("orchestrator_utterances_pending", "Utterances waiting or being answered across all sessions.",
+               lambda: admission_control.pending)
+registry.gauge("orchestrator_utterances_active", "Utterances being answered across all sessions.",
+               lambda: admission_control.active)
+
+
+class UtteranceQueue:
+    """
+    Bounded queue of one session's utterances, answered one at a time by
+    `process`. A new utterance is merged into the last waiting one if it
+    follows within `merge_gap` seconds; otherwise it is queued, or rejected
+    when the session queue is full or the node is at its admission limit.
+    Utterances that waited longer than `deadline` are dropped. Rejections and
+    drops are reported to the client through `notify`.
+    """
+    def __init__(self, process: Callable[[Utterance], Awaitable[None]], notify: Callable[[dict], Awaitable[None]],
+                 max_size: int = UTTERANCE_QUEUE_SIZE, deadline: float = UTTERANCE_DEADLINE,
+                 merge_gap: float = UTTERANCE_MERGE_GAP, admission: AdmissionControl = admission_control):
+        self.process = process
+        self.notify = notify
+        self.max_size = max_size
+        self.deadline = deadline
+        self.merge_gap = merge_gap
+        self.admission = admission
+        self.waiting: deque[Utterance] = deque()
+        self.event = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+        self.current: Optional[Utterance] = None
+
+    def submit(self, utterance: Utterance) -> str:
+        if self._merge(utterance):
+            return self._outcome(MERGED)
+        if len(self.waiting) >= self.max_size:
+            self._reject("queue_full")
+            return REJECTED
+        if not self.admission.try_admit():
+            self._reject("overloaded")
+            return REJECTED
+        self.waiting.append(utterance)
+        self.event.set()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+        return self._outcome(QUEUED)
+
+    def depth(self) -> int:
+        return len(self.waiting)
+
+    async def close(self):
+        if self.worker and not self.worker.done():
+            self.worker.cancel()
+            try:
+                await self.worker
+            except (asyncio.CancelledError, Exception):
+                pass
+        for utterance in self.waiting:
+            self.admission.release()
+            if utterance.voice_upload is not None:
+                await utterance.voice_upload.cancel()
+        self.waiting.clear()
+
+    def _merge(self, utterance: Utterance) -> bool:
+        if not self.waiting:
+            return False
+        last = self.waiting[-1]
+        if last.voice_upload is not None or utterance.voice_upload is not None:
+            # Already on its way to the voice service
+            return False
+        if last.stream != utterance.stream or utterance.received_at - last.last_received_at > self.merge_gap:
+            return False
+        try:
+            merged = merge_audio(base64.b64decode(last.audio_payload), base64.b64decode(utterance.audio_payload))
+        except Exception as e:
+            logger.warning(f"Could not merge utterances: {e}")
+            return False
+        if merged is None:
+            return False
+        last.audio_payload = base64.b64encode(merged).decode("ascii")
+        last.last_received_at = utterance.received_at
+        last.parts += 1
+        return True
+
+    def _reject(self, reason: str):
+        self._outcome(f"{REJECTED}_{reason}")
+        logger.warning(f"Rejecting utterance: {reason}")
+        asyncio.create_task(self.notify({"valid": False, "status": REJECTED, "reason": reason}))
+
+    def _outcome(self, outcome: str) -> str:
+        UTTERANCES.inc(outcome=outcome)
+        return outcome
+
+    async def _run(self):
+        while True:
+            while not self.waiting:
+                self.event.clear()
+                await self.event.wait()
+            utterance = self.waiting.popleft()
+            try:
+                async with self.admission.semaphore:
+                    waited = time.time() - utterance.received_at
+                    if waited > self.deadline:
+                        self._outcome("expired")
+                        logger.warning(f"Dropping utterance that waited {waited:.1f}s")
+                        if utterance.voice_upload is not None:
+                            await utterance.voice_upload.cancel()
+                        await self.notify({"valid": False, "status": "expired"})
+                        continue
+                    STAGE_LATENCY.observe(waited, stage="queue_wait")
+                    self.current = utterance
+                    self.admission.active += 1
+                    try:
+                        await self.process(utterance)
+                        self._outcome("answered")
+                    finally:
+                        self.admission.active -= 1
+                        self.current = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error answering utterance: {type(e).__name__}: {e}")
+            finally:
+                self.admission.release()
@@ -0,0 +1,188 @@
+import os
+from collections import deque
+from typing import Optional
+import numpy as np
+import logging
+
+from .audio import VOICE_SAMPLE_RATE
+from .metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Gate utterances before the voice service: trim silence and drop clips without speech
+VAD_ENABLED = os.getenv("VAD_ENABLED", "0") == "1"
+# Frames quieter than this are never speech, whatever the background level
+VAD_ENERGY_FLOOR_DBFS = float(os.getenv("VAD_ENERGY_FLOOR_DBFS", "-50"))
+# How far above the background noise a frame must be to count as speech
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))
+# Clips with less speech than this many seconds are dropped as noise
+VAD_MIN_SPEECH = float(os.getenv("VAD_MIN_SPEECH", "0.3"))
+# Seconds of audio kept before the first and after the last speech frame
+VAD_PADDING = float(os.getenv("VAD_PADDING", "0.2"))
+# End a chunk-streamed utterance after this much silence instead of waiting for the client
+VAD_ENDPOINTING = os.getenv("VAD_ENDPOINTING", "0") == "1"
+VAD_END_SILENCE = float(os.getenv("VAD_END_SILENCE", "0.8"))
+
+FRAME_SECONDS = 0.03
+# Consecutive speech frames needed to start an utterance, so clicks do not count
+ONSET_FRAMES = 3
+# The background level is the 10th percentile of the frame energies seen so far
+NOISE_PERCENTILE = 10
+NOISE_MIN_FRAMES = 10
+# ...but only once the loud frames (90th percentile) are this far above it; with less spread the
+# quiet frames are more likely speech than background, and the carried or default level is kept
+PEAK_PERCENTILE = 90
+NOISE_MIN_SPREAD_DB = 2 * VAD_MARGIN_DB
+DEFAULT_NOISE_FLOOR_DBFS = VAD_ENERGY_FLOOR_DBFS - VAD_MARGIN_DB
+
+VAD_CLIPS = registry.counter(
+    "orchestrator_vad_clips_total",
+    "Utterances checked by the speech gate, by result (speech, no_speech, endpointed).",
+)
+VAD_TRIMMED_SECONDS = registry.counter(
+    "orchestrator_vad_trimmed_seconds_total",
+    "Seconds of leading and trailing silence not sent to the voice service.",
+)
+
+
+def frame_energies(samples: np.ndarray, frame: int) -> np.ndarray:
+    """RMS level in dBFS of each complete `frame`-sample frame."""
+    count = len(samples) // frame
+    if count == 0:
+        return np.empty(0, dtype=np.float64)
+    frames = samples[:count * frame].astype(np.float64).reshape(count, frame) / 32768.0
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def estimate_noise_floor(energies, prior: float) -> float:
+    """
+    The background level of frames with these energies, or `prior` when
+    there are too few of them or too little spread between quiet and loud
+    frames to tell background from speech, as in a clip that is mostly
+    speech.
+    """
+    if len(energies) < NOISE_MIN_FRAMES:
+        return prior
+    floor, peak = np.percentile(energies, [NOISE_PERCENTILE, PEAK_PERCENTILE])
+    return float(floor) if peak - floor >= NOISE_MIN_SPREAD_DB else prior
+
+
+class SpeechGate:
+    """
+    Energy-based voice activity detection over 16 kHz audio fed in chunks.
+    A 30 ms frame is speech when it is louder than VAD_ENERGY_FLOOR_DBFS and
+    VAD_MARGIN_DB above the background, estimated from the quietest frames
+    seen so far (or `noise_floor` carried over from the session's previous
+    utterances until they show a clear gap between background and speech,
+    see estimate_noise_floor). `feed` returns the audio to pass
+    on: nothing before the first speech except `padding` seconds of lead-in,
+    and silence after speech only once speech resumes, so leading and
+    trailing silence never leave the orchestrator. `ended` turns true after
+    `end_silence` seconds of silence following speech.
+    """
+    def __init__(self, noise_floor: Optional[float] = None, rate: int = VOICE_SAMPLE_RATE,
+                 padding: float = VAD_PADDING, end_silence: float = VAD_END_SILENCE, adaptive: bool = True):
+        self.frame = int(rate * FRAME_SECONDS)
+        self.rate = rate
+        self.prior_floor = DEFAULT_NOISE_FLOOR_DBFS if noise_floor is None else noise_floor
+        self.noise_floor = self.prior_floor
+        # False keeps `noise_floor` fixed, e.g. when it was measured on the whole clip
+        self.adaptive = adaptive
+        self.padding_frames = int(round(padding / FRAME_SECONDS))
+        self.end_silence_frames = int(round(end_silence / FRAME_SECONDS))
+        self.energies: list[float] = []
+        self.pending = np.empty(0, dtype=np.int16)
+        self.lead_in: deque[np.ndarray] = deque(maxlen=self.padding_frames + ONSET_FRAMES)
+        self.held: list[np.ndarray] = []
+        self.onset = 0
+        self.speaking = False
+        self.speech_frames = 0
+        self.silence_run = 0
+        self.received = 0
+        self.released = 0
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.speech_frames * FRAME_SECONDS
+
+    @property
+    def is_speech(self) -> bool:
+        return self.speech_seconds >= VAD_MIN_SPEECH
+
+    @property
+    def ended(self) -> bool:
+        return self.speaking and self.silence_run >= self.end_silence_frames
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        self.received += samples.size
+        self.pending = np.concatenate([self.pending, samples]) if self.pending.size else samples
+        count = len(self.pending) // self.frame
+        if count == 0:
+            return np.empty(0, dtype=np.int16)
+        usable = count * self.frame
+        frames = self.pending[:usable].reshape(count, self.frame)
+        energies = frame_energies(self.pending[:usable], self.frame)
+        self.pending = self.pending[usable:]
+        out = [self._frame(frame, energy) for frame, energy in zip(frames, energies)]
+        return self._release([chunk for chunk in out if chunk is not None])
+
+    def finish(self) -> np.ndarray:
+        """The trailing padding once the audio has ended."""
+        tail = list(self.held[:self.padding_frames]) if self.speaking else []
+        if self.speaking and self.pending.size and len(self.held) < self.padding_frames:
+            tail.append(self.pending)
+        self.held = []
+        self.pending = np.empty(0, dtype=np.int16)
+        out = self._release(tail)
+        VAD_CLIPS.inc(result="speech" if self.is_speech else "no_speech")
+        if self.is_speech:
+            VAD_TRIMMED_SECONDS.inc((self.received - self.released) / self.rate)
+        return out
+
+    def _frame(self, frame: np.ndarray, energy: float) -> Optional[np.ndarray]:
+        self.energies.append(energy)
+        if self.adaptive:
+            self.noise_floor = estimate_noise_floor(self.energies, self.prior_floor)
+        loud = energy > max(VAD_ENERGY_FLOOR_DBFS, self.noise_floor + VAD_MARGIN_DB)
+
+        if not self.speaking:
+            self.lead_in.append(frame)
+            self.onset = self.onset + 1 if loud else 0
+            if self.onset < ONSET_FRAMES:
+                return None
+            self.speaking = True
+            self.speech_frames += self.onset
+            lead_in = np.concatenate(list(self.lead_in))
+            self.lead_in.clear()
+            return lead_in
+
+        if not loud:
+            self.held.append(frame)
+            self.silence_run += 1
+            return None
+        self.speech_frames += 1
+        self.silence_run = 0
+        held, self.held = self.held, []
+        return np.concatenate(held + [frame]) if held else frame
+
+    def _release(self, chunks: list[np.ndarray]) -> np.ndarray:
+        if not chunks:
+            return np.empty(0, dtype=np.int16)
+        out = np.concatenate(chunks)
+        self.released += out.size
+        return out
+
+
+def trim_silence(samples: np.ndarray, noise_floor: Optional[float] = None) -> tuple[Optional[np.ndarray], float]:
+    """
+    A whole 16 kHz clip without its leading and trailing silence, or None
+    if it holds too little speech, and the background level it measured.
+    """
+    energies = frame_energies(samples, int(VOICE_SAMPLE_RATE * FRAME_SECONDS))
+    noise_floor = estimate_noise_floor(energies, DEFAULT_NOISE_FLOOR_DBFS if noise_floor is None else noise_floor)
+    gate = SpeechGate(noise_floor, adaptive=False)
+    speech = gate.feed(samples)
+    speech = np.concatenate([speech, gate.finish()])
+    return (speech if gate.is_speech else None), gate.noise_floor
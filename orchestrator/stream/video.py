@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Optional
+import websockets
+import logging
+
+from .types import FaceRecognitionResponse
+from .metrics import FACE_ROUNDTRIP, FRAMES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Frames that may be on the wire to the face service at once
+FACE_REC_WINDOW = int(os.getenv("FACE_REC_WINDOW", "2"))
+# Seconds to wait for a face service response before the frame counts as dropped
+FACE_REC_TIMEOUT = float(os.getenv("FACE_REC_TIMEOUT", "5.0"))
+
+
+class FrameMailbox:
+    """
+    Single-slot mailbox: putting a frame replaces any frame that has not been
+    taken yet, so the reader always gets the newest one.
+    """
+    def __init__(self):
+        self.frame: Optional[bytes] = None
+        self.received_at = 0.0
+        self.event = asyncio.Event()
+
+    def put(self, frame: bytes) -> bool:
+        """Stores `frame` and returns True if it replaced an unread frame."""
+        coalesced = self.frame is not None
+        self.frame = frame
+        self.received_at = time.time()
+        self.event.set()
+        return coalesced
+
+    async def get(self) -> tuple[bytes, float]:
+        while self.frame is None:
+            self.event.clear()
+            await self.event.wait()
+        frame, received_at = self.frame, self.received_at
+        self.frame = None
+        return frame, received_at
+
+
+class VideoStage:
+    """
+    Per-session video path to the face service. Incoming frames land in a
+    latest-frame-wins mailbox; a sender task keeps up to `window` frames in
+    flight on the face-rec WebSocket and a receiver task matches responses
+    back to them by request id (the face service numbers the frames of a
+    connection from 0).
+    """
+    def __init__(self, request_handler, on_result: Callable[[bytes, FaceRecognitionResponse, float], None],
+                 window: int = FACE_REC_WINDOW, timeout: float = FACE_REC_TIMEOUT):
+        self.request_handler = request_handler
+        self.on_result = on_result
+        self.window = max(1, window)
+        self.timeout = timeout
+        self.mailbox = FrameMailbox()
+        self.slots = asyncio.Semaphore(self.window)
+        # request id -> (sent at, frame, received from client at)
+        self.in_flight: dict[int, tuple[float, bytes, float]] = {}
+        self.next_request_id = 0
+        self.connection = None
+        self.sender_task: Optional[asyncio.Task] = None
+        self.receiver_task: Optional[asyncio.Task] = None
+        self.counters = {
+            "received": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "completed": 0,
+            "dropped": 0,
+            "errors": 0,
+        }
+
+    def submit(self, frame: bytes):
+        """Hands a frame to the stage without waiting for the face service."""
+        self._count("received")
+        if self.mailbox.put(frame):
+            self._count("coalesced")
+        if self.sender_task is None or self.sender_task.done():
+            self.sender_task = asyncio.create_task(self._send_loop())
+
+    def _count(self, outcome: str):
+        self.counters[outcome] += 1
+        FRAMES.inc(outcome=outcome)
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self.in_flight)}
+
+    async def close(self):
+        for task in (self.sender_task, self.receiver_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._drop_in_flight()
+        logger.info(f"Video stage closed: {self.stats()}")
+
+    async def _send_loop(self):
+        while True:
+            # Take a window slot first so frames arriving meanwhile coalesce
+            await self.slots.acquire()
+            frame, received_at = await self.mailbox.get()
+
+            ws = self.request_handler.face_link.connection()
+            if ws is None:
+                # Face service (re)connecting or its circuit is open: fail fast
+                self._count("dropped")
+                self.slots.release()
+                continue
+
+            if ws is not self.connection:
+                self._bind(ws)
+
+            request_id = self.next_request_id
+            self.next_request_id += 1
+            self.in_flight[request_id] = (time.time(), frame, received_at)
+            try:
+                # The client's JPEG goes out untouched; the face service decodes it
+                await ws.send(frame)
+                self._count("sent")
+            except Exception as e:
+                print(f"Failed to send frame to Face Rec WebSocket: {type(e).__name__}: {e}")
+                self._complete(request_id, dropped=True)
+                self.request_handler.face_link.connection_lost(ws)
+
+    def _bind(self, ws):
+        """Starts reading responses from a new face-rec connection."""
+        self._drop_in_flight()
+        self.connection = ws
+        self.next_request_id = 0
+        if self.receiver_task and not self.receiver_task.done():
+            self.receiver_task.cancel()
+        self.receiver_task = asyncio.create_task(self._receive_loop(ws))
+
+    async def _receive_loop(self, ws):
+        while True:
+            try:
+                response_str = await asyncio.wait_for(ws.recv(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self._expire_stale()
+                continue
+            except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK) as e:
+                print(f"Face Rec WebSocket connection closed during recv: {e}")
+                self.request_handler.face_link.connection_lost(ws)
+                self.request_handler.latest_face_rec_state = None
+                if self.connection is ws:
+                    self.connection = None
+                    self._drop_in_flight()
+                return
+
+            try:
+                response_data = json.loads(response_str)
+            except json.JSONDecodeError as e:
+                print(f"Failed to decode Face Rec JSON response: {e} - Response: {response_str}")
+                continue
+
+            request_id = response_data.get("request_id")
+            if request_id is None and self.in_flight:
+                # Face service without request ids answers in order
+                request_id = min(self.in_flight)
+            if request_id not in self.in_flight:
+                # Response for a frame that already timed out
+                continue
+            sent_at, frame, received_at = self._complete(request_id)
+            FACE_ROUNDTRIP.observe(time.time() - sent_at)
+            self._expire_stale()
+
+            if response_data.get("status") == "error":
+                self._count("errors")
+                logger.error(f"Face recognition error: {response_data.get('error')}")
+                continue
+
+            try:
+                self.on_result(frame, FaceRecognitionResponse(**response_data), received_at)
+            except Exception as e:
+                print(f"Error handling face recognition result: {type(e).__name__}: {e}")
+
+    def _complete(self, request_id: int, dropped: bool = False) -> Optional[tuple[float, bytes, float]]:
+        entry = self.in_flight.pop(request_id, None)
+        if entry is None:
+            return None
+        self._count("dropped" if dropped else "completed")
+        self.slots.release()
+        return entry
+
+    def _expire_stale(self):
+        deadline = time.time() - self.timeout
+        for request_id, (sent_at, _, _) in list(self.in_flight.items()):
+            if sent_at < deadline:
+                print(f"Timeout waiting for face recognition response to frame {request_id}.")
+                self._complete(request_id, dropped=True)
+
+    def _drop_in_flight(self):
+        for request_id in list(self.in_flight):
+            self._complete(request_id, dropped=True)
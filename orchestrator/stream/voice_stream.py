@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import struct
+from typing import Optional
+import numpy as np
+import websockets
+import logging
+
+from .audio import StreamResampler, encode_audio, VOICE_SAMPLE_RATE
+from .vad import SpeechGate
+from .metrics import registry
+from .upstream_socket import SupervisedWebSocket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Send utterances over the voice service's /voice/stream socket; 0 always uses POST /voice/process
+VOICE_STREAMING = os.getenv("VOICE_STREAMING", "1") == "1"
+# Seconds to wait for the voice service's result once the utterance has ended
+VOICE_STREAM_TIMEOUT = float(os.getenv("VOICE_STREAM_TIMEOUT", "30"))
+# Samples per binary frame when a whole recording is sent at once (0.25 s)
+VOICE_STREAM_FRAME_SAMPLES = VOICE_SAMPLE_RATE // 4
+
+VOICE_STREAM_UTTERANCES = registry.counter(
+    "orchestrator_voice_stream_utterances_total",
+    "Utterances sent to the voice service by transport (stream or http).",
+)
+
+# Binary frames are the utterance number followed by 16 kHz mono int16 PCM
+_FRAME_HEADER = struct.Struct("<I")
+
+
+class VoiceUpload:
+    """
+    One utterance on its way to the voice service. Audio passed to `feed`
+    is resampled to 16 kHz and, while the channel is up, sent right away so
+    the voice service holds the whole utterance by the time it ends. The
+    samples are kept for enrollment and for the HTTP fallback. With a
+    `gate`, silence before and after speech is held back and an utterance
+    without speech is never sent at all.
+    """
+    def __init__(self, channel: "VoiceChannel", sample_rate: int, gate: Optional[SpeechGate] = None):
+        self.channel = channel
+        self.resampler = StreamResampler(sample_rate)
+        self.gate = gate
+        self.chunks: list[np.ndarray] = []
+        self.samples = 0
+        self.number: Optional[int] = None
+        self.ws = None
+        self.result: Optional[asyncio.Future] = None
+        self.finished = False
+
+    @property
+    def streaming(self) -> bool:
+        return self.ws is not None
+
+    @property
+    def no_speech(self) -> bool:
+        """True once a finished utterance turned out to hold no speech."""
+        return self.finished and self.gate is not None and not self.gate.is_speech
+
+    @property
+    def ended(self) -> bool:
+        """True when the gate heard speech followed by enough silence to end the utterance."""
+        return self.gate is not None and self.gate.ended
+
+    def duration(self) -> float:
+        return self.samples / VOICE_SAMPLE_RATE
+
+    def encoded(self) -> tuple[bytes, str, str]:
+        """The utterance so far, encoded for an upload; see encode_audio."""
+        samples = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.int16)
+        return encode_audio(samples, VOICE_SAMPLE_RATE)
+
+    async def feed(self, samples: np.ndarray):
+        await self._send(self._gate(self.resampler.feed(samples)))
+
+    async def finish(self):
+        """Ends the utterance; the voice service starts on it immediately."""
+        if self.finished:
+            return
+        await self._send(self._gate(self.resampler.flush()))
+        if self.gate is not None:
+            await self._send(self.gate.finish())
+        self.finished = True
+        if self.no_speech:
+            await self.cancel()
+        elif self.streaming:
+            await self.channel.send_control(self, {"type": "end", "utterance": self.number})
+
+    async def cancel(self):
+        """Abandons an utterance the client never finished."""
+        self.finished = True
+        if self.streaming:
+            await self.channel.send_control(self, {"type": "cancel", "utterance": self.number})
+            self.channel.uploads.pop(self.number, None)
+            self.ws = None
+
+    async def recognized(self) -> Optional[list[dict]]:
+        """
+        The voice service's results, or None if the utterance did not make
+        it over the socket, timed out or failed there, and has to be posted
+        instead. An utterance without speech has no speakers.
+        """
+        await self.finish()
+        if self.no_speech:
+            return []
+        if not self.streaming:
+            return None
+        try:
+            return await asyncio.wait_for(self.result, VOICE_STREAM_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Voice stream gave no result for utterance {self.number} "
+                           f"({type(e).__name__}: {e}); posting it instead")
+            # Tells the voice service to stop working on it and forgets it here
+            await self.cancel()
+            return None
+
+    def _gate(self, samples: np.ndarray) -> np.ndarray:
+        self.samples += samples.size
+        return self.gate.feed(samples) if self.gate is not None else samples
+
+    async def _send(self, samples: np.ndarray):
+        if samples.size == 0:
+            return
+        self.chunks.append(samples)
+        if self.streaming:
+            for start in range(0, samples.size, VOICE_STREAM_FRAME_SAMPLES):
+                frame = samples[start:start + VOICE_STREAM_FRAME_SAMPLES]
+                await self.channel.send_frame(self, _FRAME_HEADER.pack(self.number) + frame.astype("<i2").tobytes())
+
+    def _lost(self):
+        """The socket went away mid-utterance; fall back to a POST."""
+        self.ws = None
+        if self.result is not None and not self.result.done():
+            self.result.set_result(None)
+
+
+class VoiceChannel:
+    """
+    A session's long-lived WebSocket to the voice service. Each utterance is
+    announced with a "start" message, its audio follows as binary frames
+    while the user is still talking, and an "end" message makes the voice
+    service diarize and transcribe what it already holds. Results come back
+    tagged with the utterance number. When the socket is down an upload
+    keeps its audio so the caller can post it to /voice/process instead.
+    """
+    def __init__(self, url: str):
+        self.link = SupervisedWebSocket("voice", url)
+        self.connection = None
+        self.receiver_task: Optional[asyncio.Task] = None
+        self.uploads: dict[int, VoiceUpload] = {}
+        self.next_number = 0
+
+    def start(self):
+        if VOICE_STREAMING:
+            self.link.start()
+
+    async def open(self, sample_rate: int = VOICE_SAMPLE_RATE, gate: Optional[SpeechGate] = None) -> VoiceUpload:
+        upload = VoiceUpload(self, sample_rate, gate)
+        ws = self.link.connection() if VOICE_STREAMING else None
+        if ws is None:
+            VOICE_STREAM_UTTERANCES.inc(transport="http")
+            return upload
+        if ws is not self.connection:
+            self._bind(ws)
+        upload.number = self.next_number
+        self.next_number += 1
+        upload.ws = ws
+        upload.result = asyncio.get_running_loop().create_future()
+        self.uploads[upload.number] = upload
+        await self.send_control(upload, {"type": "start", "utterance": upload.number,
+                                         "sample_rate": VOICE_SAMPLE_RATE})
+        if upload.streaming:
+            VOICE_STREAM_UTTERANCES.inc(transport="stream")
+        else:
+            VOICE_STREAM_UTTERANCES.inc(transport="http")
+        return upload
+
+    async def send_control(self, upload: VoiceUpload, message: dict):
+        await self._send(upload, json.dumps(message))
+
+    async def send_frame(self, upload: VoiceUpload, frame: bytes):
+        await self._send(upload, frame)
+
+    async def close(self):
+        if self.receiver_task and not self.receiver_task.done():
+            self.receiver_task.cancel()
+        self._drop_uploads()
+        await self.link.close()
+
+    async def _send(self, upload: VoiceUpload, message):
+        ws = upload.ws
+        if ws is None:
+            return
+        try:
+            await ws.send(message)
+        except websockets.exceptions.WebSocketException as e:
+            logger.warning(f"Voice stream send failed: {type(e).__name__}: {e}")
+            self.link.connection_lost(ws)
+            self._drop_uploads()
+
+    def _bind(self, ws):
+        """Starts reading results from a new voice service connection."""
+        self._drop_uploads()
+        self.connection = ws
+        self.next_number = 0
+        if self.receiver_task and not self.receiver_task.done():
+            self.receiver_task.cancel()
+        self.receiver_task = asyncio.create_task(self._receive_loop(ws))
+
+    async def _receive_loop(self, ws):
+        while True:
+            try:
+                message = await ws.recv()
+            except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK) as e:
+                logger.warning(f"Voice stream closed: {e}")
+                self.link.connection_lost(ws)
+                if self.connection is ws:
+                    self.connection = None
+                    self._drop_uploads()
+                return
+
+            try:
+                data = json.loads(message)
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.error(f"Invalid message from the voice stream: {e}")
+                continue
+
+            upload = self.uploads.pop(data.get("utterance"), None)
+            if upload is None or upload.result.done():
+                continue
+            if data.get("type") == "result":
+                upload.result.set_result(data.get("results") or [])
+            else:
+                logger.error(f"Voice stream error for utterance {data.get('utterance')}: {data.get('detail')}")
+                upload.result.set_exception(RuntimeError(data.get("detail") or "voice stream error"))
+
+    def _drop_uploads(self):
+        uploads, self.uploads = self.uploads, {}
+        for upload in uploads.values():
+            upload._lost()
+
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+import numpy as np
+import websockets
+import logging
+
+from .audio import encode_audio, VOICE_SAMPLE_RATE
+from .clients import service_clients
+from .lipsync import lip_sync_engine
+from .metrics import registry
+from .speech_cache import speech_cache
+from .session_state import session_store
+from .types import GenerateRequest
+from .utils import generate_tts, answer_user_query
+from .voice_stream import VOICE_STREAMING
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Run the warm-up at startup; with 0 the orchestrator reports ready immediately
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# Text synthesized to warm up the TTS model
+WARMUP_TEXT = os.getenv("WARMUP_TEXT", "Hello, and welcome.")
+# A question sent through /rag/multi_query; unset only touches the RAG service without invoking the LLM
+WARMUP_RAG_QUESTION = os.getenv("WARMUP_RAG_QUESTION")
+# Seconds before a failed step is tried again, and how long one attempt may take
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "10"))
+WARMUP_STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "60"))
+
+PENDING = "pending"
+OK = "ok"
+FAILED = "failed"
+
+
+class WarmupStep:
+    def __init__(self, name: str, run: Callable[[], Awaitable[None]]):
+        self.name = name
+        self.run = run
+        self.status = PENDING
+        self.seconds: Optional[float] = None
+        self.attempts = 0
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {"status": self.status, "seconds": self.seconds, "attempts": self.attempts, "error": self.error}
+
+
+class Warmup:
+    """
+    Pays the cold costs of the first answer before a kiosk does: opens the
+    HTTP pools and checks the face and voice sockets, synthesizes speech
+    once, runs rhubarb once and reaches the RAG service. Steps run
+    concurrently in the background; failed ones are retried every
+    `retry_interval` seconds. `ready` turns true only once every step has
+    succeeded, so the first real answer takes as long as any later one.
+    """
+    def __init__(self, retry_interval: float = WARMUP_RETRY_INTERVAL, step_timeout: float = WARMUP_STEP_TIMEOUT):
+        self.retry_interval = retry_interval
+        self.step_timeout = step_timeout
+        self.steps = {step.name: step for step in (
+            WarmupStep("speech_cache", speech_cache.open),
+            WarmupStep("voice", _warm_voice),
+            WarmupStep("face", _warm_face),
+            WarmupStep("tts", _warm_tts),
+            WarmupStep("lipsync", _warm_lipsync),
+            WarmupStep("rag", _warm_rag),
+            WarmupStep("session_store", _warm_session_store),
+        )}
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.started_at = time.time()
+        if not WARMUP_ENABLED:
+            self._mark_ready()
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at and self.started_at else None,
+            "steps": {name: step.as_dict() for name, step in self.steps.items()},
+        }
+
+    async def _run(self):
+        while True:
+            pending = [step for step in self.steps.values() if step.status != OK]
+            await asyncio.gather(*(self._attempt(step) for step in pending))
+            if all(step.status == OK for step in self.steps.values()):
+                self._mark_ready()
+                return
+            failed = ", ".join(step.name for step in self.steps.values() if step.status != OK)
+            logger.warning(f"Warm-up incomplete ({failed}), retrying in {self.retry_interval:.0f}s")
+            await asyncio.sleep(self.retry_interval)
+
+    async def _attempt(self, step: WarmupStep):
+        step.attempts += 1
+        start = time.time()
+        try:
+            await asyncio.wait_for(step.run(), self.step_timeout)
+        except Exception as e:
+            step.status = FAILED
+            step.error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Warm-up step {step.name} failed: {step.error}")
+            return
+        step.seconds = round(time.time() - start, 3)
+        step.status = OK
+        step.error = None
+        logger.info(f"Warm-up step {step.name} done in {step.seconds}s")
+
+    def _mark_ready(self):
+        self.ready = True
+        self.ready_at = time.time()
+        logger.info(f"Orchestrator ready after {self.ready_at - self.started_at:.1f}s")
+
+
+async def _warm_voice():
+    response = await service_clients.voice.get("/health")
+    response.raise_for_status()
+    if VOICE_STREAMING:
+        await _probe_socket(f"{_ws_base('VOICE_RECOGNITION')}/voice/stream")
+
+
+async def _warm_face():
+    # Sessions open their own face-rec sockets; this one only checks the endpoint accepts and configures
+    await _probe_socket(f"{_ws_base('FACE_RECOGNITION')}/api/v2/identify",
+                        {"action": "configure", "threshold": 0.5, "max_faces": 5}, {"action": "close"})
+
+
+async def _warm_tts():
+    # Straight to the voice service: a speech cache hit would leave the TTS model cold
+    response = await generate_tts(WARMUP_TEXT)
+    response.raise_for_status()
+
+
+async def _warm_lipsync():
+    # Loads rhubarb and its acoustic models from disk once, on half a second of silence
+    silence, _, _ = encode_audio(np.zeros(VOICE_SAMPLE_RATE // 2, dtype=np.int16), VOICE_SAMPLE_RATE, "wav")
+    await lip_sync_engine.generate(silence)
+
+
+async def _warm_rag():
+    if WARMUP_RAG_QUESTION:
+        await answer_user_query([GenerateRequest(user_id="warmup", question=WARMUP_RAG_QUESTION).dict()])
+        return
+    # No LLM call and nothing stored: an unknown user's details are a 404
+    response = await service_clients.rag.get("/users/warmup/details")
+    if response.status_code >= 500:
+        response.raise_for_status()
+
+
+async def _warm_session_store():
+    # Connects to a shared store now; a replica that cannot reach it could not resume sessions
+    await session_store.load("warmup")
+
+
+async def _probe_socket(url: str, *messages: dict):
+    async with websockets.connect(url, open_timeout=WARMUP_STEP_TIMEOUT) as ws:
+        for message in messages:
+            await ws.send(json.dumps(message))
+
+
+def _ws_base(prefix: str) -> str:
+    return f"ws://{os.getenv(f'{prefix}_HOST')}:{os.getenv(f'{prefix}_PORT')}"
+
+
+warmup = Warmup()
+
+registry.gauge("orchestrator_ready", "1 once the startup warm-up has completed.", lambda: int(warmup.ready))
+registry.gauge("orchestrator_warmup_step_seconds", "Duration of the successful attempt of each warm-up step.",
+               lambda: [({"step": step.name}, step.seconds) for step in warmup.steps.values()
+                        if step.seconds is not None])
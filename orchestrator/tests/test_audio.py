@@ -0,0 +1,81 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from stream import audio
+from stream.audio import StreamResampler, decode_audio, encode_audio, resample, to_voice_samples, VOICE_SAMPLE_RATE
+
+
+def tone(rate: int, seconds: float = 0.5, frequency: float = 440.0) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16)
+
+
+def wav(samples: np.ndarray, rate: int, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("rate", [48000, 44100, 8000])
+def test_chunked_resampling_matches_resampling_the_whole_recording(rate):
+    samples = tone(rate)
+    resampler = StreamResampler(rate)
+    rng = np.random.default_rng(0)
+    chunks, start = [], 0
+    while start < len(samples):
+        size = int(rng.integers(1, 2000))
+        chunks.append(resampler.feed(samples[start:start + size]))
+        start += size
+    chunks.append(resampler.flush())
+
+    assert np.array_equal(np.concatenate(chunks), resample(samples, rate))
+
+
+def test_audio_already_at_the_voice_rate_passes_through():
+    samples = tone(VOICE_SAMPLE_RATE)
+    resampler = StreamResampler(VOICE_SAMPLE_RATE)
+    assert resampler.feed(samples) is samples
+    assert resampler.flush().size == 0
+
+
+def test_stereo_wav_is_downmixed_and_resampled():
+    left, right = tone(48000), np.zeros(24000, dtype=np.int16)
+    stereo = np.column_stack([left, right]).reshape(-1)
+    samples, rate = decode_audio(wav(stereo, 48000, channels=2))
+
+    assert rate == 48000
+    assert np.array_equal(samples, (left.astype(np.float32) / 2).astype(np.int16))
+    assert len(to_voice_samples(wav(stereo, 48000, channels=2))) == 8000
+
+
+def test_headerless_audio_is_taken_as_client_pcm():
+    samples, rate = decode_audio(tone(48000).tobytes() + b"\x00")
+    assert rate == audio.CLIENT_SAMPLE_RATE
+    assert np.array_equal(samples, tone(48000))
+
+
+def test_flac_upload_is_lossless_and_smaller_than_wav():
+    soundfile = pytest.importorskip("soundfile")
+    samples = tone(VOICE_SAMPLE_RATE, seconds=2)
+    flac, name, content_type = encode_audio(samples, VOICE_SAMPLE_RATE, "flac")
+    wav_bytes, _, _ = encode_audio(samples, VOICE_SAMPLE_RATE, "wav")
+    decoded, rate = soundfile.read(io.BytesIO(flac), dtype="int16")
+
+    assert (name, content_type) == ("audio.flac", "audio/flac")
+    assert rate == VOICE_SAMPLE_RATE and np.array_equal(decoded, samples)
+    assert len(flac) < len(wav_bytes)
+
+
+def test_flac_falls_back_to_wav_without_soundfile(monkeypatch):
+    monkeypatch.setattr(audio, "soundfile", None)
+    upload, name, content_type = encode_audio(tone(VOICE_SAMPLE_RATE), VOICE_SAMPLE_RATE, "flac")
+
+    assert (name, content_type) == ("audio.wav", "audio/wav")
+    assert decode_audio(upload)[1] == VOICE_SAMPLE_RATE
@@ -0,0 +1,105 @@
+import asyncio
+
+from stream.enrollment import EnrollmentQueue, VOICE, FACE
+
+
+class RecordingAction:
+    """Enrollment endpoint stand-in; fails its first `failures` calls."""
+    def __init__(self, failures: int = 0, raises: bool = False):
+        self.failures = failures
+        self.raises = raises
+        self.calls: list[tuple[str, bytes]] = []
+
+    async def __call__(self, user_id, payload):
+        self.calls.append((user_id, payload))
+        if len(self.calls) <= self.failures:
+            if self.raises:
+                raise RuntimeError("service unavailable")
+            return None
+        return {"user_id": user_id}
+
+
+async def drain(queue: EnrollmentQueue, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while (queue.pending or queue.retries) and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(0.01)
+
+
+def test_pending_submission_for_the_same_user_and_modality_is_replaced():
+    async def scenario():
+        action = RecordingAction()
+        queue = EnrollmentQueue(workers=1)
+        # Submitted before the workers run: all three wait together
+        queue.submit("alice", VOICE, action, b"first")
+        queue.submit("alice", VOICE, action, b"second")
+        queue.submit("alice", FACE, action, b"face")
+        assert queue.depth() == 2
+        await drain(queue)
+        await queue.close()
+        return action, queue
+
+    action, queue = asyncio.run(scenario())
+    assert sorted(action.calls) == [("alice", b"face"), ("alice", b"second")]
+    assert queue.counters["deduplicated"] == 1
+    assert queue.counters["completed"] == 2
+
+
+def test_failed_enrollment_is_retried_until_it_succeeds():
+    async def scenario():
+        action = RecordingAction(failures=2, raises=True)
+        queue = EnrollmentQueue(workers=1, max_retries=3, retry_delay=0.01)
+        queue.submit("alice", VOICE, action, b"sample")
+        await drain(queue)
+        await queue.close()
+        return action, queue
+
+    action, queue = asyncio.run(scenario())
+    assert len(action.calls) == 3
+    assert (queue.counters["retried"], queue.counters["completed"], queue.counters["failed"]) == (2, 1, 0)
+
+
+def test_enrollment_is_given_up_after_max_retries():
+    async def scenario():
+        action = RecordingAction(failures=10)
+        queue = EnrollmentQueue(workers=1, max_retries=2, retry_delay=0.01)
+        queue.submit("alice", VOICE, action, b"sample")
+        await drain(queue)
+        await queue.close()
+        return action, queue
+
+    action, queue = asyncio.run(scenario())
+    assert len(action.calls) == 3
+    assert (queue.counters["retried"], queue.counters["failed"]) == (2, 1)
+    assert queue.depth() == 0
+
+
+def test_retry_yields_to_a_newer_sample():
+    async def scenario():
+        action = RecordingAction(failures=1)
+        queue = EnrollmentQueue(workers=1, max_retries=3, retry_delay=0.05)
+        queue.submit("alice", VOICE, action, b"old")
+        await asyncio.sleep(0.02)
+        # The old sample failed and waits for its retry; a newer one arrives meanwhile
+        queue.submit("alice", VOICE, action, b"new")
+        await drain(queue)
+        await queue.close()
+        return action
+
+    assert asyncio.run(scenario()).calls == [("alice", b"old"), ("alice", b"new")]
+
+
+def test_close_cancels_pending_retries():
+    async def scenario():
+        action = RecordingAction(failures=10)
+        queue = EnrollmentQueue(workers=1, max_retries=3, retry_delay=60)
+        queue.submit("alice", VOICE, action, b"sample")
+        await asyncio.sleep(0.02)
+        assert len(queue.retries) == 1
+        retry = next(iter(queue.retries))
+        await queue.close()
+        return retry, queue
+
+    retry, queue = asyncio.run(scenario())
+    assert retry.cancelled()
+    assert not queue.retries and not queue.tasks
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+from stream import greeting
+from stream.greeting import Greeter
+from stream.types import FaceRecognitionResponse, Match
+
+FAR = [400, 100, 460, 170]
+CLOSE = [100, 100, 300, 320]
+
+
+def faces(*matches, new_faces=()):
+    return FaceRecognitionResponse(matches=[Match(person_id=person_id, confidence=0.9, bbox=bbox)
+                                            for person_id, bbox in matches],
+                                   face_detected=bool(matches), processed_faces=len(matches), status="success",
+                                   new_faces=list(new_faces))
+
+
+def count_preparations(monkeypatch) -> list:
+    prepared = []
+
+    async def get_user_greeting(person_id):
+        prepared.append(person_id)
+        return SimpleNamespace(generation=f"Hello {person_id}")
+
+    async def render_speech(text):
+        return b"audio", {"mouthCues": []}
+
+    monkeypatch.setattr(greeting, "get_user_greeting", get_user_greeting)
+    monkeypatch.setattr(greeting, "render_speech", render_speech)
+    return prepared
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_greeting_plays_once_its_person_is_close(monkeypatch):
+    prepared = count_preparations(monkeypatch)
+
+    async def scenario():
+        greeter = Greeter()
+        greeter.observe(faces(("alice", FAR), new_faces=["alice"]))
+        await settle()
+        assert greeter.take(faces(("alice", FAR))) is None
+        played = greeter.take(faces(("alice", CLOSE)))
+        assert (played.person_id, played.text) == ("alice", "Hello alice")
+        assert greeter.take(faces(("alice", CLOSE))) is None
+
+    asyncio.run(scenario())
+    assert prepared == ["alice"]
+
+
+def test_person_lingering_in_view_is_prepared_for_once(monkeypatch):
+    prepared = count_preparations(monkeypatch)
+
+    async def scenario():
+        greeter = Greeter(ttl=60)
+        greeter.observe(faces(("alice", FAR), new_faces=["alice"]))
+        await settle()
+        # Well past the TTL, but alice never left the frame
+        greeter.ready["alice"] = greeter.ready["alice"]._replace(prepared_at=greeter.ready["alice"].prepared_at - 600)
+        for _ in range(3):
+            greeter.observe(faces(("alice", FAR), new_faces=["alice"]))
+            await settle()
+            assert greeter.take(faces(("alice", FAR))) is None
+        assert greeter.take(faces(("alice", CLOSE))).person_id == "alice"
+
+    asyncio.run(scenario())
+    assert prepared == ["alice"]
+
+
+def test_greeting_is_discarded_after_its_person_left(monkeypatch):
+    prepared = count_preparations(monkeypatch)
+
+    async def scenario():
+        greeter = Greeter(ttl=60)
+        greeter.observe(faces(("alice", FAR), new_faces=["alice"]))
+        await settle()
+        greeter.last_seen["alice"] -= 61
+        assert greeter.take(faces(("alice", CLOSE))) is None
+        # Back in view later: prepared again
+        greeter.observe(faces(("alice", FAR), new_faces=["alice"]))
+        await settle()
+        assert greeter.take(faces(("alice", CLOSE))).person_id == "alice"
+
+    asyncio.run(scenario())
+    assert prepared == ["alice", "alice"]
+
+
+def test_greeted_person_is_not_prepared_for_again(monkeypatch):
+    prepared = count_preparations(monkeypatch)
+
+    async def scenario():
+        greeter = Greeter()
+        greeter.observe(faces(("alice", CLOSE), new_faces=["alice"]))
+        await settle()
+        greeter.mark_played(greeter.take(faces(("alice", CLOSE))).person_id)
+        greeter.observe(faces(("alice", CLOSE), new_faces=["alice"]))
+        await settle()
+        assert not greeter.preparing and not greeter.ready
+
+    asyncio.run(scenario())
+    assert prepared == ["alice"]
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import uuid
+
+from stream import service
+from stream.identity import IdentityBindings
+from stream.service import ProcessRequest
+from stream.types import FaceRecognitionResponse, Match, VoiceRecognitionResponse
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, user_id, modality, action, payload):
+        self.submitted.append((str(user_id), modality))
+
+
+def unknown_face(bbox):
+    return FaceRecognitionResponse(matches=[Match(person_id="Unknown", confidence=0, bbox=bbox)],
+                                   face_detected=True, processed_faces=1, status="success")
+
+
+def unknown_speaker(text):
+    return [VoiceRecognitionResponse(userid=None, transcription=text, score=0.0)]
+
+
+def speak(request, face_state, text):
+    request.update_face_state(b"frame", face_state)
+    request.audio, request.image = b"audio", b"frame"
+    return asyncio.run(request.identify_user(unknown_speaker(text), face_state))
+
+
+def test_two_strangers_get_their_own_identities(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(service, "enrollment_queue", queue)
+    request = ProcessRequest("kiosk")
+
+    first = speak(request, unknown_face([100, 100, 200, 220]), "Hello")
+    second = speak(request, unknown_face([400, 120, 500, 240]), "Hi there")
+
+    assert first != second
+    assert sorted(queue.submitted) == sorted([(first, "voice"), (first, "face"), (second, "voice"), (second, "face")])
+
+
+def test_same_stranger_is_not_enrolled_twice(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(service, "enrollment_queue", queue)
+    request = ProcessRequest("kiosk")
+
+    first = speak(request, unknown_face([100, 100, 200, 220]), "Hello")
+    again = speak(request, unknown_face([110, 105, 210, 225]), "Where is the library?")
+
+    assert again == first
+    assert sorted(queue.submitted) == sorted([(first, "voice"), (first, "face")])
+
+
+def test_stranger_in_the_same_spot_after_a_gap_is_someone_else(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(service, "enrollment_queue", queue)
+    request = ProcessRequest("kiosk")
+
+    first = speak(request, unknown_face([100, 100, 200, 220]), "Hello")
+    binding = request.identity.bindings[first]
+    binding.face_seen_at -= request.identity.face_max_gap + 1
+    second = speak(request, unknown_face([100, 100, 200, 220]), "Hi there")
+
+    assert second != first
+
+
+def faces(*matches, tracked=()):
+    return FaceRecognitionResponse(matches=[Match(person_id=person_id, confidence=0.9 if person_id != "Unknown" else 0,
+                                                  bbox=bbox) for person_id, bbox in matches],
+                                   face_detected=bool(matches), processed_faces=len(matches), status="success",
+                                   tracked=list(tracked))
+
+
+def test_voice_is_bound_to_the_face_seen_speaking(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(service, "enrollment_queue", queue)
+    request = ProcessRequest("kiosk")
+    voice_id, face_id = uuid.uuid4(), str(uuid.uuid4())
+    speaker = [VoiceRecognitionResponse(userid=voice_id, transcription="Hello", score=0.9)]
+    seen = faces((face_id, [100, 100, 200, 220]))
+
+    # The face service still knows this face by another id; fusion settles on the voice's
+    request.update_face_state(b"frame", seen)
+    request.image = b"frame"
+    person_id = asyncio.run(request.identify_user(speaker, seen))
+    request.identity.bind(person_id, person_id, face=request.speaker_face)
+    binding = request.identity.bindings[str(voice_id)]
+    assert (binding.person_id, binding.face_id) == (str(voice_id), face_id)
+
+    # Same voice with that face in view: the binding answers
+    assert request.identity.lookup(voice_id, faces((face_id, [105, 100, 205, 220]))) is binding
+    # Same voice while only someone else is in view: fusion has to run again
+    assert request.identity.lookup(voice_id, faces((str(uuid.uuid4()), [400, 100, 500, 220]))) is None
+
+
+def test_binding_follows_an_unknown_face():
+    identity = IdentityBindings()
+    binding = identity.bind("voice", "person", face=Match(person_id="Unknown", bbox=[100, 100, 200, 220]))
+    binding.confirmed_at -= identity.half_life
+
+    identity.confirm(faces(("Unknown", [110, 100, 210, 220])))
+    assert binding.confidence(time.time(), identity.half_life) > 0.99
+    assert binding.bbox == [110, 100, 210, 220]
+    assert identity.lookup("voice", faces(("Unknown", [120, 100, 220, 220]))) is binding
+    assert identity.lookup("voice", faces(("Unknown", [400, 100, 500, 220]))) is None
@@ -0,0 +1,70 @@
+import pytest
+
+from stream.metrics import MetricsRegistry, span, STAGE_ERRORS, STAGE_LATENCY
+
+
+def test_counter_is_rendered_per_label_set():
+    registry = MetricsRegistry()
+    frames = registry.counter("frames_total", "Frames by outcome.")
+    frames.inc(outcome="sent")
+    frames.inc(2, outcome="sent")
+    frames.inc(outcome="dropped")
+
+    assert registry.render() == (
+        "# HELP frames_total Frames by outcome.\n"
+        "# TYPE frames_total counter\n"
+        'frames_total{outcome="sent"} 3.0\n'
+        'frames_total{outcome="dropped"} 1.0\n'
+    )
+
+
+def test_labels_are_sorted_and_escaped():
+    registry = MetricsRegistry()
+    errors = registry.counter("errors_total", "Errors.")
+    errors.inc(stage="a\"b", kind="x\\y\nz")
+
+    assert registry.render().splitlines()[-1] == 'errors_total{kind="x\\\\y\\nz",stage="a\\"b"} 1.0'
+
+
+def test_gauge_reads_its_callback_at_scrape_time():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge("queue_depth", "Queue depth.", lambda: depth[0])
+    registry.gauge("in_flight", "In flight per session.", lambda: [({"session": "k1"}, 2), ({"session": "k2"}, 0)])
+    depth[0] = 5
+
+    assert registry.render().splitlines() == [
+        "# HELP queue_depth Queue depth.",
+        "# TYPE queue_depth gauge",
+        "queue_depth 5.0",
+        "# HELP in_flight In flight per session.",
+        "# TYPE in_flight gauge",
+        'in_flight{session="k1"} 2.0',
+        'in_flight{session="k2"} 0.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative_with_inclusive_bounds():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, stage="rag")
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{stage="rag",le="0.1"} 2',
+        'latency_seconds_bucket{stage="rag",le="1.0"} 3',
+        'latency_seconds_bucket{stage="rag",le="+Inf"} 4',
+        'latency_seconds_sum{stage="rag"} 3.65',
+        'latency_seconds_count{stage="rag"} 4',
+    ]
+
+
+def test_span_times_the_stage_and_counts_its_errors():
+    with span("test_span"):
+        pass
+    with pytest.raises(ValueError):
+        with span("test_span"):
+            raise ValueError("boom")
+
+    assert STAGE_LATENCY.values[(("stage", "test_span"),)][-1] == 2
+    assert STAGE_ERRORS.values[(("stage", "test_span"),)] == 1
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from loadtest.stubs import RedisStub
+from stream.session_state import (MemorySessionStore, RedisSessionStore, SessionStore, SessionStoreError,
+                                  create_session_store, encode_command, read_reply)
+
+
+class RecordingRedis(RedisStub):
+    """The load-test Redis stand-in, recording commands and checking the password."""
+    def __init__(self, password=None):
+        super().__init__()
+        self.password = password
+        self.commands = []
+
+    def _execute(self, command):
+        self.commands.append([arg.decode() for arg in command])
+        if command[0].upper() == b"AUTH" and command[-1].decode() != self.password:
+            return b"-WRONGPASS invalid username-password pair\r\n"
+        return super()._execute(command)
+
+
+async def with_redis(redis, test):
+    server = await asyncio.start_server(redis.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await test(port)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def parse(data: bytes):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return await read_reply(reader)
+
+
+def test_resp_encoding():
+    assert encode_command(("SET", "key", "välue")) == b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$6\r\nv\xc3\xa4lue\r\n"
+
+
+def test_resp_replies():
+    assert asyncio.run(parse(b"+OK\r\n")) == "OK"
+    assert asyncio.run(parse(b":3\r\n")) == 3
+    assert asyncio.run(parse(b"$5\r\nhello\r\n")) == "hello"
+    assert asyncio.run(parse(b"$-1\r\n")) is None
+    assert asyncio.run(parse(b"*2\r\n$1\r\na\r\n:1\r\n")) == ["a", 1]
+    with pytest.raises(SessionStoreError, match="ERR"):
+        asyncio.run(parse(b"-ERR wrong\r\n"))
+
+
+def test_redis_store_round_trip():
+    redis = RecordingRedis(password="secret")
+
+    async def test(port):
+        store = RedisSessionStore(f"redis://:secret@127.0.0.1:{port}/2", ttl=60)
+        assert await store.load("kiosk") is None
+        await store.save("kiosk", {"history": [{"prompt": "hi", "generation": "hello"}]})
+        state = await store.load("kiosk")
+        await store.delete("kiosk")
+        assert await store.load("kiosk") is None
+        await store.close()
+        return state
+
+    state = asyncio.run(with_redis(redis, test))
+    assert state == {"history": [{"prompt": "hi", "generation": "hello"}]}
+    names = [command[0] for command in redis.commands]
+    assert names[:2] == ["AUTH", "SELECT"] and names.count("AUTH") == 1
+    assert redis.commands[1] == ["SELECT", "2"]
+    assert ["EX", "60"] == [arg for arg in redis.commands if arg[0] == "SET"][0][-2:]
+    assert ["DEL", "orchestrator:session:kiosk"] in redis.commands
+
+
+def test_redis_store_reconnects_after_a_dropped_connection():
+    redis = RecordingRedis()
+
+    async def test(port):
+        store = RedisSessionStore(f"redis://127.0.0.1:{port}", ttl=60)
+        await store.save("kiosk", {"noise_floor": -60})
+        store.writer.close()
+        state = await store.load("kiosk")
+        await store.close()
+        return state
+
+    assert asyncio.run(with_redis(redis, test)) == {"noise_floor": -60}
+
+
+def test_redis_store_rejected_password():
+    async def test(port):
+        store = RedisSessionStore(f"redis://:wrong@127.0.0.1:{port}")
+        with pytest.raises(SessionStoreError, match="WRONGPASS"):
+            await store.load("kiosk")
+        # Not left connected without authentication
+        assert store.writer is None
+
+    asyncio.run(with_redis(RecordingRedis(password="secret"), test))
+
+
+def test_redis_store_unreachable():
+    async def test():
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        store = RedisSessionStore(f"redis://127.0.0.1:{port}", timeout=0.5)
+        with pytest.raises(SessionStoreError, match="unavailable"):
+            await store.load("kiosk")
+
+    asyncio.run(test())
+
+
+def test_tls_url_does_not_fall_back_to_plaintext():
+    redis = RecordingRedis(password="secret")
+
+    async def test(port):
+        store = RedisSessionStore(f"rediss://:secret@127.0.0.1:{port}", timeout=0.5)
+        with pytest.raises(SessionStoreError):
+            await store.load("kiosk")
+
+    asyncio.run(with_redis(redis, test))
+    assert not any(command[0] == "AUTH" for command in redis.commands)
+
+
+def test_memory_store_expires_state():
+    async def test():
+        store = MemorySessionStore(ttl=60)
+        await store.save("kiosk", {"greeted": ["a"]})
+        loaded = await store.load("kiosk")
+        store.entries["kiosk"] = (0.0, store.entries["kiosk"][1])
+        return loaded, await store.load("kiosk")
+
+    assert asyncio.run(test()) == ({"greeted": ["a"]}, None)
+
+
+def test_store_selection():
+    assert isinstance(create_session_store("memory"), MemorySessionStore)
+    assert isinstance(create_session_store(""), MemorySessionStore)
+    assert isinstance(create_session_store("redis://127.0.0.1:6379/1"), RedisSessionStore)
+    assert create_session_store("rediss://127.0.0.1:6380").ssl is not None
+    with pytest.raises(TypeError):
+        SessionStore()
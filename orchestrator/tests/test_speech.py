@@ -0,0 +1,72 @@
+import asyncio
+import base64
+import json
+
+from stream import speech
+from stream.speech import split_sentences, stream_answer
+
+
+class FakeSocket:
+    def __init__(self):
+        self.messages: list[dict] = []
+
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+
+def test_answer_is_split_into_sentences():
+    text = "The library opens at nine in the morning. It closes at six! Would you like directions?"
+    assert split_sentences(text, min_chars=10) == [
+        "The library opens at nine in the morning.",
+        "It closes at six!",
+        "Would you like directions?",
+    ]
+
+
+def test_short_fragments_are_merged_into_the_next_sentence():
+    assert split_sentences("Hi. Sure! The library is on the second floor.", min_chars=20) == [
+        "Hi. Sure! The library is on the second floor.",
+    ]
+    # A short tail joins the sentence before it
+    assert split_sentences("The library is on the second floor.\nThanks.", min_chars=20) == [
+        "The library is on the second floor. Thanks.",
+    ]
+    assert split_sentences("  ") == []
+
+
+def test_chunks_go_out_in_order_although_later_sentences_render_first(monkeypatch):
+    rendering, most_at_once = set(), []
+
+    async def render_speech(text):
+        rendering.add(text)
+        most_at_once.append(len(rendering))
+        # The first sentence is the slowest to render
+        await asyncio.sleep(0.03 if text.startswith("First") else 0.001)
+        rendering.discard(text)
+        return text.encode(), {"mouthCues": []}
+
+    monkeypatch.setattr(speech, "render_speech", render_speech)
+    socket = FakeSocket()
+    text = "First sentence of the answer. Second sentence of the answer. Third sentence of the answer."
+    sent = asyncio.run(stream_answer(socket, text, lookahead=2))
+
+    assert sent == 3
+    assert [(m["seq"], m["total"], m["final"]) for m in socket.messages] == [(0, 3, False), (1, 3, False), (2, 3, True)]
+    assert [base64.b64decode(m["audio"]).decode() for m in socket.messages] == split_sentences(text)
+    assert max(most_at_once) == 2
+
+
+def test_failed_chunk_is_reported_and_the_rest_still_sent(monkeypatch):
+    async def render_speech(text):
+        if text.startswith("Second"):
+            raise RuntimeError("TTS failed")
+        return text.encode(), {"mouthCues": []}
+
+    monkeypatch.setattr(speech, "render_speech", render_speech)
+    socket = FakeSocket()
+    text = "First sentence of the answer. Second sentence of the answer. Third sentence of the answer."
+    sent = asyncio.run(stream_answer(socket, text))
+
+    assert sent == 2
+    assert [(m["seq"], m["valid"]) for m in socket.messages] == [(0, True), (1, False), (2, True)]
+    assert "audio" not in socket.messages[1]
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+from stream.speech_cache import SpeechCache, cache_key
+
+CUES = {}
+
+
+def test_key_ignores_whitespace_and_unicode_form():
+    assert cache_key("Hello,\n  world! ") == cache_key("Hello, world!")
+    assert cache_key("ﬁne") == cache_key("fine")
+    assert cache_key("Hello") != cache_key("Hello", voice="another")
+
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    async def scenario():
+        # Each entry is 8 audio bytes plus "{}": three fit, a fourth does not
+        cache = SpeechCache(memory_bytes=30, disk_bytes=0)
+        for text in ("one", "two", "three"):
+            await cache.put(text, b"x" * 8, CUES)
+        assert await cache.get("one") is not None
+        await cache.put("four", b"x" * 8, CUES)
+        return cache, [await cache.get(text) is not None for text in ("one", "two", "three", "four")]
+
+    cache, present = asyncio.run(scenario())
+    assert present == [True, False, True, True]
+    assert cache.memory_used == 30
+    assert cache.counters == {"memory": 4, "disk": 0, "miss": 1}
+
+
+def test_entry_larger_than_the_memory_tier_is_not_kept_in_memory():
+    async def scenario():
+        cache = SpeechCache(memory_bytes=10, disk_bytes=0)
+        await cache.put("long", b"x" * 20, CUES)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert not cache.memory and cache.memory_used == 0
+
+
+def test_disk_hit_survives_a_restart_and_is_promoted_to_memory(tmp_path):
+    async def scenario():
+        await SpeechCache(memory_bytes=1000, disk_bytes=1000, directory=str(tmp_path)).put(
+            "Hello", b"RIFFwav", {"mouthCues": [{"value": "A"}]})
+        restarted = SpeechCache(memory_bytes=1000, disk_bytes=1000, directory=str(tmp_path))
+        first = await restarted.get("Hello")
+        second = await restarted.get("Hello")
+        return restarted, first, second
+
+    cache, first, second = asyncio.run(scenario())
+    assert first == second == (b"RIFFwav", {"mouthCues": [{"value": "A"}]})
+    assert cache.counters == {"memory": 1, "disk": 1, "miss": 0}
+
+
+def test_disk_tier_evicts_the_least_recently_used_file(tmp_path):
+    async def scenario():
+        # Each file is 8 audio bytes plus "{}\n": two fit on disk, nothing stays in memory
+        cache = SpeechCache(memory_bytes=1, disk_bytes=26, directory=str(tmp_path))
+        await cache.put("one", b"1" * 8, CUES)
+        await cache.put("two", b"2" * 8, CUES)
+        assert await cache.get("one") is not None
+        await cache.put("three", b"3" * 8, CUES)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{cache_key(text)}.speech" for text in ("one", "three"))
+    assert cache.disk_used == 22
+
+
+def test_unreadable_file_is_dropped_and_counts_as_a_miss(tmp_path):
+    async def scenario():
+        cache = SpeechCache(memory_bytes=1, disk_bytes=1000, directory=str(tmp_path))
+        await cache.put("Hello", b"wav", CUES)
+        with open(tmp_path / f"{cache_key('Hello')}.speech", "wb") as f:
+            f.write(b"not json\n")
+        return cache, await cache.get("Hello")
+
+    cache, result = asyncio.run(scenario())
+    assert result is None
+    assert not cache.disk and cache.disk_used == 0
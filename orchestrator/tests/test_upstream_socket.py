@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+
+import websockets.exceptions
+
+from stream import upstream_socket
+from stream.upstream_socket import SupervisedWebSocket, CIRCUIT_OPEN, CONNECTED, CONNECTING
+
+
+class FakeUpstream:
+    """An upstream connection that records what was sent; its pongs can be withheld."""
+    def __init__(self, answers_pings: bool = True, fails_send: bool = False):
+        self.answers_pings = answers_pings
+        self.fails_send = fails_send
+        self.sent: list[dict] = []
+        self.closed = False
+
+    async def send(self, message):
+        if self.fails_send:
+            raise websockets.exceptions.ConnectionClosedError(None, None)
+        self.sent.append(json.loads(message))
+
+    async def ping(self):
+        pong = asyncio.get_running_loop().create_future()
+        if self.answers_pings:
+            pong.set_result(None)
+        return pong
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeConnect:
+    """Stands in for websockets.connect: fails `failures` times, then hands out `upstreams` in turn."""
+    def __init__(self, failures: int = 0, upstreams=()):
+        self.failures = failures
+        self.upstreams = list(upstreams)
+        self.attempts = 0
+
+    async def __call__(self, url, **kwargs):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OSError("connection refused")
+        return self.upstreams.pop(0) if self.upstreams else FakeUpstream()
+
+
+def patch_connect(monkeypatch, connect: FakeConnect):
+    monkeypatch.setattr(upstream_socket.websockets, "connect", connect)
+    # No jitter, so the backoff can be read off exactly
+    monkeypatch.setattr(upstream_socket.random, "uniform", lambda low, high: 1.0)
+
+
+def test_reconnect_backoff_doubles_up_to_the_maximum(monkeypatch):
+    patch_connect(monkeypatch, FakeConnect(failures=10))
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", backoff_initial=0.5, backoff_max=3, breaker_threshold=10)
+        backoffs = []
+        for _ in range(5):
+            socket.retry_at = 0.0
+            await socket._connect()
+            backoffs.append(round(socket.retry_at - time.monotonic(), 1))
+        return backoffs
+
+    assert asyncio.run(scenario()) == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+
+def test_circuit_opens_after_consecutive_failures_and_closes_on_success(monkeypatch):
+    upstream = FakeUpstream()
+    connect = FakeConnect(failures=3, upstreams=[upstream])
+    patch_connect(monkeypatch, connect)
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", configure={"type": "configure"}, breaker_threshold=3)
+        # As start() leaves it, without its supervisor task
+        socket.state = CONNECTING
+        states = []
+        for _ in range(4):
+            socket.retry_at = 0.0
+            await socket._connect()
+            states.append(socket.state)
+        return socket, states
+
+    socket, states = asyncio.run(scenario())
+    assert states == [CONNECTING, CONNECTING, CIRCUIT_OPEN, CONNECTED]
+    assert socket.ws is upstream and socket.failures == 0
+    # The configure message is replayed on the new connection
+    assert upstream.sent == [{"type": "configure"}]
+
+
+def test_open_circuit_fails_fast(monkeypatch):
+    patch_connect(monkeypatch, FakeConnect(failures=100))
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", backoff_initial=60, breaker_threshold=1)
+        assert socket.connection() is None
+        await asyncio.sleep(0.01)
+        state = socket.state
+        ws = socket.connection()
+        await socket.close()
+        return state, ws
+
+    assert asyncio.run(scenario()) == (CIRCUIT_OPEN, None)
+
+
+def test_connection_that_cannot_be_configured_is_closed(monkeypatch):
+    upstream = FakeUpstream(fails_send=True)
+    patch_connect(monkeypatch, FakeConnect(upstreams=[upstream]))
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", configure={"type": "configure"})
+        await socket._connect()
+        return socket
+
+    socket = asyncio.run(scenario())
+    assert upstream.closed
+    assert socket.ws is None and socket.failures == 1
+
+
+def test_missed_heartbeat_reconnects(monkeypatch):
+    silent, healthy = FakeUpstream(answers_pings=False), FakeUpstream()
+    connect = FakeConnect(upstreams=[silent, healthy])
+    patch_connect(monkeypatch, connect)
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", heartbeat=0.01, heartbeat_timeout=0.02)
+        assert await socket.wait_connected(1)
+        first = socket.connection()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if socket.connection() is healthy:
+                break
+        second = socket.connection()
+        await socket.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first, second) == (silent, healthy)
+    assert silent.closed and connect.attempts == 2
+
+
+def test_reported_loss_reconnects_without_waiting_for_the_heartbeat(monkeypatch):
+    first, second = FakeUpstream(), FakeUpstream()
+    patch_connect(monkeypatch, FakeConnect(upstreams=[first, second]))
+
+    async def scenario():
+        socket = SupervisedWebSocket("face", "ws://face", heartbeat=60)
+        assert await socket.wait_connected(1)
+        socket.connection_lost(first)
+        assert socket.connection() is None
+        assert await socket.wait_connected(1)
+        ws = socket.connection()
+        await socket.close()
+        return ws
+
+    assert asyncio.run(scenario()) is second
+    assert first.closed
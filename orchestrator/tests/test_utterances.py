@@ -0,0 +1,160 @@
+import asyncio
+import base64
+import io
+import time
+import wave
+
+from stream.utterances import AdmissionControl, Utterance, UtteranceQueue, merge_audio, MERGED, QUEUED, REJECTED
+
+
+def wav(frames: bytes, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(frames)
+    return buffer.getvalue()
+
+
+def utterance(frames: bytes = b"\x01\x00", received_at: float = None) -> Utterance:
+    return Utterance(base64.b64encode(wav(frames)).decode("ascii"), False, received_at or time.time())
+
+
+class Recorder:
+    """Answers utterances only when released, and records what it answered and what the client was told."""
+    def __init__(self):
+        self.answered: list[Utterance] = []
+        self.notified: list[dict] = []
+        self.release = asyncio.Event()
+
+    async def process(self, item: Utterance):
+        await self.release.wait()
+        self.answered.append(item)
+
+    async def notify(self, message: dict):
+        self.notified.append(message)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_wav_files_are_joined_frame_wise():
+    merged = merge_audio(wav(b"\x01\x00\x02\x00"), wav(b"\x03\x00"))
+    with wave.open(io.BytesIO(merged)) as joined:
+        assert joined.readframes(joined.getnframes()) == b"\x01\x00\x02\x00\x03\x00"
+
+
+def test_audio_that_cannot_be_joined_is_not_merged():
+    assert merge_audio(wav(b"\x01\x00", 16000), wav(b"\x01\x00", 48000)) is None
+    assert merge_audio(wav(b"\x01\x00"), b"raw pcm") is None
+    assert merge_audio(b"raw ", b"pcm") == b"raw pcm"
+
+
+def test_utterance_following_a_waiting_one_is_merged_into_it():
+    async def scenario():
+        recorder = Recorder()
+        queue = UtteranceQueue(recorder.process, recorder.notify, admission=AdmissionControl())
+        now = time.time()
+        outcomes = [queue.submit(utterance(b"\x01\x00", now)), queue.submit(utterance(b"\x02\x00", now + 1))]
+        recorder.release.set()
+        await settle()
+        await queue.close()
+        return outcomes, recorder
+
+    outcomes, recorder = asyncio.run(scenario())
+    assert outcomes == [QUEUED, MERGED]
+    [answered] = recorder.answered
+    assert answered.parts == 2
+    with wave.open(io.BytesIO(base64.b64decode(answered.audio_payload))) as joined:
+        assert joined.readframes(joined.getnframes()) == b"\x01\x00\x02\x00"
+
+
+def test_full_queue_rejects_and_tells_the_client():
+    async def scenario():
+        recorder = Recorder()
+        queue = UtteranceQueue(recorder.process, recorder.notify, max_size=1, merge_gap=0,
+                               admission=AdmissionControl())
+        now = time.time()
+        outcomes = [queue.submit(utterance(received_at=now))]
+        await settle()
+        # The first is being answered; one may wait behind it
+        outcomes += [queue.submit(utterance(received_at=now + 1)), queue.submit(utterance(received_at=now + 2))]
+        await settle()
+        recorder.release.set()
+        await settle()
+        await queue.close()
+        return outcomes, recorder
+
+    outcomes, recorder = asyncio.run(scenario())
+    assert outcomes == [QUEUED, QUEUED, REJECTED]
+    assert len(recorder.answered) == 2
+    assert recorder.notified == [{"valid": False, "status": REJECTED, "reason": "queue_full"}]
+
+
+def test_node_at_its_admission_limit_rejects_other_sessions():
+    async def scenario():
+        admission = AdmissionControl(max_pending=1)
+        first, second = Recorder(), Recorder()
+        kiosk1 = UtteranceQueue(first.process, first.notify, admission=admission)
+        kiosk2 = UtteranceQueue(second.process, second.notify, admission=admission)
+        outcomes = [kiosk1.submit(utterance()), kiosk2.submit(utterance())]
+        await settle()
+        first.release.set()
+        await settle()
+        # The answered utterance gave its place back
+        outcomes.append(kiosk2.submit(utterance()))
+        second.release.set()
+        await settle()
+        await kiosk1.close()
+        await kiosk2.close()
+        return outcomes, second, admission
+
+    outcomes, second, admission = asyncio.run(scenario())
+    assert outcomes == [QUEUED, REJECTED, QUEUED]
+    assert second.notified == [{"valid": False, "status": REJECTED, "reason": "overloaded"}]
+    assert len(second.answered) == 1
+    assert admission.pending == 0
+
+
+def test_utterance_past_its_deadline_is_dropped():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release.set()
+        admission = AdmissionControl()
+        queue = UtteranceQueue(recorder.process, recorder.notify, deadline=5, admission=admission)
+        queue.submit(utterance(received_at=time.time() - 10))
+        await settle()
+        await queue.close()
+        return recorder, admission
+
+    recorder, admission = asyncio.run(scenario())
+    assert recorder.answered == []
+    assert recorder.notified == [{"valid": False, "status": "expired"}]
+    assert admission.pending == 0
+
+
+def test_close_discards_waiting_utterances_and_cancels_their_uploads():
+    class Upload:
+        cancelled = False
+
+        async def cancel(self):
+            self.cancelled = True
+
+    async def scenario():
+        recorder = Recorder()
+        admission = AdmissionControl()
+        queue = UtteranceQueue(recorder.process, recorder.notify, admission=admission)
+        queue.submit(utterance())
+        await settle()
+        upload = Upload()
+        queue.submit(Utterance(None, False, time.time(), upload))
+        await queue.close()
+        return recorder, admission, upload
+
+    recorder, admission, upload = asyncio.run(scenario())
+    assert upload.cancelled
+    assert recorder.answered == []
+    assert admission.pending == 0
@@ -0,0 +1,59 @@
+import numpy as np
+
+from stream.vad import SpeechGate, trim_silence, DEFAULT_NOISE_FLOOR_DBFS
+
+RATE = 16000
+
+
+def noise(seconds, dbfs, rng):
+    return rng.standard_normal(int(seconds * RATE)) * 10 ** (dbfs / 20) * 32768
+
+
+def speech(seconds, dbfs, depth, rng):
+    """White noise with a 4 Hz envelope dipping by `depth`, at an average level of `dbfs`."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    samples = rng.standard_normal(len(t)) * (1 - depth * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)))
+    return samples / np.sqrt(np.mean(samples ** 2)) * 10 ** (dbfs / 20) * 32768
+
+
+def clip(*parts):
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+
+
+def streamed(samples, noise_floor=None):
+    gate = SpeechGate(noise_floor)
+    out = np.concatenate([gate.feed(samples[i:i + 1600]) for i in range(0, len(samples), 1600)] + [gate.finish()])
+    return out if gate.is_speech else None
+
+
+def test_speech_without_silence_is_kept():
+    rng = np.random.default_rng(0)
+    for depth in (0.3, 0.6):
+        samples = clip(speech(2.0, -20, depth, rng))
+        trimmed, floor = trim_silence(samples)
+        assert trimmed is not None and len(trimmed) == len(samples)
+        assert floor == DEFAULT_NOISE_FLOOR_DBFS
+        assert streamed(samples) is not None
+
+
+def test_speech_with_short_noisy_padding_is_kept():
+    rng = np.random.default_rng(1)
+    samples = clip(noise(0.1, -35, rng), speech(1.5, -20, 0.5, rng), noise(0.1, -35, rng))
+    trimmed, _ = trim_silence(samples)
+    assert trimmed is not None and len(trimmed) >= 1.5 * RATE
+    assert streamed(samples) is not None
+
+
+def test_silence_around_speech_is_trimmed():
+    rng = np.random.default_rng(2)
+    samples = clip(noise(0.5, -55, rng), speech(1.0, -25, 0.5, rng), noise(0.7, -55, rng))
+    trimmed, floor = trim_silence(samples)
+    assert trimmed is not None and 1.0 * RATE <= len(trimmed) <= 1.5 * RATE
+    assert floor < -50
+
+
+def test_noise_is_dropped():
+    rng = np.random.default_rng(3)
+    assert trim_silence(clip(noise(2.0, -55, rng)))[0] is None
+    # Loud background only counts as noise once an earlier clip measured it
+    assert trim_silence(clip(noise(2.0, -35, rng)), noise_floor=-35.0)[0] is None
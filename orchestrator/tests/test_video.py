@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import json
+
+from stream.router import read_frame_message
+from stream.video import FrameMailbox, VideoStage
+
+JPEG = b"\xff\xd8\xff\xe0frame\xff\xd9"
+
+
+class FakeFaceSocket:
+    """Face-rec connection that records the frames sent and answers when told to."""
+    def __init__(self):
+        self.sent: list[bytes] = []
+        self.responses: asyncio.Queue = asyncio.Queue()
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+    async def recv(self):
+        return await self.responses.get()
+
+    def answer(self, request_id, person_id="alice", **fields):
+        self.responses.put_nowait(json.dumps({
+            "matches": [{"person_id": person_id, "confidence": 0.9, "bbox": [0, 0, 10, 10]}],
+            "face_detected": True, "processed_faces": 1, "status": "success", "request_id": request_id, **fields,
+        }))
+
+
+class FakeFaceLink:
+    def __init__(self, ws):
+        self.ws = ws
+        self.lost = []
+
+    def connection(self):
+        return self.ws
+
+    def connection_lost(self, ws):
+        self.lost.append(ws)
+
+
+class FakeRequestHandler:
+    def __init__(self, ws):
+        self.face_link = FakeFaceLink(ws)
+        self.latest_face_rec_state = None
+
+
+def video_stage(ws, **kwargs):
+    results = []
+    stage = VideoStage(FakeRequestHandler(ws),
+                       lambda frame, state, received_at: results.append((frame, state)), **kwargs)
+    return stage, results
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_binary_frame_is_read_untouched():
+    assert read_frame_message({"type": "websocket.receive", "bytes": JPEG}) is JPEG
+
+
+def test_legacy_json_frame_is_decoded():
+    message = {"type": "websocket.receive", "text": json.dumps({"video": base64.b64encode(JPEG).decode()})}
+    assert read_frame_message(message) == JPEG
+    assert read_frame_message({"type": "websocket.receive", "text": json.dumps({"is_end": False})}) is None
+
+
+def test_frame_goes_to_the_face_service_as_sent():
+    async def scenario():
+        ws = FakeFaceSocket()
+        stage, results = video_stage(ws)
+        stage.submit(JPEG)
+        await settle()
+        ws.answer(0)
+        await settle()
+        await stage.close()
+        return ws, results
+
+    ws, results = asyncio.run(scenario())
+    assert ws.sent == [JPEG]
+    assert [frame for frame, _ in results] == [JPEG]
+
+
+def test_mailbox_keeps_only_the_newest_frame():
+    async def scenario():
+        mailbox = FrameMailbox()
+        assert mailbox.put(b"one") is False
+        assert mailbox.put(b"two") is True
+        frame, _ = await mailbox.get()
+        assert frame == b"two"
+        waiter = asyncio.create_task(mailbox.get())
+        await settle()
+        assert not waiter.done()
+        mailbox.put(b"three")
+        return (await waiter)[0]
+
+    assert asyncio.run(scenario()) == b"three"
+
+
+def test_frames_beyond_the_window_coalesce_until_a_response_frees_a_slot():
+    async def scenario():
+        ws = FakeFaceSocket()
+        stage, results = video_stage(ws, window=2)
+        for frame in (b"f0", b"f1", b"f2", b"f3", b"f4"):
+            stage.submit(frame)
+            await settle()
+        # Two on the wire; of the three that arrived meanwhile only the newest waits
+        assert ws.sent == [b"f0", b"f1"]
+        assert sorted(stage.in_flight) == [0, 1]
+        ws.answer(0)
+        await settle()
+        assert ws.sent == [b"f0", b"f1", b"f4"]
+        await stage.close()
+        return stage, results
+
+    stage, results = asyncio.run(scenario())
+    assert [frame for frame, _ in results] == [b"f0"]
+    assert stage.counters["coalesced"] == 2
+
+
+def test_responses_are_matched_to_their_frames_by_request_id():
+    async def scenario():
+        ws = FakeFaceSocket()
+        stage, results = video_stage(ws, window=2)
+        stage.submit(b"f0")
+        await settle()
+        stage.submit(b"f1")
+        await settle()
+        ws.answer(1, person_id="bob")
+        ws.answer(0, person_id="alice")
+        await settle()
+        await stage.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [(frame, state.matches[0].person_id) for frame, state in results] == [(b"f1", "bob"), (b"f0", "alice")]
+
+
+def test_late_response_to_a_timed_out_frame_is_ignored():
+    async def scenario():
+        ws = FakeFaceSocket()
+        stage, results = video_stage(ws, window=1, timeout=0.05)
+        stage.submit(b"f0")
+        await asyncio.sleep(0.12)
+        # The slot came back when f0 timed out, so f1 goes out as request 1
+        stage.submit(b"f1")
+        await settle()
+        ws.answer(0)
+        ws.answer(1)
+        await settle()
+        await stage.close()
+        return ws, stage, results
+
+    ws, stage, results = asyncio.run(scenario())
+    assert ws.sent == [b"f0", b"f1"]
+    assert [frame for frame, _ in results] == [b"f1"]
+    assert stage.counters["dropped"] == 1
+
+
+def test_new_connection_numbers_frames_from_zero():
+    async def scenario():
+        first, second = FakeFaceSocket(), FakeFaceSocket()
+        stage, results = video_stage(first, window=2)
+        stage.submit(b"f0")
+        await settle()
+        stage.request_handler.face_link.ws = second
+        stage.submit(b"f1")
+        await settle()
+        second.answer(0)
+        await settle()
+        await stage.close()
+        return stage, results
+
+    stage, results = asyncio.run(scenario())
+    # f0 was lost with the old connection; f1 is request 0 on the new one
+    assert [frame for frame, _ in results] == [b"f1"]
+    assert stage.counters["dropped"] == 1
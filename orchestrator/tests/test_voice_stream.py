@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import numpy as np
+
+from stream import voice_stream
+from stream.voice_stream import VoiceChannel
+
+
+class FakeVoiceSocket:
+    """Records what the orchestrator sends and replies with the queued messages."""
+    def __init__(self, replies=()):
+        self.sent = []
+        self.replies = asyncio.Queue()
+        for reply in replies:
+            self.replies.put_nowait(json.dumps(reply))
+
+    async def send(self, message):
+        self.sent.append(json.loads(message) if isinstance(message, str) else message)
+
+    async def recv(self):
+        return await self.replies.get()
+
+    def controls(self):
+        return [message["type"] for message in self.sent if isinstance(message, dict)]
+
+
+def channel_with(ws):
+    channel = VoiceChannel("ws://voice")
+    channel.link.connection = lambda: ws
+    return channel
+
+
+async def recognize(channel):
+    upload = await channel.open()
+    await upload.feed(np.zeros(8000, dtype=np.int16))
+    return upload, await upload.recognized()
+
+
+def test_result_comes_back_over_the_socket():
+    async def test():
+        ws = FakeVoiceSocket([{"type": "result", "utterance": 0,
+                               "results": [{"userid": None, "transcription": "hi", "score": 0}]}])
+        channel = channel_with(ws)
+        _, results = await recognize(channel)
+        return ws, channel, results
+
+    ws, channel, results = asyncio.run(test())
+    assert results == [{"userid": None, "transcription": "hi", "score": 0}]
+    assert ws.controls() == ["start", "end"]
+    assert channel.uploads == {}
+
+
+def test_timeout_cancels_the_upload_and_falls_back_to_post(monkeypatch):
+    monkeypatch.setattr(voice_stream, "VOICE_STREAM_TIMEOUT", 0.05)
+
+    async def test():
+        ws = FakeVoiceSocket()
+        channel = channel_with(ws)
+        upload, results = await recognize(channel)
+        return ws, channel, upload, results
+
+    ws, channel, upload, results = asyncio.run(test())
+    assert results is None
+    assert ws.controls() == ["start", "end", "cancel"]
+    assert channel.uploads == {}
+    # The audio is still there for the POST
+    assert upload.encoded()[0]
+
+
+def test_error_from_the_voice_service_falls_back_to_post():
+    async def test():
+        ws = FakeVoiceSocket([{"type": "error", "utterance": 0, "detail": "Unable to diarize audio"}])
+        channel = channel_with(ws)
+        _, results = await recognize(channel)
+        return channel, results
+
+    channel, results = asyncio.run(test())
+    assert results is None
+    assert channel.uploads == {}
@@ -6,5 +6,12 @@ class RAGRequest(BaseModel):
     question: str = Field(
         description="The question to be answered by the RAG"
     )
+class ConversationTurn(BaseModel):
+    prompt: str
+    generation: str
 class RAGMultiRequest(BaseModel):
-    queries: list[RAGRequest]
\ No newline at end of file
+    queries: list[RAGRequest]
+    # Earlier turns of the conversation, oldest first, kept by the caller so any
+    # instance can answer; without it the in-process memory is used
+    history: Optional[list[ConversationTurn]] = None
+    session_id: Optional[str] = None
\ No newline at end of file
@@ -61,12 +61,18 @@ def get_multi_response(request: RAGMultiRequest):
 
     print(prompt)
 
-    config = {"configurable": {"thread_id": 1}}
-        
-    # fetch the past messages
-    state_snapshot = memory.get(config=config)
-    print(state_snapshot)
+    config = {"configurable": {"thread_id": request.session_id or 1}}
+
     history = []
+    if request.history is not None:
+        for turn in request.history:
+            history.append(f"User: {turn.prompt}")
+            history.append(f"Assistant: {turn.generation}")
+        state_snapshot = None
+    else:
+        # fetch the past messages
+        state_snapshot = memory.get(config=config)
+    print(state_snapshot)
     if state_snapshot:
         conversations = state_snapshot['channel_values']
         if 'conversation_history' in conversations: